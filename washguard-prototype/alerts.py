@@ -0,0 +1,261 @@
+# Background delivery of queued alerts
+#
+# The app only calls enqueue(); AlertWorker drains the alert_outbox table on a
+# thread pool and retries failed sends with exponential backoff.
+# notify_issues() is the entry point for infrastructure alerts: it suppresses
+# repeats per (location, issue set) and batches new issues into one digest.
+# The worker also sends chlorine anomalies (anomaly.py) the same way.
+#
+#   python alerts.py           # run a worker in the foreground
+#   python alerts.py --drain   # deliver everything currently due, then exit
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import anomaly
+import database as db
+import instrument
+import migrations
+import notification
+import rules
+
+CHANNELS = ("email", "sms")
+MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = float(os.getenv("ALERT_BACKOFF_SECONDS", "30"))
+BACKOFF_MAX_SECONDS = 3600
+POLL_SECONDS = float(os.getenv("ALERT_POLL_SECONDS", "5"))
+WORKERS = int(os.getenv("ALERT_WORKERS", "4"))
+BATCH_SIZE = 50
+# An unchanged issue set at a location is not re-sent within this window
+ALERT_COOLDOWN_SECONDS = float(os.getenv("ALERT_COOLDOWN_SECONDS", str(6 * 3600)))
+MISSING_CHECK_SECONDS = 300
+ANOMALY_BATCH_SIZE = 500
+DIGEST_MAX_SECTIONS = 20  # longer digests list the first taps and a count
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake():
+    # Let the in-process worker, if any, pick up newly queued alerts now
+    if _worker is not None:
+        _worker.wake()
+
+
+def enqueue(subject, body, channels=CHANNELS):
+    # Queue one message per channel
+    queued = db.enqueue_alerts((channel, subject, body) for channel in channels)
+    wake()
+    return queued
+
+
+def fingerprint(location, issue_mask, bits=rules.BITS):
+    # Stable id for a location's issue set, quoted in messages so repeats can be matched up
+    names = "+".join(name for name, bit in bits.items() if issue_mask & bit)
+    return hashlib.sha1(f"{location}|{names}".encode("utf-8")).hexdigest()[:12]
+
+
+def describe(report, previous_mask=None):
+    status = rules.mask_label(report["issue_mask"])
+    lines = [f"Issue at {report['location']}: {status}"]
+    if previous_mask is not None:
+        lines.append(f"⬆️ Changed from: {rules.mask_label(previous_mask)}")
+    lines += [
+        f"{report['comments']}",
+        f"Water: {report['water_available_liters']}L",
+        f"Road: {report['road_condition']}",
+        f"Ref: {fingerprint(report['location'], report['issue_mask'])}",
+    ]
+    return "\n".join(lines)
+
+
+def notify_issues(reports, cooldown=ALERT_COOLDOWN_SECONDS, channels=CHANNELS):
+    # reports: the latest infrastructure report per location, as dicts with location,
+    # issue_mask, comments, water_available_liters and road_condition. Issue sets not yet
+    # alerted (or past their cooldown) are queued as one digest; a changed issue set
+    # escalates immediately. Locations back to OK are cleared. Returns the alerted reports.
+    reports = {r["location"]: dict(r, issue_mask=int(r["issue_mask"])) for r in reports}
+    state = db.get_alert_state()
+    now = time.time()
+    alerted = {(location, mask) for location, mask, sent in state if sent > now - cooldown}
+    known = {location for location, _, _ in state}
+
+    # Decide from a plain read first so reruns with nothing new never take the write lock
+    due = [(location, r["issue_mask"], fingerprint(location, r["issue_mask"]))
+           for location, r in reports.items() if r["issue_mask"] and (location, r["issue_mask"]) not in alerted]
+    recovered = [location for location, r in reports.items() if not r["issue_mask"] and location in known]
+    if not due and not recovered:
+        return []
+
+    def compose(claimed):
+        sections = [describe(reports[location], previous) for location, _, _, previous in claimed]
+        if len(claimed) == 1:
+            location, mask, _, previous = claimed[0]
+            subject = f"WASH Alert: {location} – {rules.mask_label(mask)}"
+            if previous is not None and mask & ~previous:
+                subject = "⬆️ " + subject
+        else:
+            subject = f"WASH Alert: {len(claimed)} locations need attention"
+        return [(channel, subject, "\n\n".join(sections)) for channel in channels]
+
+    # The digest is queued in the same transaction that records the alert state
+    claimed = db.record_alerts(due, recovered, cooldown, compose=compose)
+    if not claimed:
+        return []
+    wake()
+    return [reports[location] for location, _, _, _ in claimed]
+
+
+def dispatch_anomalies(cooldown=ALERT_COOLDOWN_SECONDS, channels=CHANNELS):
+    # Send pending chlorine anomaly events as one digest, one section per tap. A tap's
+    # alert state is keyed by the set of anomaly kinds, so repeats share the cooldown.
+    # The alert state, the queued digest and the events' notified flags are written in
+    # one transaction, so a crash or error before it commits leaves the events pending
+    by_tap = {}  # tap -> {kind: newest detail}
+    ids = []
+    while True:
+        events = db.get_unnotified_chlorine_anomalies(ids[-1] if ids else 0, ANOMALY_BATCH_SIZE)
+        for event_id, tap, ts, kind, value, detail in events:
+            by_tap.setdefault(tap, {})[kind] = detail
+            ids.append(event_id)
+        if len(events) < ANOMALY_BATCH_SIZE:
+            break
+    if not ids:
+        return 0
+    keys = []
+    for tap, details in by_tap.items():
+        mask = 0
+        for kind in details:
+            mask |= anomaly.BITS[kind]
+        keys.append((f"tap:{tap}", mask, fingerprint(f"tap:{tap}", mask, anomaly.BITS)))
+
+    def compose(claimed):
+        sections = []
+        for key, mask, ref, _ in claimed[:DIGEST_MAX_SECTIONS]:
+            tap = key[len("tap:"):]
+            details = by_tap[tap]
+            lines = [f"Chlorine anomaly at tap {tap}"]
+            lines += [f"{anomaly.LABELS[kind]}: {details[kind]}" for kind in anomaly.KINDS if kind in details]
+            lines.append(f"Ref: {ref}")
+            sections.append("\n".join(lines))
+        if len(claimed) > DIGEST_MAX_SECTIONS:
+            sections.append(f"…and {len(claimed) - DIGEST_MAX_SECTIONS} more taps; see the dashboard.")
+        if len(claimed) == 1:
+            subject = f"WASH Alert: tap {claimed[0][0][len('tap:'):]} – chlorine anomaly"
+        else:
+            subject = f"WASH Alert: chlorine anomalies at {len(claimed)} taps"
+        return [(channel, subject, "\n\n".join(sections)) for channel in channels]
+
+    claimed = db.record_alerts(keys, cooldown=cooldown, compose=compose, anomaly_ids=ids)
+    if claimed:
+        wake()
+    return len(claimed)
+
+
+def backoff(attempts):
+    # Seconds to wait before retry number `attempts` (1-based)
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+
+
+class AlertWorker(threading.Thread):
+    def __init__(self, senders=None, workers=WORKERS, poll_seconds=POLL_SECONDS, max_attempts=MAX_ATTEMPTS):
+        super().__init__(name="alert-worker", daemon=True)
+        self.senders = senders or notification.get_senders()
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alert-send")
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._missing_checked = 0
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def deliver(self, alert):
+        alert_id, channel, subject, body, attempts = alert
+        try:
+            with instrument.span("notify", channel):
+                self.senders[channel](subject, body)
+        except Exception as e:
+            attempts += 1
+            retry_at = time.time() + backoff(attempts) if attempts < self.max_attempts else None
+            db.mark_alert_failed(alert_id, f"{type(e).__name__}: {e}", retry_at)
+            print(f"❌ {channel} alert {alert_id} failed (attempt {attempts}): {e}")
+            return False
+        db.mark_alert_sent(alert_id)
+        return True
+
+    def drain(self):
+        # Deliver claimed batches until nothing is due; returns the number sent
+        sent = 0
+        while not self._stopping.is_set():
+            batch = db.claim_alerts(BATCH_SIZE)
+            if not batch:
+                break
+            sent += sum(self.pool.map(self.deliver, batch))
+        return sent
+
+    def check_anomalies(self):
+        now = time.time()
+        if now - self._missing_checked >= MISSING_CHECK_SECONDS:
+            db.flag_missing_chlorine(now)
+            self._missing_checked = now
+        dispatch_anomalies()
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self.check_anomalies()
+                self.drain()
+            except Exception as e:
+                print("❌ Alert worker error:", e)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        self.pool.shutdown(wait=True)
+
+
+def start_worker(**kwargs):
+    # One worker per process, shared by every Streamlit session
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = AlertWorker(**kwargs)
+            _worker.start()
+        return _worker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deliver queued WashGuard alerts from washguard.db")
+    parser.add_argument("--drain", action="store_true", help="send everything currently due, then exit")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    if args.drain:
+        worker = AlertWorker()
+        worker.check_anomalies()
+        sent = worker.drain()
+        worker.pool.shutdown()
+        print(f"📨 {sent} alerts sent. Outbox: {db.get_outbox_counts()}")
+        return 0
+
+    worker = start_worker()
+    print("📨 Alert worker running, Ctrl+C to stop.")
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
+        worker.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# Streaming chlorine anomaly detection, one small state row per tap stand
+#
+# Each reading updates an EWMA of the level, its variance and the reporting
+# interval, so a new reading is checked in O(1) without rescanning history.
+# database.py calls update_states() inside the insert transaction and stores
+# the events in chlorine_anomalies; alerts.py turns them into alerts.
+import math
+
+ALPHA = 0.05                 # EWMA weight of the newest reading
+WARMUP = 20                  # readings before outlier and missing-report checks start
+Z_LIMIT = 5.0                # |level - mean| / std that counts as an outlier
+MAX_RATE_PER_HOUR = 0.5      # mg/L per hour between consecutive readings...
+MIN_STEP = 0.15              # ...when the step is also at least this large, so sensor noise is ignored
+STUCK_READINGS = 12          # identical consecutive readings that mean a stuck sensor
+MISSING_FACTOR = 3           # silence, in typical reporting intervals, before a tap counts as missing
+MISSING_MIN_SECONDS = 3600
+
+KINDS = ("outlier", "rate", "stuck", "missing")
+BITS = {kind: 1 << i for i, kind in enumerate(KINDS)}
+LABELS = {
+    "outlier": "📈 Unusual level",
+    "rate": "⚡ Sudden change",
+    "stuck": "🧊 Sensor stuck",
+    "missing": "📵 Reports missing",
+}
+
+# (tap_stand_id, n, mean, var, last_value, last_ts, repeats, interval)
+STATE_COLUMNS = ("tap_stand_id", "n", "mean", "var", "last_value", "last_ts", "repeats", "interval")
+
+
+def update(state, value, ts):
+    # Fold one reading into a tap's state; returns (new state, [(kind, detail)])
+    tap, n, mean, var, last_value, last_ts, repeats, interval = state
+    events = []
+    if n == 0:
+        return (tap, 1, value, 0.0, value, ts, 0, None), events
+
+    if n >= WARMUP and var > 0:
+        z = (value - mean) / math.sqrt(var)
+        if abs(z) > Z_LIMIT:
+            events.append(("outlier", f"{value:.2f} mg/L vs typical {mean:.2f} (z={z:+.1f})"))
+
+    dt = ts - last_ts
+    if dt > 0:
+        rate = (value - last_value) / (dt / 3600)
+        if abs(rate) > MAX_RATE_PER_HOUR and abs(value - last_value) >= MIN_STEP:
+            events.append(("rate", f"{last_value:.2f} → {value:.2f} mg/L in {dt / 60:.0f} min"))
+        interval = dt if interval is None else ALPHA * dt + (1 - ALPHA) * interval
+
+    repeats = repeats + 1 if value == last_value else 0
+    if repeats == STUCK_READINGS - 1:
+        events.append(("stuck", f"{STUCK_READINGS} identical readings of {value:.2f} mg/L"))
+
+    diff = value - mean
+    increment = ALPHA * diff
+    mean += increment
+    var = (1 - ALPHA) * (var + diff * increment)
+    return (tap, n + 1, mean, var, value, ts, repeats, interval), events
+
+
+def load_states(cursor, taps):
+    states = {}
+    taps = list(taps)
+    for i in range(0, len(taps), 500):
+        chunk = taps[i:i + 500]
+        cursor.execute(
+            f"SELECT {', '.join(STATE_COLUMNS)} FROM chlorine_state WHERE tap_stand_id IN ({', '.join('?' * len(chunk))})",
+            chunk
+        )
+        states.update((row[0], row) for row in cursor.fetchall())
+    return states
+
+
+def update_states(cursor, readings, emit=True):
+    # readings: iterable of (tap_stand_id, ts, chlorine_level). Readings older than a
+    # tap's last one are stored but not scored. Returns the number of events recorded.
+    readings = sorted((r for r in readings if r[2] is not None), key=lambda r: (r[0], r[1]))
+    if not readings:
+        return 0
+    states = load_states(cursor, {r[0] for r in readings})
+    events = []
+    for tap, ts, value in readings:
+        state = states.get(tap) or (tap, 0, 0.0, 0.0, None, None, 0, None)
+        if state[5] is not None and ts < state[5]:
+            continue
+        state, found = update(state, float(value), ts)
+        states[tap] = state
+        events.extend((tap, ts, kind, value, detail) for kind, detail in found)
+
+    cursor.executemany(f"""
+        INSERT INTO chlorine_state ({', '.join(STATE_COLUMNS)}, missing) VALUES ({', '.join('?' * len(STATE_COLUMNS))}, 0)
+        ON CONFLICT (tap_stand_id) DO UPDATE SET
+            n = excluded.n, mean = excluded.mean, var = excluded.var, last_value = excluded.last_value,
+            last_ts = excluded.last_ts, repeats = excluded.repeats, interval = excluded.interval, missing = 0
+    """, states.values())
+    if emit:
+        record_events(cursor, events)
+    return len(events) if emit else 0
+
+
+def record_events(cursor, events):
+    cursor.executemany(
+        "INSERT INTO chlorine_anomalies (tap_stand_id, ts, kind, value, detail) VALUES (?, ?, ?, ?, ?)",
+        events
+    )
+
+
+def flag_missing(cursor, now):
+    # Record a "missing" event for each established tap that has been silent for
+    # MISSING_FACTOR of its usual reporting interval; flagged once until it reports again
+    cursor.execute("""
+        SELECT tap_stand_id, last_ts, interval FROM chlorine_state
+        WHERE missing = 0 AND n >= ? AND interval IS NOT NULL AND last_ts < ?
+    """, (WARMUP, now - MISSING_MIN_SECONDS))
+    silent = [(tap, last_ts) for tap, last_ts, interval in cursor.fetchall()
+              if now - last_ts > max(MISSING_FACTOR * interval, MISSING_MIN_SECONDS)]
+    record_events(cursor, [
+        (tap, now, "missing", None, f"no report for {(now - last_ts) / 3600:.1f} h")
+        for tap, last_ts in silent
+    ])
+    cursor.executemany("UPDATE chlorine_state SET missing = 1 WHERE tap_stand_id = ?", [(tap,) for tap, _ in silent])
+    return len(silent)
+
+
+def rebuild_states(cursor):
+    # Replay all chlorine history into fresh states without emitting events
+    cursor.execute("DELETE FROM chlorine_state")
+    read = cursor.connection.cursor()
+    read.execute("SELECT tap_stand_id, ts, chlorine_level FROM chlorine ORDER BY tap_stand_id, ts")
+    while True:
+        rows = read.fetchmany(10000)
+        if not rows:
+            break
+        update_states(cursor, rows, emit=False)
+    read.close()
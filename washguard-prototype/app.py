@@ -1,22 +1,25 @@
 # WASHGuard AI Prototype Streamlit App 
+# Heavy libraries (transformers, matplotlib, wordcloud, plotly, altair)
+# are imported inside the code paths that use them to keep reruns fast
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-from transformers import pipeline
-from email.mime.text import MIMEText
-from twilio.rest import Client
-import smtplib
+import io
 import os
 import database as db
+import alerts
+import cache
+import downsample
+import export
+import instrument
+import migrations
+import rules
+from sentiment import (DEFAULT_MODEL, SENTIMENT_BATCH_SIZE, SENTIMENT_MAX_LENGTH, SENTIMENT_QUANTIZE, SENTIMENT_THREADS,
+                       SENTIMENT_VERSION, classify_texts, load_analyzer)
 from dotenv import load_dotenv
-import altair as alt
 import time
-import numpy as np  
 import asyncio
 import nest_asyncio
 nest_asyncio.apply()
-import plotly.graph_objects as go  
 
 # Load environment variables
 load_dotenv()
@@ -25,12 +28,19 @@ load_dotenv()
 DEMO_MODE = True
 st.session_state.demo_mode = True
 
-# --- Load sentiment pipeline ---
-sentiment_analyzer = pipeline("sentiment-analysis", device=-1)
+# --- Sentiment pipeline (loaded once per process, on first use) ---
+SENTIMENT_MODEL = DEFAULT_MODEL
 
 # Page config
 st.set_page_config(page_title="WASHGuard AI", layout="wide")
 
+# Create or upgrade the schema once per server process (see migrations.py), not on every rerun
+@st.cache_resource(show_spinner="Preparing the database…")
+def migrate_database():
+    return migrations.migrate()
+
+migrate_database()
+
 # --- User Login  ---
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
@@ -74,121 +84,251 @@ tab = st.sidebar.radio("📋 Select Module", [
     "⚙️ Infrastructure Monitor"
 ])
 
-# --- Always load data for dashboard cards ---
-chlorine_data = db.get_all_chlorine()
-quality_data = db.get_all_quality()
-feedback_data = db.get_all_feedback()
-infra_data = db.get_all_infrastructure()
-
-# Alert Functions
-def send_alert_email(subject, body):
-    sender_email = os.getenv("ALERT_EMAIL")
-    receiver_email = os.getenv("ALERT_RECEIVER")
-    password = os.getenv("ALERT_PASSWORD")
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
-    try:
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
-    except Exception as e:
-        print("❌ Email failed:", e)
-
-def send_sms_alert(body):
-    account_sid = os.getenv("TWILIO_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    from_number = os.getenv("TWILIO_PHONE")
-    to_number = os.getenv("ALERT_PHONE")
-
-    try:
-        client = Client(account_sid, auth_token)
-        client.messages.create(
-            body=body,
-            from_=from_number,
-            to=to_number
-        )
-    except Exception as e:
-        print("❌ SMS failed:", e)
+# Per-rerun timings (WASHGUARD_PROFILE=1); a no-op otherwise
+instrument.begin_run(tab, cache.stats())
+
+# Rows per table page; tables page through history by id instead of loading it all
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "500"))
+
+# Chart resolution: series are downsampled to about two points per pixel of this width
+CHART_WIDTH_PX = 1200
+CHART_WIDTH_PX_MOBILE = 400
+SCATTERGL_POINTS = 1000
+WORDCLOUD_TERMS = 200
+
+def paged_rows(key, fetch, **filters):
+    # Keyset pagination: the before_id cursor of each visited page lives in session state,
+    # so "Older" and "Newer" cost one indexed query regardless of table size
+    cursors = st.session_state.setdefault(f"{key}_cursors", {})
+    stack = cursors.setdefault(repr(sorted(filters.items())), [None])
+    rows = fetch(before_id=stack[-1], limit=PAGE_SIZE, **filters)
+    col_newer, col_older = st.columns(2)
+    if col_newer.button("◀ Newer", key=f"{key}_newer", disabled=len(stack) == 1):
+        stack.pop()
+        st.rerun()
+    if col_older.button("Older ▶", key=f"{key}_older", disabled=len(rows) < PAGE_SIZE):
+        stack.append(rows[-1][0])
+        st.rerun()
+    return rows
+
+def export_controls(table):
+    # Files are built only when asked for, streamed chunk by chunk into memory
+    # (see export.py); the prepared file is kept per session until the next export
+    with st.expander("⬇️ Export"):
+        with st.form(f"{table}_export"):
+            col_start, col_end, col_station = st.columns(3)
+            start = col_start.date_input("From", value=None, key=f"{table}_export_start")
+            end = col_end.date_input("To", value=None, key=f"{table}_export_end")
+            station = col_station.text_input(export.TABLES[table][3], key=f"{table}_export_station").strip() or None
+            fmt = st.radio("Format", list(export.FORMATS), horizontal=True, key=f"{table}_export_format")
+            requested = st.form_submit_button("Prepare export")
+        if requested:
+            st.session_state.pop(f"{table}_export_file", None)
+            end_ts = pd.Timestamp(end) + pd.Timedelta(days=1) if end else None
+            buffer = io.BytesIO()
+            with st.spinner("Preparing export…"), instrument.span("pandas", f"export_{table}"):
+                rows = export.write(buffer, table, fmt, start, end_ts, station)
+            st.session_state[f"{table}_export_file"] = (buffer.getvalue(), export.file_name(table, fmt, start, end, station), fmt, rows)
+        prepared = st.session_state.get(f"{table}_export_file")
+        if prepared:
+            data, name, fmt, rows = prepared
+            st.download_button(f"Download {name} ({rows} rows)", data, file_name=name, mime=export.FORMATS[fmt], key=f"{table}_export_download")
+
+def live_frame(name, key, fetch, columns, merge):
+    # Session copy of a live view kept current with a high-water mark: fetch(mark) returns
+    # (id, *columns) rows above the mark (the initial rows when None) and merge(frame, new)
+    # folds them in, so a refresh costs one query for the new rows whatever the table size
+    state = st.session_state.get(f"live_{name}")
+    if state is None or state["key"] != key:
+        state = st.session_state[f"live_{name}"] = {"key": key, "mark": None, "frame": None}
+    rows = fetch(state["mark"])
+    if rows or state["frame"] is None:
+        new = pd.DataFrame(rows, columns=["id", *columns])
+        if rows:
+            state["mark"] = max(state["mark"] or 0, int(new["id"].max()))
+        state["frame"] = merge(state["frame"], new.drop(columns=["id"]))
+    return state["frame"]
+
+def append_readings(frame, new):
+    # Readings usually arrive in time order; re-sort only when a late one lands inside the frame
+    new["datetime"] = pd.to_datetime(new["ts"], unit="s")
+    if frame is None or frame.empty:
+        return new
+    combined = pd.concat([frame, new], ignore_index=True)
+    if new["ts"].min() < frame["ts"].iloc[-1]:
+        combined = combined.sort_values("ts", kind="stable", ignore_index=True)
+    return combined
+
+def merge_latest(frame, new):
+    # Latest report per location; the newer of two reports with the same ts wins, as in rollup_latest
+    new = rules.flag_infrastructure(new)
+    if frame is None or frame.empty:
+        return new
+    combined = pd.concat([frame, new], ignore_index=True).sort_values("ts", kind="stable")
+    return combined.drop_duplicates("location", keep="last").sort_values("location", ignore_index=True)
+
+@st.cache_resource(show_spinner="Loading sentiment model…")
+def get_sentiment_analyzer():
+    return load_analyzer(SENTIMENT_MODEL, SENTIMENT_QUANTIZE, SENTIMENT_MAX_LENGTH, SENTIMENT_THREADS)
+
+# Classify only feedback rows without a stored label for the current model;
+# skipped entirely until the feedback table changes
+@cache.cached("feedback")
+def classify_pending_feedback():
+    pending = db.get_unlabeled_feedback(SENTIMENT_VERSION)
+    if pending:
+        ids = [feedback_id for feedback_id, _ in pending]
+        labels = classify_texts(get_sentiment_analyzer(), [text for _, text in pending], batch_size=SENTIMENT_BATCH_SIZE)
+        db.save_feedback_sentiment([
+            (feedback_id, SENTIMENT_VERSION, label, score)
+            for feedback_id, (label, score) in zip(ids, labels)
+        ])
+
+# --- Cached views ---
+# Memoized across sessions until their tables change (see cache.py); results
+# are shared, so copy a DataFrame before modifying it
+@instrument.timed("pandas")
+@cache.cached("chlorine")
+def chlorine_frame(t0, t1, tap_stand_id):
+    df = pd.DataFrame(db.get_chlorine_range(t0, t1, tap_stand_id), columns=["tap_stand_id", "date", "time", "chlorine_level", "ts"])
+    df["datetime"] = pd.to_datetime(df["ts"], unit="s")
+    return df
+
+@instrument.timed("pandas")
+@cache.cached("infrastructure")
+def latest_infrastructure():
+    # Latest report per location, flagged; bounded by the number of zones, not the history
+    df = pd.DataFrame(db.get_latest_infrastructure(), columns=["location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters", "ts"]).drop(columns=["ts"])
+    return rules.flag_infrastructure(df)
+
+@instrument.timed("chart")
+@cache.cached("feedback", "feedback_sentiment")
+def wordcloud_image(label=None):
+    # Drawn from the stored term counts; None when there are no terms to show
+    from wordcloud import WordCloud
+    frequencies = db.get_term_frequencies(WORDCLOUD_TERMS, label=label, model_version=SENTIMENT_VERSION)
+    if not frequencies:
+        return None
+    return WordCloud(background_color="white", max_words=WORDCLOUD_TERMS).generate_from_frequencies(frequencies).to_array()
+
+# Alerts are queued in the database and delivered by a background worker,
+# so sending never blocks a rerun
+@st.cache_resource
+def get_alert_worker():
+    return alerts.start_worker()
+
+get_alert_worker()
 
 # --- Dashboard ---
 if tab == "📊 Dashboard":
-    # --- Dashboard Cards ---
-    if chlorine_data:
-        df_chlorine = pd.DataFrame(chlorine_data, columns=["tap_stand_id", "date", "time", "chlorine_level"])
-        low_chlorine = df_chlorine[df_chlorine["chlorine_level"] < 0.2]
-        chlorine_alerts = f"{len(low_chlorine)} of {len(df_chlorine)}"
-    else:
-        chlorine_alerts = "0"
-
-    if quality_data:
-        df_quality = pd.DataFrame(quality_data, columns=["source_id", "turbidity", "odour_present"])
-        high_turbidity = df_quality[df_quality["turbidity"] > 5]
-        turbidity_issues = f"{len(high_turbidity)} of {len(df_quality)}"
-    else:
-        turbidity_issues = "0"
-
-    if feedback_data:
-        df_feedback = pd.DataFrame(feedback_data, columns=["household_id", "feedback_text"])
-        df_feedback["sentiment"] = df_feedback["feedback_text"].apply(lambda x: sentiment_analyzer(x)[0]["label"])
-        negative_count = df_feedback[df_feedback["sentiment"] == "NEGATIVE"].shape[0]
-        feedback_alerts = f"{negative_count} negative"
-        feedback_total = f"{len(df_feedback)} total reports"
-    else:
-        feedback_alerts = "0"
-        feedback_total = "No feedback"
-
-    risk_high = False
-    risk_percent = 0
-    if chlorine_data and len(low_chlorine) > 0:
-        risk_high = True
-        risk_percent = 100
-    if quality_data and len(high_turbidity) > 0:
-        risk_high = True
-        risk_percent = 100
-    if feedback_data and negative_count > 0:
-        risk_high = True
-        risk_percent = 100
-    if infra_data:
-        df_infra = pd.DataFrame(infra_data, columns=["location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters"])
-        df_infra["status"] = df_infra.apply(lambda row: "❗" if row["generator_ok"] == "No" or row["pump_ok"] == "No" or row["pipe_leak"] == "Yes" or row["water_available_liters"] < 10 else "✅", axis=1)
-        alerts_count = df_infra[df_infra["status"] == "❗"].shape[0]
-        if alerts_count > 0:
+    classify_pending_feedback()
+
+    # Live refresh: the cards, chlorine trend and infrastructure status rerun on their own
+    # as fragments, fetching only the rows added since their previous run (see live_frame)
+    live = st.sidebar.toggle("🔄 Live refresh", key="live_refresh")
+    run_every = st.sidebar.number_input("Refresh every (seconds)", 2, 600, 10, key="live_refresh_seconds") if live else None
+
+    # Which sections to show; the cards fragment reads the totals again on each refresh
+    totals = db.get_rollup_totals()
+    chlorine_total, infra_total = totals.get("chlorine_total", 0), totals.get("infrastructure_total", 0)
+    feedback_count = totals.get("feedback_total", 0)
+    sentiment_counts = {
+        metric.split(":", 1)[1]: value for metric, value in totals.items()
+        if metric.startswith("feedback_sentiment:") and value
+    }
+
+    # --- Dashboard Cards (read from the rollup totals, no table scans) ---
+    @st.fragment(run_every=run_every)
+    def summary_cards():
+        totals = db.get_rollup_totals()
+        low_chlorine, chlorine_total = totals.get("chlorine_low", 0), totals.get("chlorine_total", 0)
+        chlorine_alerts = f"{low_chlorine} of {chlorine_total}" if chlorine_total else "0"
+
+        high_turbidity, quality_total = totals.get("quality_high_turbidity", 0), totals.get("quality_total", 0)
+        turbidity_issues = f"{high_turbidity} of {quality_total}" if quality_total else "0"
+
+        sentiment_counts = {
+            metric.split(":", 1)[1]: value for metric, value in totals.items()
+            if metric.startswith("feedback_sentiment:") and value
+        }
+        feedback_count = totals.get("feedback_total", 0)
+        negative_count = sentiment_counts.get("NEGATIVE", 0)
+        if feedback_count:
+            feedback_alerts = f"{negative_count} negative"
+            feedback_total = f"{feedback_count} total reports"
+        else:
+            feedback_alerts = "0"
+            feedback_total = "No feedback"
+
+        alerts_count = totals.get("infrastructure_alerts", 0)
+
+        risk_high = False
+        if low_chlorine > 0 or high_turbidity > 0 or negative_count > 0 or alerts_count > 0:
             risk_high = True
-            risk_percent = 100
-
-    # columns for cards
-    st.subheader("📈 System Summary Dashboard")
-    col1, col2, col3, col4 = st.columns(4)
-
-    with col1:
-        st.metric("Chlorine Alerts 💧", chlorine_alerts)
-        st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Tap stands with low chlorine levels</div>", unsafe_allow_html=True)
-
-    with col2:
-        st.metric("Turbidity Issues 🌀", turbidity_issues)
-        st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Water sources with high turbidity</div>", unsafe_allow_html=True)
-
-    with col3:
-        st.metric("Community Feedback 💬", feedback_alerts)
-        st.markdown(f"<div style='font-size:0.85em; margin-top:-1.2em;'>{feedback_total}</div>", unsafe_allow_html=True)
-
-    with col4:
-        st.metric("Overall Risk Score ⚠️", "High (100%)" if risk_high else "Low (0%)")
-        st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Based on all system indicators</div>", unsafe_allow_html=True)
-
-    # Chlorine Table and Trend 
-    if not df_chlorine.empty:
-        with st.expander("📊 Chlorine Monitoring Summary"):
-            selected_id = st.selectbox("Filter by Tap Stand ID", ["All"] + df_chlorine["tap_stand_id"].unique().tolist())
-            filtered = df_chlorine if selected_id == "All" else df_chlorine[df_chlorine["tap_stand_id"] == selected_id]
-            st.dataframe(filtered)
-
-            filtered = filtered.copy()
-            filtered["datetime"] = pd.to_datetime(filtered["date"] + " " + filtered["time"])
 
+        # columns for cards
+        st.subheader("📈 System Summary Dashboard")
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("Chlorine Alerts 💧", chlorine_alerts)
+            st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Tap stands with low chlorine levels</div>", unsafe_allow_html=True)
+
+        with col2:
+            st.metric("Turbidity Issues 🌀", turbidity_issues)
+            st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Water sources with high turbidity</div>", unsafe_allow_html=True)
+
+        with col3:
+            st.metric("Community Feedback 💬", feedback_alerts)
+            st.markdown(f"<div style='font-size:0.85em; margin-top:-1.2em;'>{feedback_total}</div>", unsafe_allow_html=True)
+
+        with col4:
+            st.metric("Overall Risk Score ⚠️", "High (100%)" if risk_high else "Low (0%)")
+            st.markdown("<div style='font-size:0.85em; margin-top:-1.2em;'>Based on all system indicators</div>", unsafe_allow_html=True)
+
+    summary_cards()
+
+    # Chlorine Table and Trend
+    @st.fragment(run_every=run_every)
+    def chlorine_summary():
+        import plotly.graph_objects as go
+
+        selected_id = st.selectbox("Filter by Tap Stand ID", ["All"] + db.get_chlorine_stations())
+        tap_stand_id = None if selected_id == "All" else selected_id
+
+        # Range query on the (tap_stand_id, ts) index instead of filtering the full table.
+        # Defaults to the last week of readings so the window stays small as history grows.
+        first_ts, last_ts = db.get_chlorine_bounds(tap_stand_id)
+        first_day = pd.to_datetime(first_ts, unit="s").date()
+        last_day = pd.to_datetime(last_ts, unit="s").date()
+        default_start = max(first_day, last_day - pd.Timedelta(days=6))
+        date_range = st.date_input("Date Range", value=(default_start, last_day), min_value=first_day, max_value=last_day)
+        start_day, end_day = date_range if len(date_range) == 2 else (date_range[0], date_range[0])
+        end_ts = pd.Timestamp(end_day) + pd.Timedelta(days=1)
+        if live and end_day >= last_day:
+            # Following new readings: open-ended range, topped up from the session's copy
+            end_ts = None
+            filtered = live_frame("chlorine", (start_day, tap_stand_id),
+                                  lambda mark: db.get_chlorine_since(mark, start_day, None, tap_stand_id),
+                                  db.CHLORINE_COLUMNS, append_readings)
+        else:
+            filtered = chlorine_frame(start_day, end_ts, tap_stand_id)
+        # Only the newest page of raw rows goes to the browser; the chart covers the whole range
+        if len(filtered) > PAGE_SIZE:
+            st.caption(f"Showing the latest {PAGE_SIZE} of {len(filtered)} readings.")
+        st.dataframe(filtered.drop(columns=["ts", "datetime"]).tail(PAGE_SIZE))
+
+        # Anomalies flagged by the streaming detector as readings arrived
+        anomaly_rows = db.get_chlorine_anomalies(start_day, end_ts, tap_stand_id)
+        if anomaly_rows:
+            st.markdown("**⚠️ Detected Anomalies**")
+            df_anomalies = pd.DataFrame(anomaly_rows, columns=["tap_stand_id", "ts", "kind", "chlorine_level", "detail"])
+            df_anomalies.insert(1, "datetime", pd.to_datetime(df_anomalies.pop("ts"), unit="s"))
+            st.dataframe(df_anomalies)
+
+        if filtered.empty:
+            st.info("No chlorine readings in this range.")
+        else:
             min_thresh = 0.2
             max_thresh = 0.5
 
@@ -201,151 +341,180 @@ if tab == "📊 Dashboard":
                     return False
 
             is_mobile = is_mobile_view()
-            chart_width = 250 if is_mobile else 400
-            chart_height = 150 if is_mobile else 400
 
-            # Prepare data for the chart
-            df_plot = filtered.copy()
+            # Prepare data for the chart: min/max buckets sized to the chart width,
+            # keeping threshold crossings and the latest reading
+            with instrument.span("pandas", "downsample_chlorine"):
+                df_plot = downsample.downsample_frame(
+                    filtered, "ts", "chlorine_level", CHART_WIDTH_PX_MOBILE if is_mobile else CHART_WIDTH_PX,
+                    thresholds=(min_thresh, max_thresh)
+                ).copy()
             df_plot["Datetime"] = df_plot["datetime"]  
 
-            fig = go.Figure()
-
-            fig.add_trace(go.Scatter(
-                x=df_plot["Datetime"],  
-                y=df_plot["chlorine_level"],
-                mode="lines+markers",
-                line=dict(color="#339af0"),
-                name="Chlorine Level"
-            ))
-
-            # Threshold lines (horizontal)
-            fig.add_shape(
-                type="line",
-                x0=df_plot["Datetime"].min(),
-                x1=df_plot["Datetime"].max(),
-                y0=0.2,
-                y1=0.2,
-                line=dict(color="red", dash="dash"),
-            )
-            fig.add_annotation(
-                x=df_plot["Datetime"].min(),
-                y=0.2,
-                text="Min Threshold",
-                showarrow=False,
-                yshift=10,
-                font=dict(color="red")
-            )
-            fig.add_shape(
-                type="line",
-                x0=df_plot["Datetime"].min(),
-                x1=df_plot["Datetime"].max(),
-                y0=0.5,
-                y1=0.5,
-                line=dict(color="red", dash="dash"),
-            )
-            fig.add_annotation(
-                x=df_plot["Datetime"].min(),
-                y=0.5,
-                text="Max Threshold",
-                showarrow=False,
-                yshift=10,
-                font=dict(color="red")
-            )
-
-            # Annotation for the last point if it's low
-            last_row = df_plot.iloc[-1]
-            if last_row["chlorine_level"] < 0.2:
-                fig.add_trace(go.Scatter(
-                    x=[last_row["Datetime"]],
-                    y=[last_row["chlorine_level"]],
-                    text=[f"{last_row['tap_stand_id']}<br>Chlorine: {last_row['chlorine_level']:.2f} mg/L<br><span style='color:red'>● Low – Re-dose</span>"],
-                    mode="markers+text",
-                    marker=dict(size=10, color="red"),
-                    textposition="top center",
-                    showlegend=False
+            with instrument.span("chart", "chlorine_trend"):
+                fig = go.Figure()
+
+                # WebGL rendering once there are too many points for SVG
+                scatter = go.Scattergl if len(df_plot) > SCATTERGL_POINTS else go.Scatter
+                fig.add_trace(scatter(
+                    x=df_plot["Datetime"],  
+                    y=df_plot["chlorine_level"],
+                    mode="lines+markers" if len(df_plot) == len(filtered) else "lines",
+                    line=dict(color="#339af0"),
+                    name="Chlorine Level"
                 ))
+                if len(df_plot) < len(filtered):
+                    st.caption(f"Chart shows {len(df_plot)} of {len(filtered)} readings (lows, highs and threshold crossings kept).")
+
+                # Threshold lines (horizontal)
+                fig.add_shape(
+                    type="line",
+                    x0=df_plot["Datetime"].min(),
+                    x1=df_plot["Datetime"].max(),
+                    y0=0.2,
+                    y1=0.2,
+                    line=dict(color="red", dash="dash"),
+                )
+                fig.add_annotation(
+                    x=df_plot["Datetime"].min(),
+                    y=0.2,
+                    text="Min Threshold",
+                    showarrow=False,
+                    yshift=10,
+                    font=dict(color="red")
+                )
+                fig.add_shape(
+                    type="line",
+                    x0=df_plot["Datetime"].min(),
+                    x1=df_plot["Datetime"].max(),
+                    y0=0.5,
+                    y1=0.5,
+                    line=dict(color="red", dash="dash"),
+                )
+                fig.add_annotation(
+                    x=df_plot["Datetime"].min(),
+                    y=0.5,
+                    text="Max Threshold",
+                    showarrow=False,
+                    yshift=10,
+                    font=dict(color="red")
+                )
 
-            fig.update_layout(
-                yaxis=dict(range=[0, 0.8]),
-                xaxis_title="Date & Time",
-                yaxis_title="Chlorine Level (mg/L)",
-                title="Chlorine Level Monitoring",
-                template="simple_white"
-            )
+                # Annotation for the last point if it's low
+                last_row = df_plot.iloc[-1]
+                if last_row["chlorine_level"] < 0.2:
+                    fig.add_trace(go.Scatter(
+                        x=[last_row["Datetime"]],
+                        y=[last_row["chlorine_level"]],
+                        text=[f"{last_row['tap_stand_id']}<br>Chlorine: {last_row['chlorine_level']:.2f} mg/L<br><span style='color:red'>● Low – Re-dose</span>"],
+                        mode="markers+text",
+                        marker=dict(size=10, color="red"),
+                        textposition="top center",
+                        showlegend=False
+                    ))
+
+                fig.update_layout(
+                    yaxis=dict(range=[0, 0.8]),
+                    xaxis_title="Date & Time",
+                    yaxis_title="Chlorine Level (mg/L)",
+                    title="Chlorine Level Monitoring",
+                    template="simple_white"
+                )
 
-            st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(fig, use_container_width=True)
+
+    if chlorine_total:
+        with st.expander("📊 Chlorine Monitoring Summary"):
+            chlorine_summary()
 
     # Feedback Table 
-    if not df_feedback.empty:
+    if feedback_count:
         with st.expander("💬 Feedback Sentiment Summary"):
+            import matplotlib.pyplot as plt
+
             sentiment_filter = st.selectbox("Filter by Sentiment", ["All", "POSITIVE", "NEGATIVE"])
-            filtered_feedback = df_feedback if sentiment_filter == "All" else df_feedback[df_feedback["sentiment"] == sentiment_filter]
-            st.dataframe(filtered_feedback)
+            label = None if sentiment_filter == "All" else sentiment_filter
+            feedback_rows = paged_rows("dashboard_feedback", lambda **kw: db.get_feedback_page(SENTIMENT_VERSION, **kw), label=label)
+            filtered_feedback = pd.DataFrame(feedback_rows, columns=["id", "household_id", "feedback_text", "sentiment", "score", "ts"])
+            st.dataframe(filtered_feedback.drop(columns=["id", "ts"]))
 
             # Sentiment Pie Chart 
             st.markdown("### 🥧 Feedback Sentiment Analysis")
-            sentiment_counts = df_feedback["sentiment"].value_counts()
-            fig, ax = plt.subplots(figsize=(5, 5))  
-
-            def is_mobile_view():
-                try:
-                    ua = st.runtime.scriptrunner.get_script_run_ctx().session_info.user_agent
-                    return "Mobile" in ua or "Android" in ua or "iPhone" in ua
-                except Exception:
-                    return False
-
-            is_mobile = is_mobile_view()
-            fig_size = (2, 2) if is_mobile else (2, 2)
-            fig, ax = plt.subplots(figsize=fig_size)
-
-            # Custom text color for each sentiment
-            def sentiment_text_colors(labels):
-                colors = []
-                for label in labels:
-                    if label == "POSITIVE":
-                        colors.append("green")
-                    elif label == "NEGATIVE":
-                        colors.append("red")
-                    else:
-                        colors.append("black")
-                return colors
-
-            wedges, texts, autotexts = ax.pie(
-                sentiment_counts,
-                labels=sentiment_counts.index,
-                autopct="%1.1f%%",
-                startangle=140,
-                colors=["#2ecc71" if label == "POSITIVE" else "#e74c3c" for label in sentiment_counts.index],
-            )
-            # Set text color for labels and percentages
-            for i, text in enumerate(texts):
-                text.set_color(sentiment_text_colors(sentiment_counts.index)[i])
-                text.set_fontweight("bold")
-            for i, autotext in enumerate(autotexts):
-                autotext.set_color(sentiment_text_colors(sentiment_counts.index)[i])
-                autotext.set_fontweight("bold")
-
-            ax.axis("equal")
-            ax.set_facecolor('none')
-            fig.patch.set_alpha(0)  
-            st.pyplot(fig, use_container_width=False)
-
-    # Infrastructure Table 
-    if not df_infra.empty:
-        with st.expander("🔧 Infrastructure Status"):
-            # --- High Risk Warning & Bar Chart ---
-            high_risk_zones = df_infra[df_infra["water_available_liters"] < 50]
-            if not high_risk_zones.empty:
-                zone_names = ", ".join(high_risk_zones["location"].astype(str))
-                st.error(
-                    f"**High Risk Zones Detected**\n\n"
-                    f"{len(high_risk_zones)} locations require immediate attention. "
-                    f"Water availability is critical at {zone_names}."
+            sentiment_counts = pd.Series(sentiment_counts)
+            with instrument.span("chart", "sentiment_pie"):
+                fig, ax = plt.subplots(figsize=(5, 5))  
+
+                def is_mobile_view():
+                    try:
+                        ua = st.runtime.scriptrunner.get_script_run_ctx().session_info.user_agent
+                        return "Mobile" in ua or "Android" in ua or "iPhone" in ua
+                    except Exception:
+                        return False
+
+                is_mobile = is_mobile_view()
+                fig_size = (2, 2) if is_mobile else (2, 2)
+                fig, ax = plt.subplots(figsize=fig_size)
+
+                # Custom text color for each sentiment
+                def sentiment_text_colors(labels):
+                    colors = []
+                    for label in labels:
+                        if label == "POSITIVE":
+                            colors.append("green")
+                        elif label == "NEGATIVE":
+                            colors.append("red")
+                        else:
+                            colors.append("black")
+                    return colors
+
+                wedges, texts, autotexts = ax.pie(
+                    sentiment_counts,
+                    labels=sentiment_counts.index,
+                    autopct="%1.1f%%",
+                    startangle=140,
+                    colors=["#2ecc71" if label == "POSITIVE" else "#e74c3c" for label in sentiment_counts.index],
                 )
+                # Set text color for labels and percentages
+                for i, text in enumerate(texts):
+                    text.set_color(sentiment_text_colors(sentiment_counts.index)[i])
+                    text.set_fontweight("bold")
+                for i, autotext in enumerate(autotexts):
+                    autotext.set_color(sentiment_text_colors(sentiment_counts.index)[i])
+                    autotext.set_fontweight("bold")
+
+                ax.axis("equal")
+                ax.set_facecolor('none')
+                fig.patch.set_alpha(0)  
+                st.pyplot(fig, use_container_width=False)
+
+    # Infrastructure Table
+    @st.fragment(run_every=run_every)
+    def infrastructure_status():
+        import altair as alt
+
+        # Latest report per location: bounded by the number of zones, not the history
+        if live:
+            df_infra = live_frame("infrastructure", None, db.get_infrastructure_since,
+                                  db.INFRASTRUCTURE_COLUMNS, merge_latest).drop(columns=["ts"])
+        else:
+            df_infra = latest_infrastructure().copy()
+        df_infra["status"] = df_infra["issue_mask"].map(lambda mask: "❗" if mask else "✅")
+        df_infra = df_infra.drop(columns=["issue_mask"])
+
+        # --- High Risk Warning & Bar Chart ---
+        high_risk_zones = df_infra[df_infra["water_available_liters"] < rules.LOW_WATER_LITERS]
+        if not high_risk_zones.empty:
+            zone_names = ", ".join(high_risk_zones["location"].astype(str))
+            st.error(
+                f"**High Risk Zones Detected**\n\n"
+                f"{len(high_risk_zones)} locations require immediate attention. "
+                f"Water availability is critical at {zone_names}."
+            )
 
-            # Bar chart for water availability by zone
-            st.markdown("#### Water Availability by Zone")
-            st.caption("Current water availability in liters per household")
+        # Bar chart for water availability by zone
+        st.markdown("#### Water Availability by Zone")
+        st.caption("Current water availability in liters per household")
+        with instrument.span("chart", "water_availability"):
             bar_chart = alt.Chart(df_infra).mark_bar(color="#0099f6").encode(
                 x=alt.X("location:N", title="Zone"),
                 y=alt.Y("water_available_liters:Q", title="Liters"),
@@ -353,15 +522,22 @@ if tab == "📊 Dashboard":
             ).properties(height=250)
             st.altair_chart(bar_chart, use_container_width=True)
 
-            # Status filter and table
-            status_filter = st.selectbox("Filter by Status", ["All", "❗", "✅"])
-            filtered_infra = df_infra if status_filter == "All" else df_infra[df_infra["status"] == status_filter]
-            st.dataframe(filtered_infra)
+        # Status filter and table
+        status_filter = st.selectbox("Filter by Status", ["All", "❗", "✅"])
+        filtered_infra = df_infra if status_filter == "All" else df_infra[df_infra["status"] == status_filter]
+        st.dataframe(filtered_infra)
+
+    if infra_total:
+        with st.expander("🔧 Infrastructure Status"):
+            infrastructure_status()
 
     # --- Alert System Form ---
     with st.container():
         st.subheader("🔔 Alert System")
         st.caption("Send notifications to field teams about critical issues")
+        outbox = db.get_outbox_counts()
+        if outbox.get("pending") or outbox.get("failed"):
+            st.caption(f"📨 Outbox: {outbox.get('pending', 0)} pending, {outbox.get('failed', 0)} failed")
         with st.form("alert_form"):
             subject = st.text_input("Alert Subject", value="WASH Alert: Critical Infrastructure Issue")
             message = st.text_area("Alert Message", placeholder="Describe the issue and required actions…")
@@ -375,11 +551,12 @@ if tab == "📊 Dashboard":
                 if not message.strip():
                     st.error("Alert message cannot be empty.")
                 else:
-                    if send_email:
-                        send_alert_email(subject, message)
-                    if send_sms:
-                        send_sms_alert(message)
-                    st.success("Alert sent successfully.")
+                    channels = [c for c, on in (("email", send_email), ("sms", send_sms)) if on]
+                    if channels:
+                        alerts.enqueue(subject, message, channels)
+                        st.success("Alert queued for delivery.")
+                    else:
+                        st.error("Select at least one channel.")
         
 
 # --- Water Treatment ---
@@ -397,17 +574,19 @@ elif tab == "💧  Water Treatment":
             submitted = st.form_submit_button("Submit")
             if submitted:
                 if tap_id:
-                    db.insert_chlorine(tap_id, date.isoformat(), time_val.isoformat(), level)
-                    st.success("Chlorine reading submitted.")
+                    if db.insert_chlorine(tap_id, date.isoformat(), time_val.isoformat(), level):
+                        st.warning("Chlorine reading submitted. ⚠️ It looks anomalous for this tap; field teams will be alerted.")
+                    else:
+                        st.success("Chlorine reading submitted.")
                 else:
                     st.error("Tap Stand ID required.")
 
-    chlorine_data = db.get_all_chlorine()
-    if chlorine_data:
-        df = pd.DataFrame(chlorine_data, columns=["tap_stand_id", "date", "time", "chlorine_level"])
-        df["status"] = df["chlorine_level"].apply(lambda x: "🔴 Low" if x < 0.2 else "🔴 High" if x > 0.5 else "✅ OK")
+    chlorine_rows = paged_rows("chlorine", db.get_chlorine_page)
+    if chlorine_rows:
+        df = pd.DataFrame(chlorine_rows, columns=["id", "tap_stand_id", "date", "time", "chlorine_level", "ts"]).drop(columns=["id", "ts"])
+        df["status"] = df["chlorine_level"].apply(export.chlorine_status)
         st.dataframe(df)
-        st.download_button("Download CSV", df.to_csv(index=False), file_name="chlorine_data.csv")
+        export_controls("chlorine")
 
     # Water Quality
     st.markdown("### 💧 Water Quality Entry")
@@ -424,12 +603,12 @@ elif tab == "💧  Water Treatment":
                 else:
                     st.error("Source ID required.")
 
-    quality_data = db.get_all_quality()
-    if quality_data:
-        df_quality = pd.DataFrame(quality_data, columns=["source_id", "turbidity", "odour_present"])
+    quality_rows = paged_rows("quality", db.get_quality_page)
+    if quality_rows:
+        df_quality = pd.DataFrame(quality_rows, columns=["id", "source_id", "turbidity", "odour_present", "ts"]).drop(columns=["id", "ts"])
         df_quality["treatment"] = df_quality["turbidity"].apply(lambda x: "PUR" if x > 5 else "Aqua Tabs")
         st.dataframe(df_quality)
-        st.download_button("Download CSV", df_quality.to_csv(index=False), file_name="water_quality_data.csv")
+        export_controls("quality")
     else:
         st.info("No water quality readings yet.")
 
@@ -449,18 +628,19 @@ elif tab == "🗣️ Feedback Analysis":
                 else:
                     st.error("All fields required.")
 
-    feedback_data = db.get_all_feedback()
-    if feedback_data:
-        df = pd.DataFrame(feedback_data, columns=["household_id", "feedback_text"])
-        df["sentiment"] = df["feedback_text"].apply(lambda x: sentiment_analyzer(x)[0]["label"])
+    classify_pending_feedback()
+    feedback_rows = paged_rows("feedback", lambda **kw: db.get_feedback_page(SENTIMENT_VERSION, **kw))
+    if feedback_rows:
+        df = pd.DataFrame(feedback_rows, columns=["id", "household_id", "feedback_text", "sentiment", "score", "ts"]).drop(columns=["id", "ts"])
         st.dataframe(df)
-        st.download_button("Download CSV", df.to_csv(index=False), file_name="feedback_data.csv")
-        words = " ".join(df["feedback_text"].tolist())
-        wordcloud = WordCloud(background_color="white").generate(words)
-        fig, ax = plt.subplots()
-        ax.imshow(wordcloud, interpolation="bilinear")
-        ax.axis("off")
-        st.pyplot(fig)
+        export_controls("feedback")
+
+        cloud_filter = st.selectbox("Word Cloud Sentiment", ["All", "POSITIVE", "NEGATIVE"])
+        image = wordcloud_image(None if cloud_filter == "All" else cloud_filter)
+        if image is None:
+            st.info("No words to show for this sentiment yet.")
+        else:
+            st.image(image)
     else:
         st.info("No feedback yet.")
 
@@ -480,87 +660,67 @@ elif tab == "⚙️ Infrastructure Monitor":
             submitted = st.form_submit_button("Submit")
             if submitted:
                 if location:
-                    db.insert_infrastructure(location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_liters)
-                    # --- Immediate Alert Logic ---
-                    issues = []
-                    if generator_ok == "No":
-                        issues.append("🛑 Generator")
-                    if pump_ok == "No":
-                        issues.append("🛑 Pump")
-                    if pipe_leak == "Yes":
-                        issues.append("💧 Leak")
-                    if road_condition in ["Muddy", "Flooded"] and generator_ok == "Yes":
-                        issues.append("🚫 Fuel Delivery Blocked")
-                    if water_liters < 50:
-                        issues.append("❗ Low Water Reserves")
-                    if issues:
-                        status = ", ".join(issues)
-                        subject = f"WASH Alert: {location} – {status}"
-                        body = (
-                            f"Issue at {location}: {status}\n"
-                            f"{comments}\n"
-                            f"Water: {water_liters}L\n"
-                            f"Road: {road_condition}"
-                        )
-                        send_alert_email(subject, body)
-                        send_sms_alert(body)
-                        st.success("🚨 Alert sent to field teams!")
+                    issues = db.insert_infrastructure(location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_liters)
+                    # --- Immediate Alert Logic (repeats within the cooldown are suppressed) ---
+                    report = {"location": location, "issue_mask": issues, "comments": comments,
+                              "water_available_liters": water_liters, "road_condition": road_condition}
+                    if alerts.notify_issues([report]):
+                        st.success("🚨 Alert queued for field teams!")
+                    elif issues:
+                        st.success("Status submitted. Field teams were already alerted about these issues.")
                     else:
                         st.success("Status submitted.")
                 else:
                     st.error("Location required.")
 
-    infra_data = db.get_all_infrastructure()
-    if infra_data:
-        df = pd.DataFrame(infra_data, columns=["location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters"])
-        def flag(row):
-            issues = []
-            if row["generator_ok"] == "No":
-                issues.append("🛑 Generator")
-            if row["pump_ok"] == "No":
-                issues.append("🛑 Pump")
-            if row["pipe_leak"] == "Yes":
-                issues.append("💧 Leak")
-            if row["road_condition"] in ["Muddy", "Flooded"] and row["generator_ok"] == "Yes":
-                issues.append("🚫 Fuel Delivery Blocked")
-            if row["water_available_liters"] < 50:
-                issues.append("❗ Low Water Reserves")
-            return ", ".join(issues) if issues else "✅ OK"
-        df["status"] = df.apply(flag, axis=1)
+    infra_rows = paged_rows("infrastructure", db.get_infrastructure_page)
+    if infra_rows:
+        df = pd.DataFrame(infra_rows, columns=["id", "location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters", "ts"]).drop(columns=["id", "ts"])
+        df = rules.flag_infrastructure(df).drop(columns=["issue_mask"])
         st.dataframe(df)
-        st.download_button("Download CSV", df.to_csv(index=False), file_name="infrastructure_data.csv")
+        export_controls("infrastructure")
 
-        # --- Alerts Table ---
-        alerts_df = df[df["status"] != "✅ OK"]
+        # --- Alerts Table (current status: latest report per location) ---
+        df_latest = latest_infrastructure()
+        alerts_df = df_latest[df_latest["issue_mask"] != 0]
         if not alerts_df.empty:
             st.warning("🚨 Issues Detected in the Following Locations")
             st.dataframe(alerts_df[["location", "status", "comments", "water_available_liters", "road_condition"]])
 
             # --- Risk Score ---
             st.markdown("**💡 Risk Prediction**")
-            st.markdown("Zones with < 50L, active faults, or fuel blockage are High Risk")
-            high_risk = alerts_df[alerts_df["water_available_liters"] < 50]
+            st.markdown(f"Zones with < {rules.LOW_WATER_LITERS}L, active faults, or fuel blockage are High Risk")
+            high_risk = alerts_df[alerts_df["water_available_liters"] < rules.LOW_WATER_LITERS]
             if not high_risk.empty:
                 st.dataframe(high_risk[["location", "water_available_liters", "status"]])
 
-        # --- Send Alerts (avoid duplicates) ---
-        alerted_locations = set()
-        for _, row in alerts_df.iterrows():
-            if row['location'] not in alerted_locations:
-                subject = f"WASH Alert: {row['location']} – {row['status']}"
-                body = (
-                    f"Issue at {row['location']}: {row['status']}\n"
-                    f"{row['comments']}\n"
-                    f"Water: {row['water_available_liters']}L\n"
-                    f"Road: {row['road_condition']}"
-                )
-                send_alert_email(subject, body)
-                send_sms_alert(body)
-                alerted_locations.add(row['location'])
+        # --- Queue Alerts (new or changed issue sets only, shared across sessions) ---
+        alerts.notify_issues(df_latest.to_dict("records"))
     else:
         st.info("No infrastructure data yet.")
 
 
+# --- Rerun timings (admin, shown only when profiling is on) ---
+profile = instrument.end_run(cache.stats())
+if profile:
+    with st.sidebar.expander("⏱️ Rerun Timings"):
+        cache_line = profile.get("cache") or {}
+        hit_rate = cache_line.get("hit_rate")
+        st.caption(f"{profile['total_ms']:.0f} ms total · {profile['queries']} queries · {profile['rows']} rows"
+                   + (f" · cache hit rate {hit_rate:.0%}" if hit_rate is not None else ""))
+        st.dataframe(pd.Series(profile["stages_ms"], name="ms"))
+        st.dataframe(pd.DataFrame.from_dict(profile["calls"], orient="index").head(15))
+        if st.checkbox("Process totals", key="profile_totals"):
+            st.dataframe(pd.DataFrame.from_dict(instrument.totals(), orient="index").sort_values("total_ms", ascending=False))
+
+# Cache hit/miss counters for this server process
+with st.sidebar.expander("🧰 Cache Stats"):
+    cache_stats = cache.stats()
+    if cache_stats:
+        st.dataframe(pd.DataFrame.from_dict(cache_stats, orient="index")[["hits", "misses", "invalidations", "evictions", "size"]])
+    else:
+        st.caption("No cached views used yet.")
+
 # Add caption at the bottom of the sidebar
 st.sidebar.markdown(
     """
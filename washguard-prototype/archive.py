@@ -0,0 +1,177 @@
+# Parquet cold storage for old chlorine and quality readings
+#
+# archive_readings.py moves readings older than the retention period out of
+# SQLite into one Parquet file per table, month and station:
+#
+#   archive/chlorine/month=2025-01/tap_stand_id=TS-00042/part-<id>.parquet
+#
+# Every file is listed in the archive_files table (written in the same
+# transaction that deletes its rows), so readers prune by table, station and
+# time range with one indexed query and only open the partitions they need.
+# Files on disk that are not in the manifest are leftovers of an interrupted
+# run and are never read. pyarrow is imported only once there is an archive.
+import datetime
+import heapq
+import os
+import uuid
+from itertools import chain, islice
+from urllib.parse import quote
+
+import db_utils
+
+# table: (station column, stored columns in order; ts and id always included)
+TABLES = {
+    "chlorine": ("tap_stand_id", ("id", "tap_stand_id", "date", "time", "chlorine_level", "ts")),
+    "quality": ("source_id", ("id", "source_id", "turbidity", "odour_present", "ts")),
+}
+# Arrow types of the stored columns (others are strings), fixed so every file of a table has one schema
+TYPES = {"id": "int64", "ts": "int64", "chlorine_level": "float64", "turbidity": "float64"}
+# Rows decoded at a time from each file while streaming; a month's files are merged side by side
+FILE_BATCH_ROWS = 1024
+
+
+def archive_dir():
+    # WASHGUARD_ARCHIVE_DIR, else an "archive" folder next to the database file
+    return os.getenv("WASHGUARD_ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(db_utils.DB_PATH)), "archive")
+
+
+def month_start(ts):
+    day = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    return int(day.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+def next_month(ts):
+    day = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc)
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return int(datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def month_name(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m")
+
+
+def partition_path(table, month_ts, station):
+    # Relative to archive_dir(); station ids are percent-encoded to stay one path segment
+    key_column = TABLES[table][0]
+    return os.path.join(table, f"month={month_name(month_ts)}", f"{key_column}={quote(str(station), safe='')}", f"part-{uuid.uuid4().hex}.parquet")
+
+
+def write_partition(table, month_ts, station, rows):
+    # rows: one station's readings for the month, as tuples in the stored column order.
+    # Returns the manifest row (station, month, path, rows, min_ts, max_ts)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    _, columns = TABLES[table]
+    path = partition_path(table, month_ts, station)
+    full_path = os.path.join(archive_dir(), path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    schema = pa.schema([(column, TYPES.get(column, "string")) for column in columns])
+    pq.write_table(pa.Table.from_pydict(dict(zip(columns, map(list, zip(*rows)))), schema=schema), full_path)
+    return station, month_name(month_ts), path, len(rows), rows[0][-1], rows[-1][-1]
+
+
+def remove_files(paths):
+    root = archive_dir()
+    for path in paths:
+        try:
+            os.remove(os.path.join(root, path))
+        except FileNotFoundError:
+            pass
+
+
+def remove_orphans(cursor):
+    # Delete Parquet files that no manifest row points at (left by an interrupted run);
+    # returns how many were removed. Do not run while an archive job is writing.
+    root = archive_dir()
+    cursor.execute("SELECT path FROM archive_files")
+    listed = {os.path.normpath(row[0]) for row in cursor.fetchall()}
+    orphans = []
+    for table in TABLES:
+        for folder, _, names in os.walk(os.path.join(root, table)):
+            for name in names:
+                path = os.path.normpath(os.path.relpath(os.path.join(folder, name), root))
+                if name.endswith(".parquet") and path not in listed:
+                    orphans.append(path)
+    remove_files(orphans)
+    return len(orphans)
+
+
+def manifest(cursor, table, station=None, t0=None, t1=None):
+    # (month, path) of the files that may hold rows of `table` with t0 <= ts < t1 (open bounds when None)
+    where, params = ["table_name = ?"], [table]
+    if station is not None:
+        where.append("station = ?")
+        params.append(station)
+    if t0 is not None:
+        where.append("max_ts >= ?")
+        params.append(t0)
+    if t1 is not None:
+        where.append("min_ts < ?")
+        params.append(t1)
+    cursor.execute(f"SELECT month, path FROM archive_files WHERE {' AND '.join(where)} ORDER BY month, id", params)
+    return cursor.fetchall()
+
+
+def _read(paths, columns, t0, t1):
+    # One Arrow table of the requested columns, filtered to [t0, t1) and sorted by (ts, id)
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    root = archive_dir()
+    tables = [pq.read_table(os.path.join(root, path), columns=list(dict.fromkeys([*columns, "ts", "id"])), memory_map=True)
+              for path in paths]
+    data = pa.concat_tables(tables)
+    if t0 is not None:
+        data = data.filter(pc.greater_equal(data["ts"], t0))
+    if t1 is not None:
+        data = data.filter(pc.less(data["ts"], t1))
+    return data.sort_by([("ts", "ascending"), ("id", "ascending")])
+
+
+def _tuples(data, columns):
+    return list(zip(*(data[column].to_pylist() for column in columns)))
+
+
+def read_range(cursor, table, columns, station=None, t0=None, t1=None):
+    # Archived rows as tuples of `columns`, in (ts, id) order; [] for tables that are never archived
+    if table not in TABLES:
+        return []
+    files = manifest(cursor, table, station, t0, t1)
+    if not files:
+        return []
+    return _tuples(_read([path for _, path in files], columns, t0, t1), columns)
+
+
+def _iter_file(path, columns, t0, t1, batch_size):
+    # (ts, id, row) from one partition, which is stored in (ts, id) order, filtered to [t0, t1)
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    with pq.ParquetFile(os.path.join(archive_dir(), path), memory_map=True) as f:
+        for batch in f.iter_batches(batch_size, columns=list(dict.fromkeys([*columns, "ts", "id"]))):
+            if t0 is not None:
+                batch = batch.filter(pc.greater_equal(batch["ts"], t0))
+            if t1 is not None:
+                batch = batch.filter(pc.less(batch["ts"], t1))
+            rows = zip(*(batch[column].to_pylist() for column in columns))
+            yield from zip(batch["ts"].to_pylist(), batch["id"].to_pylist(), rows)
+
+
+def iter_range(table, columns, station=None, t0=None, t1=None, chunk_size=10000):
+    # Yields lists of archived rows in (ts, id) order. Files are read a batch at a time and
+    # merged, one month after another, so memory depends on chunk_size and the number of
+    # files in a month rather than on how many rows the month holds
+    if table not in TABLES:
+        return
+    with db_utils.db_connection() as cursor:
+        files = manifest(cursor, table, station, t0, t1)
+    by_month = {}
+    for month, path in files:
+        by_month.setdefault(month, []).append(path)
+    batch_size = min(chunk_size, FILE_BATCH_ROWS)
+    merged = chain.from_iterable(heapq.merge(*(_iter_file(path, columns, t0, t1, batch_size) for path in paths))
+                                 for paths in by_month.values())
+    while chunk := list(islice(merged, chunk_size)):
+        yield [row for _, _, row in chunk]
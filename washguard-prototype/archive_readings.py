@@ -0,0 +1,50 @@
+# Move old chlorine and quality readings from washguard.db into Parquet cold storage
+#
+#   python archive_readings.py                      # readings older than WASHGUARD_RETENTION_DAYS (365)
+#   python archive_readings.py --older-than-days 90 --tables chlorine
+#   python archive_readings.py --no-vacuum          # skip compacting the database afterwards
+#
+# Archived readings stay readable through the database.py range and export
+# functions, and still count in the dashboard rollups (see archive.py).
+import argparse
+import os
+import sys
+import time
+
+import archive
+import database as db
+import db_utils
+import migrations
+from db_utils import db_connection
+
+RETENTION_DAYS = int(os.getenv("WASHGUARD_RETENTION_DAYS", "365"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old readings from washguard.db to partitioned Parquet files")
+    parser.add_argument("--older-than-days", type=float, default=RETENTION_DAYS, help="retention period kept in SQLite")
+    parser.add_argument("--tables", nargs="+", choices=sorted(archive.TABLES), default=sorted(archive.TABLES))
+    parser.add_argument("--no-vacuum", action="store_true", help="leave the freed pages in the database file")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    with db_connection() as cursor:
+        orphans = archive.remove_orphans(cursor)
+    if orphans:
+        print(f"🧹 Removed {orphans} unlisted files from an interrupted run.")
+
+    before = int(time.time() - args.older_than_days * 86400)
+    for table in args.tables:
+        start = time.perf_counter()
+        rows, files = db.archive_readings(table, before)
+        print(f"📦 {table}: {rows} rows moved to {files} files in {time.perf_counter() - start:.1f} s")
+
+    if not args.no_vacuum:
+        size = os.path.getsize(db_utils.DB_PATH)
+        db.vacuum()
+        print(f"🗜️ Database vacuumed: {size / 1e6:.1f} MB -> {os.path.getsize(db_utils.DB_PATH) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# Label a large feedback backlog offline, outside the Streamlit process
+#
+#   python backfill_sentiment.py                      # one worker per core
+#   python backfill_sentiment.py --workers 4 --threads 2 --chunk-size 1000
+#   python backfill_sentiment.py --scaling --sample 4000
+#
+# The parent reads unlabeled feedback in id order, a chunk at a time, and hands
+# chunks to a pool of worker processes. Each worker pins its torch thread count
+# and loads the model once, then classifies chunk after chunk. Results come
+# back in submission order, and each chunk's labels are committed together with
+# the checkpoint (the last feedback id the chunk covered), so an interrupted run
+# resumes after the last committed chunk. The checkpoint is deleted once no
+# unlabeled rows remain after it, so the next run scans from the first row again
+# and picks up labels dropped since (e.g. by an edited feedback text). At most
+# two chunks per worker are in flight, so memory does not grow with the size of
+# the backlog.
+#
+# --scaling classifies a sample with 1, 2, 4 ... N workers without writing
+# anything and reports model load time, throughput, speedup and efficiency.
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import sys
+import time
+from collections import deque
+
+import database as db
+import migrations
+from sentiment import (DEFAULT_BATCH_SIZE, DEFAULT_MODEL, SENTIMENT_BATCH_SIZE, SENTIMENT_MAX_LENGTH, SENTIMENT_QUANTIZE,
+                       classify_texts, load_analyzer, model_version)
+
+CHUNK_SIZE = 512
+PROGRESS_SECONDS = 10
+
+_analyzer = None  # per worker process
+
+
+# --- Worker process ---
+
+def _init_worker(model, quantize, max_length, threads, ready):
+    # Thread caps must be set before torch is imported; TOKENIZERS_PARALLELISM stops
+    # the fast tokenizer from starting its own thread pool in every worker
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the parent, which terminates the pool
+    import torch
+    torch.set_num_interop_threads(1)
+
+    global _analyzer
+    start = time.perf_counter()
+    _analyzer = load_analyzer(model, quantize, max_length, threads)
+    ready.put(time.perf_counter() - start)
+
+
+def _classify(texts, batch_size):
+    start = time.perf_counter()
+    return classify_texts(_analyzer, texts, batch_size=batch_size), time.perf_counter() - start
+
+
+def start_pool(workers, model, threads, quantize=False, max_length=None):
+    # (pool, seconds until every worker has loaded the model)
+    ctx = mp.get_context("spawn")  # no inherited SQLite connections or torch thread pools
+    ready = ctx.Queue()
+    start = time.perf_counter()
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(model, quantize, max_length, threads, ready))
+    for _ in range(workers):
+        ready.get()
+    return pool, time.perf_counter() - start
+
+
+# --- Backfill ---
+
+def chunks(version, after_id, chunk_size, limit=None):
+    # Lists of (id, text) in id order, resuming after after_id
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = db.get_unlabeled_feedback(version, after_id=after_id, limit=size)
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def finished(version, after_id):
+    # True when no unlabeled row remains after after_id
+    return not db.get_unlabeled_feedback(version, after_id=after_id, limit=1)
+
+
+def backfill(model=DEFAULT_MODEL, workers=1, threads=1, chunk_size=CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE, limit=None,
+             quantize=False, max_length=None):
+    # Returns a summary dict; progress is printed as chunks are committed
+    version = model_version(model, quantize, max_length)
+    after_id, previous_rows = db.get_backfill_checkpoint(version)
+    if after_id and finished(version, after_id):
+        # Nothing left to resume; scan from the first row
+        db.clear_backfill_checkpoint(version)
+        after_id, previous_rows = 0, 0
+    total = db.get_unlabeled_feedback_count(version, after_id)
+    if limit is not None:
+        total = min(total, limit)
+    if after_id:
+        print(f"↩️ Resuming after feedback id {after_id} ({previous_rows} rows labelled by earlier runs).")
+    print(f"🗂️ {total} unlabeled rows for {version}")
+    if not total:
+        return {"rows": 0, "seconds": 0.0, "load_seconds": 0.0, "model_seconds": 0.0, "workers": workers, "threads": threads}
+
+    pool, load_seconds = start_pool(workers, model, threads, quantize, max_length)
+    print(f"🧠 {workers} workers × {threads} threads loaded the model in {load_seconds:.1f} s")
+    done = model_seconds = 0.0
+    start = last_report = time.perf_counter()
+    pending = deque()
+    source = chunks(version, after_id, chunk_size, limit)
+    try:
+        while True:
+            while len(pending) < 2 * workers:
+                rows = next(source, None)
+                if rows is None:
+                    break
+                pending.append((rows, pool.apply_async(_classify, ([text for _, text in rows], batch_size))))
+            if not pending:
+                break
+            rows, result = pending.popleft()
+            labels, seconds = result.get()
+            last_id = rows[-1][0]
+            db.save_backfill_chunk(version, [(feedback_id, version, label, score) for (feedback_id, _), (label, score) in zip(rows, labels)], last_id)
+            done += len(rows)
+            model_seconds += seconds
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_SECONDS:
+                rate = done / (now - start)
+                print(f"   {done:.0f}/{total} rows, {rate:.0f} rows/s, about {(total - done) / rate:.0f} s left")
+                last_report = now
+        if done and finished(version, last_id):
+            db.clear_backfill_checkpoint(version)
+    finally:
+        pool.terminate()
+        pool.join()
+    return {"rows": int(done), "seconds": time.perf_counter() - start, "load_seconds": load_seconds,
+            "model_seconds": model_seconds, "workers": workers, "threads": threads}
+
+
+# --- Scaling report ---
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def scaling(model, texts, max_workers, threads, chunk_size, batch_size, quantize=False, max_length=None):
+    # [(workers, load seconds, rows/s)] for each pool size, nothing written
+    results = []
+    parts = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    for workers in worker_counts(max_workers):
+        pool, load_seconds = start_pool(workers, model, threads, quantize, max_length)
+        try:
+            start = time.perf_counter()
+            for result in [pool.apply_async(_classify, (part, batch_size)) for part in parts]:
+                result.get()
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.terminate()
+            pool.join()
+        results.append((workers, load_seconds, len(texts) / elapsed))
+        print(f"   {workers} workers: {len(texts) / elapsed:.0f} rows/s")
+    return results
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Classify unlabeled feedback in washguard.db with a pool of worker processes")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--quantize", action="store_true", default=SENTIMENT_QUANTIZE,
+                        help="dynamically quantized int8 model (SENTIMENT_QUANTIZE)")
+    parser.add_argument("--max-length", type=int, default=SENTIMENT_MAX_LENGTH,
+                        help="truncate texts to this many tokens (SENTIMENT_MAX_LENGTH)")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cores / threads)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per task and per write transaction")
+    parser.add_argument("--batch-size", type=int, default=SENTIMENT_BATCH_SIZE, help="texts per model call (SENTIMENT_BATCH_SIZE)")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many rows")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and rescan from the first row")
+    parser.add_argument("--scaling", action="store_true", help="measure throughput from 1 to --workers processes; writes nothing")
+    parser.add_argument("--sample", type=int, default=2000, help="feedback rows classified per pool size with --scaling")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+    workers = args.workers or max(1, cores // args.threads)
+    version = model_version(args.model, args.quantize, args.max_length)
+
+    if args.scaling:
+        texts = [row[2] for row in db.get_feedback_page(version, limit=args.sample)]
+        if not texts:
+            print("❌ No feedback to sample.", file=sys.stderr)
+            return 1
+        print(f"📏 {len(texts)} texts, {args.threads} torch threads per worker, {cores} cores")
+        results = scaling(args.model, texts, workers, args.threads, args.chunk_size, args.batch_size, args.quantize, args.max_length)
+        base = results[0][2]
+        print(f"{'workers':>7} {'load s':>7} {'rows/s':>9} {'speedup':>8} {'efficiency':>10}")
+        for n, load_seconds, rate in results:
+            print(f"{n:>7} {load_seconds:>7.1f} {rate:>9.0f} {rate / base:>7.2f}x {rate / base / n:>10.0%}")
+        return 0
+
+    if args.restart:
+        db.clear_backfill_checkpoint(version)
+    try:
+        summary = backfill(args.model, workers, args.threads, args.chunk_size, args.batch_size, args.limit, args.quantize, args.max_length)
+    except KeyboardInterrupt:
+        last_id, rows = db.get_backfill_checkpoint(version)
+        print(f"⏹️ Stopped; {rows} rows labelled up to feedback id {last_id}. Run again to resume.")
+        return 130
+    if summary["rows"]:
+        print(f"✅ Labelled {summary['rows']} rows in {summary['seconds']:.1f} s "
+              f"({summary['rows'] / summary['seconds']:.0f} rows/s; {summary['load_seconds']:.1f} s loading the model, "
+              f"{summary['model_seconds'] / summary['seconds'] / workers:.0%} of worker time in inference)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Load test for ingest.py: concurrent senders posting chlorine batches over keep-alive connections
+#
+#   python benchmarks/bench_ingest.py --readings 200000 --batch 200 --senders 8
+#
+# Starts the service in a subprocess against a temporary database, waits until
+# every accepted reading is written, and reports end-to-end throughput plus the
+# service's own lag and backpressure counters from /metrics.
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def sender(port, batches, stats):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for body in batches:
+        while True:
+            status, _ = await request(reader, writer, "POST", "/ingest/chlorine", body)
+            if status != 503:
+                break
+            stats["retries"] += 1
+            await asyncio.sleep(0.1)
+    writer.close()
+
+
+async def run(port, readings, batch, senders, stations):
+    from generate_data import chlorine_rows
+
+    rows = chlorine_rows(readings, stations, 7, int(time.time()) - 7 * 86400)
+    bodies = []
+    while True:
+        chunk = [dict(zip(("tap_stand_id", "date", "time", "chlorine_level", "ts"), row)) for _, row in zip(range(batch), rows)]
+        if not chunk:
+            break
+        bodies.append(json.dumps(chunk).encode())
+    total = sum(len(json.loads(b)) for b in bodies)
+
+    stats = {"retries": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(sender(port, bodies[i::senders], stats) for i in range(senders)))
+    posted = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while True:
+        _, metrics = await request(reader, writer, "GET", "/metrics")
+        if metrics["written"] >= metrics["accepted"]:
+            break
+        await asyncio.sleep(0.05)
+    writer.close()
+    written = time.perf_counter() - start
+    print(f"{total} readings in {len(bodies)} requests from {senders} senders")
+    print(f"  posted in   {posted:.2f} s ({total / posted:.0f} readings/s accepted)")
+    print(f"  written in  {written:.2f} s ({total / written:.0f} readings/s end to end)")
+    print(f"  commit lag  p50 {metrics['commit_lag_p50_s']:.3f} s, max {metrics['commit_lag_max_s']:.3f} s; "
+          f"{metrics['flushes']} flushes, {stats['retries']} requests retried after 503, {metrics['rejected']} readings rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ingestion service")
+    parser.add_argument("--readings", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=200, help="readings per request")
+    parser.add_argument("--senders", type=int, default=8, help="concurrent connections")
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--service-args", default="", help="extra ingest.py arguments, e.g. '--max-buffer 20000'")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WASHGUARD_DB=os.path.join(tmp, "bench.db"), ALERT_SINK="fake", ALERT_SINK_PATH="")
+        service = subprocess.Popen([sys.executable, os.path.join(APP_DIR, "ingest.py"), "--port", str(args.port), *args.service_args.split()],
+                                   env=env, cwd=tmp, stdout=subprocess.PIPE, text=True)
+        try:
+            service.stdout.readline()  # "Ingesting on ..." once the port is open
+            asyncio.run(run(args.port, args.readings, args.batch, args.senders, args.stations))
+        finally:
+            service.terminate()
+            service.wait()
+
+
+if __name__ == "__main__":
+    main()
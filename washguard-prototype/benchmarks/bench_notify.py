@@ -0,0 +1,77 @@
+# Compare a new SMTP session per message with the pooled sessions in notification.py,
+# against a local aiosmtpd server (pip install aiosmtpd)
+#
+#   python benchmarks/bench_notify.py --messages 500 --connections 1 2 4
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notification
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def per_message(host, port, messages):
+    # What send_alert_email used to do: connect, send, quit for every message
+    for msg in messages:
+        server = smtplib.SMTP(host, port)
+        server.send_message(msg)
+        server.quit()
+
+
+def pooled(pool, messages, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda msg: pool.send([msg]), messages))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert email throughput against a local SMTP server")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        messages = [notification.build_email(f"Bench alert {i}", "Generator down at Zone A") for i in range(args.messages)]
+        for msg in messages:
+            msg.replace_header("From", "bench@example.org")
+            msg.replace_header("To", "field@example.org")
+
+        seconds = timed(lambda: per_message("127.0.0.1", args.port, messages))
+        print(f"{args.messages} messages")
+        print(f"new session per message      {seconds:8.3f} s  {args.messages / seconds:8.0f} msg/s")
+        for size in args.connections:
+            pool = notification.SMTPPool("127.0.0.1", args.port, size=size, allow_plaintext=True)
+            seconds = timed(lambda: pooled(pool, messages, size))
+            pool.close()
+            print(f"pooled, {size} connection(s)       {seconds:8.3f} s  {args.messages / seconds:8.0f} msg/s  ({pool.connects} logins)")
+        assert handler.received == args.messages * (1 + len(args.connections)), "server missed messages"
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Compare per-row pipeline calls with batched classification
+#
+#   python benchmarks/bench_sentiment.py --sizes 1000 10000 100000 --batch-size 32
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment import DEFAULT_BATCH_SIZE, classify_texts
+
+SAMPLE_FEEDBACK = [
+    "Water pressure is too low.",
+    "We are happy with the clean water.",
+    "Please fix the broken tap.",
+    "The water quality has improved this week, thank you.",
+    "The tap stand near the school has been dry since Monday and children are walking far to fetch water.",
+    "Water smells of chlorine.",
+    "Queue at the borehole is very long in the mornings, please add another tap.",
+    "Thank you for repairing the pump so quickly.",
+]
+
+
+def make_texts(n, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_FEEDBACK) for _ in range(n)]
+
+
+def per_row(analyzer, texts):
+    return [analyzer(text)[0]["label"] for text in texts]
+
+
+def run(label, fn, texts):
+    start = time.perf_counter()
+    fn(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(texts):>8} rows  {elapsed:8.2f} s  {len(texts) / elapsed:10.1f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sentiment classification throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--skip-per-row-above", type=int, default=None,
+                        help="skip the slow per-row path for sizes above this")
+    args = parser.parse_args()
+
+    from transformers import pipeline
+    analyzer = pipeline("sentiment-analysis", model="distilbert/distilbert-base-uncased-finetuned-sst-2-english", device=-1)
+
+    for n in args.sizes:
+        texts = make_texts(n)
+        if args.skip_per_row_above is None or n <= args.skip_per_row_above:
+            run("per-row", lambda t: per_row(analyzer, t), texts)
+        run("batched", lambda t: classify_texts(analyzer, t, batch_size=args.batch_size), texts)
+
+
+if __name__ == "__main__":
+    main()
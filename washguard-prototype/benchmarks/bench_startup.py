@@ -0,0 +1,67 @@
+# Measure cold start and per-rerun wall time of app.py for each tab
+#
+#   python benchmarks/bench_startup.py --reruns 5
+#
+# The cold start is the first run of the default tab in a fresh interpreter,
+# so it includes module imports and any model loading, as a new Streamlit
+# process would. Reruns are then timed per tab.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TABS = [
+    "📊 Dashboard",
+    "💧  Water Treatment",
+    "🗣️ Feedback Analysis",
+    "⚙️ Infrastructure Monitor",
+]
+
+
+def measure(reruns):
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=600)
+    at.run()
+    results = {"cold_s": time.perf_counter() - start, "rerun_s": {}}
+
+    for tab in TABS:
+        at.sidebar.radio[0].set_value(tab).run()
+        timings = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            at.run()
+            timings.append(time.perf_counter() - start)
+        results["rerun_s"][tab] = sorted(timings)[len(timings) // 2]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app startup and rerun time")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        os.chdir(APP_DIR)
+        print(json.dumps(measure(args.reruns)))
+        return
+
+    # Run in a fresh interpreter so nothing is imported or cached yet
+    out = subprocess.run(
+        [sys.executable, __file__, "--reruns", str(args.reruns), "--child"],
+        capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"cold start (first render): {result['cold_s']:.2f} s")
+    for tab, seconds in result["rerun_s"].items():
+        print(f"median rerun {tab:<28} {seconds:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# Time the app's hot paths against synthetic databases of increasing size
+#
+#   python benchmarks/bench_suite.py --rows 1000 100000 1000000 --output results.json
+#   python benchmarks/bench_suite.py --rows 10000 --sentiment    # include model inference
+#
+# Each scale runs in a fresh interpreter against its own temporary database
+# filled by generate_data.py. Results (median and min of --repeat runs per
+# benchmark, plus machine and commit details) are written as JSON so runs can
+# be compared over time.
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import islice
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSERT_CHUNK = 50000  # generated rows held in memory at once
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_scale(rows, repeat, sentiment, stations):
+    # Runs inside the child process, with WASHGUARD_DB pointing at an empty file
+    sys.path.insert(0, APP_DIR)
+    import pandas as pd
+    import database as db
+    import downsample
+    import export
+    import generate_data
+    import migrations
+    import rules
+
+    migrations.migrate()
+    results = []
+
+    def record(name, timings, items=None):
+        entry = {"name": name, "rows": rows, "median_s": statistics.median(timings), "min_s": min(timings), "repeat": len(timings)}
+        if items:
+            entry["items_per_s"] = items / entry["median_s"]
+        results.append(entry)
+
+    # Bulk inserts, streamed from the generators a chunk at a time so memory stays flat at any
+    # scale; generation and insert time are recorded separately
+    days = max(1, min(365, rows // (stations * 24) + 1))
+    start_ts = int(time.time()) - days * generate_data.DAY
+    sources = {
+        "chlorine": generate_data.chlorine_rows(rows, stations, days, start_ts),
+        "quality": generate_data.quality_rows(rows, max(1, stations // 5), days, start_ts),
+        "feedback": generate_data.feedback_rows(rows, stations * 20, days, start_ts),
+        "infrastructure": generate_data.infrastructure_rows(rows, max(1, stations // 10), days, start_ts),
+    }
+    loaders = {
+        "chlorine": db.insert_chlorine_bulk,
+        "quality": db.insert_quality_bulk,
+        "feedback": db.insert_feedback_bulk,
+        "infrastructure": db.insert_infrastructure_bulk,
+    }
+    for table, source in sources.items():
+        generate_s = insert_s = 0.0
+        count = 0
+        while True:
+            start = time.perf_counter()
+            chunk = list(islice(source, INSERT_CHUNK))
+            generate_s += time.perf_counter() - start
+            if not chunk:
+                break
+            start = time.perf_counter()
+            loaders[table](chunk)
+            insert_s += time.perf_counter() - start
+            count += len(chunk)
+        record(f"generate.{table}", [generate_s], count)
+        record(f"insert_bulk.{table}", [insert_s], count)
+
+    # Single-row inserts as the forms do them
+    calls = 50
+    record("insert.chlorine", timed(lambda: [db.insert_chlorine("TS-BENCH", "2025-01-01", f"{i // 60:02d}:{i % 60:02d}:00", 0.3) for i in range(calls)], repeat), calls)
+    record("insert.feedback", timed(lambda: [db.insert_feedback("HH-BENCH", "The tap near the school is broken") for _ in range(calls)], repeat), calls)
+    record("insert.infrastructure", timed(lambda: [db.insert_infrastructure("Zone BENCH", "No", "Yes", "No", "Good", "", 40) for _ in range(calls)], repeat), calls)
+
+    # Reads
+    for name in ("get_all_chlorine", "get_all_quality", "get_all_feedback", "get_all_infrastructure"):
+        fn = getattr(db, name)
+        record(f"read.{name}", timed(fn, repeat), rows)
+    record("read.get_chlorine_page", timed(lambda: db.get_chlorine_page(limit=500), repeat))
+    record("read.get_chlorine_window_24h", timed(lambda: db.get_chlorine_window(24), repeat))
+    record("read.get_latest_infrastructure", timed(db.get_latest_infrastructure, repeat))
+    record("read.get_term_frequencies", timed(db.get_term_frequencies, repeat))
+
+    # Derived views
+    record("dashboard.cards", timed(db.get_rollup_totals, repeat))
+    infra = pd.DataFrame(db.get_all_infrastructure(), columns=["location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters"])
+    record("rules.flag_infrastructure", timed(lambda: rules.flag_infrastructure(infra), repeat), len(infra))
+    chlorine = pd.DataFrame(db.get_chlorine_range(), columns=["tap_stand_id", "date", "time", "chlorine_level", "ts"])
+    record("chart.downsample_chlorine", timed(lambda: downsample.downsample_frame(chlorine, "ts", "chlorine_level", 1200, (0.2, 0.5)), repeat), len(chlorine))
+    for fmt in export.FORMATS:
+        path = os.path.join(os.getcwd(), f"export.{fmt}")
+        record(f"export.chlorine_{fmt}", timed(lambda: export.write(path, "chlorine", fmt), repeat), rows)
+
+    if sentiment:
+        from sentiment import classify_texts, load_analyzer
+        analyzer = load_analyzer()
+        texts = [text for _, text in db.get_all_feedback()[:min(rows, 2000)]]
+        record("sentiment.classify_texts", timed(lambda: classify_texts(analyzer, texts), 1), len(texts))
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=APP_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WashGuard hot paths on synthetic data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="rows per table, one run per value")
+    parser.add_argument("--stations", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sentiment", action="store_true", help="also time sentiment classification (loads the model)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_scale(args.child, args.repeat, args.sentiment, args.stations)))
+        return
+
+    results = []
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, WASHGUARD_DB=os.path.join(tmp, "bench.db"), ALERT_SINK="fake", ALERT_SINK_PATH="")
+            command = [sys.executable, __file__, "--child", str(rows), "--repeat", str(args.repeat), "--stations", str(args.stations)]
+            if args.sentiment:
+                command.append("--sentiment")
+            out = subprocess.run(command, capture_output=True, text=True, check=True, env=env, cwd=tmp)
+            scale = json.loads(out.stdout.strip().splitlines()[-1])
+        for entry in scale:
+            rate = f"{entry['items_per_s']:12.0f} /s" if "items_per_s" in entry else ""
+            print(f"{rows:>9} rows  {entry['name']:<34} {entry['median_s'] * 1000:10.2f} ms {rate}")
+        results += scale
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
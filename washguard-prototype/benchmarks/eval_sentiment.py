@@ -0,0 +1,123 @@
+# Compare the full-precision sentiment model with a quantized and/or truncated variant
+#
+#   python benchmarks/eval_sentiment.py                            # int8 vs current model
+#   python benchmarks/eval_sentiment.py --max-length 64 --threads 2
+#   python benchmarks/eval_sentiment.py --sample my_feedback.csv --show-disagreements
+#
+# Both variants classify a labeled sample of WASH feedback (text,label CSV;
+# benchmarks/wash_feedback_labeled.csv by default). The report gives accuracy
+# against the hand labels, agreement with the current model, single-text
+# latency (p50/p99 over --repeat passes), batched throughput, load time,
+# serialized model size and peak RSS. Each variant runs in a fresh process so
+# memory figures are not shared.
+import argparse
+import csv
+import io
+import multiprocessing as mp
+import os
+import resource
+import statistics
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from sentiment import DEFAULT_BATCH_SIZE, DEFAULT_MODEL, model_version
+
+SAMPLE = os.path.join(APP_DIR, "benchmarks", "wash_feedback_labeled.csv")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def model_mb(analyzer):
+    import torch
+    buffer = io.BytesIO()
+    torch.save(analyzer.model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def evaluate(model, quantize, max_length, threads, texts, batch_size, repeat):
+    # Runs in a child process; returns labels and timings for one variant
+    sys.path.insert(0, APP_DIR)
+    from sentiment import classify_texts, load_analyzer
+
+    start = time.perf_counter()
+    analyzer = load_analyzer(model, quantize, max_length, threads)
+    load_seconds = time.perf_counter() - start
+    classify_texts(analyzer, texts[:batch_size], batch_size)  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            classify_texts(analyzer, [text])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = classify_texts(analyzer, texts, batch_size)
+    batched_seconds = time.perf_counter() - start
+
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "labels": [label for label, _ in results],
+        "p50_ms": cuts[49] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "rows_per_s": len(texts) / batched_seconds,
+        "load_s": load_seconds,
+        "model_mb": model_mb(analyzer),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def read_sample(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [row["text"] for row in rows], [row["label"].strip().upper() for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare label agreement, latency and memory of a quantized sentiment model with the current one")
+    parser.add_argument("--sample", default=SAMPLE, help="CSV with text and label (POSITIVE/NEGATIVE) columns")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--no-quantize", dest="quantize", action="store_false", help="compare only the --max-length/--threads settings")
+    parser.add_argument("--max-length", type=int, default=None, help="candidate: truncate texts to this many tokens")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads for both variants (default: torch's choice)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="single-text latency passes over the sample")
+    parser.add_argument("--show-disagreements", action="store_true")
+    args = parser.parse_args()
+    if not args.quantize and not args.max_length:
+        parser.error("--no-quantize needs --max-length, otherwise both variants are the same model")
+
+    texts, gold = read_sample(args.sample)
+    variants = [(args.model, (args.model, False, None)),
+                (model_version(args.model, args.quantize, args.max_length), (args.model, args.quantize, args.max_length))]
+    results = {}
+    for name, options in variants:
+        with mp.get_context("spawn").Pool(1) as pool:
+            results[name] = pool.apply(evaluate, (*options, args.threads, texts, args.batch_size, args.repeat))
+
+    baseline = results[args.model]["labels"]
+    print(f"{len(texts)} labeled texts from {os.path.basename(args.sample)}, batch size {args.batch_size}, threads {args.threads or 'default'}")
+    width = max(len(name) for name in results)
+    print(f"{'variant':<{width}} {'accuracy':>8} {'agree':>6} {'p50 ms':>7} {'p99 ms':>7} {'rows/s':>7} {'load s':>6} {'model MB':>8} {'peak RSS MB':>11}")
+    for name, r in results.items():
+        accuracy = sum(a == b for a, b in zip(r["labels"], gold)) / len(gold)
+        agreement = sum(a == b for a, b in zip(r["labels"], baseline)) / len(baseline)
+        print(f"{name:<{width}} {accuracy:>8.1%} {agreement:>6.1%} {r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} "
+              f"{r['rows_per_s']:>7.0f} {r['load_s']:>6.1f} {r['model_mb']:>8.1f} {r['peak_rss_mb']:>11.0f}")
+
+    if args.show_disagreements:
+        candidate = results[variants[1][0]]["labels"]
+        for text, label, before, after in zip(texts, gold, baseline, candidate):
+            if before != after:
+                print(f"  {before} -> {after} (labeled {label}): {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Process-wide memoization keyed on per-table data versions
+#
+# SQLite triggers bump data_version.version on every insert, update or delete
+# (see database.py), so a cached result stays valid until one of the tables it
+# was built from changes, whichever session or process made the change.
+#
+#   @cache.cached("chlorine")
+#   def chlorine_csv():
+#       ...
+#
+# Results are shared between sessions: treat them as read-only and copy a
+# DataFrame before adding columns to it.
+import functools
+import threading
+from collections import OrderedDict
+
+from db_utils import db_connection
+
+DEFAULT_MAXSIZE = 32
+
+_registry = {}  # "module.qualname" -> LRUCache
+_registry_lock = threading.Lock()
+
+
+def versions(tables):
+    # Current version of each table, in order; one primary-key lookup per call
+    with db_connection() as cursor:
+        cursor.execute(
+            f"SELECT name, version FROM data_version WHERE name IN ({', '.join('?' * len(tables))})",
+            tables
+        )
+        found = dict(cursor.fetchall())
+    return tuple(found.get(table, 0) for table in tables)
+
+
+class LRUCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._versions = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, versions, key):
+        # (found, value); entries built from older data are dropped on the first lookup after a change
+        with self._lock:
+            if versions != self._versions:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._versions = versions
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, versions, key, value):
+        with self._lock:
+            if versions != self._versions:
+                return  # data changed while the value was being built
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def cached(*tables, maxsize=DEFAULT_MAXSIZE):
+    # Memoize fn per argument set until one of `tables` changes. Caches are looked
+    # up by qualified name, so a function redefined on every Streamlit rerun keeps its cache.
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        with _registry_lock:
+            cache = _registry.setdefault(name, LRUCache(maxsize))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = versions(tables)
+            key = (args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(current, key)
+            if not found:
+                value = fn(*args, **kwargs)
+                cache.put(current, key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def stats():
+    # {function name: counters} for every cache in this process
+    with _registry_lock:
+        caches = dict(_registry)
+    return {name: cache.stats() for name, cache in sorted(caches.items())}
+
+
+def clear_all():
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.clear()
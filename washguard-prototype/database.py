@@ -1,137 +1,998 @@
-import sqlite3
+import datetime
+import heapq
+import time
+from itertools import chain, islice
+from operator import itemgetter
 from db_utils import db_connection
+from rules import issue_mask, issue_masks
+import anomaly
+import archive
+import instrument
+import terms
+from sentiment import SENTIMENT_VERSION
 
-# Connect to the SQLite database
-conn = sqlite3.connect("washguard.db")
-cursor = conn.cursor()
-
-# Create tables
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS chlorine (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    tap_stand_id TEXT,
-    date TEXT,
-    time TEXT,
-    chlorine_level REAL
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS quality (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    source_id TEXT,
-    turbidity REAL,
-    odour_present TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS feedback (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    household_id TEXT,
-    feedback_text TEXT
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS infrastructure (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    location TEXT,
-    generator_ok TEXT,
-    pump_ok TEXT,
-    pipe_leak TEXT,
-    road_condition TEXT,
-    comments TEXT,
-    water_available_liters INTEGER
-)
-""")
-
-# Insert mock data only if tables are empty
-def table_empty(cursor, table):
-    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-    return cursor.fetchone()[0] == 0
-
-if table_empty(cursor, "chlorine"):
-    cursor.executemany("INSERT INTO chlorine (tap_stand_id, date, time, chlorine_level) VALUES (?, ?, ?, ?)", [
-        ("TS-001", "2025-05-21", "08:30:00", 0.15),
-        ("TS-002", "2025-05-21", "09:00:00", 0.35),
-        ("TS-003", "2025-05-21", "09:30:00", 0.60),
-        ("TS-004", "2025-05-21", "10:00:00", 0.30),
-    ])   
-
-if table_empty(cursor, "quality"):
-    cursor.executemany("INSERT INTO quality (source_id, turbidity, odour_present) VALUES (?, ?, ?)", [
-        ("Source-A", 3.5, "No"),
-        ("Source-B", 6.0, "Yes"),
-        ("Source-C", 2.2, "No"),
-    ])   
-
-if table_empty(cursor, "feedback"):
-    cursor.executemany("INSERT INTO feedback (household_id, feedback_text) VALUES (?, ?)", [
-        ("HH-001", "Water pressure is too low."),
-        ("HH-002", "We are happy with the clean water."),
-        ("HH-003", "Please fix the broken tap."),
-        ("HH-004", "The water quality has improved this week, thank you."),
-    ])   
-
-if table_empty(cursor, "infrastructure"):
-    cursor.executemany("""
-        INSERT INTO infrastructure (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, [
-        ("Zone A", "Yes", "Yes", "No", "Good", "All systems go", 800),
-        ("Zone B", "No", "Yes", "Yes", "Flooded", "Generator failure and pipe leak", 400),
-        ("Zone C", "Yes", "Yes", "Yes", "Moderate", "Small pipe leak detected, team dispatched", 40),
-    ])
-
-# Commit changes and close
-conn.commit()
-conn.close()
+# The schema is created and upgraded by migrations.py; importing this module
+# does no I/O. Connections come from the shared pool in db_utils.
+
+# --- Infrastructure issue masks ---
+# Each report stores its rules.RULES bitmask from insert time, so alert counts
+# computed in SQL agree with the flags shown in the app.
+RULE_COLUMNS = ("generator_ok", "pump_ok", "pipe_leak", "road_condition", "water_available_liters")
+
+def refresh_issue_masks(cursor, all_rows=False):
+    cursor.execute(f"SELECT id, {', '.join(RULE_COLUMNS)} FROM infrastructure" + ("" if all_rows else " WHERE issue_mask IS NULL"))
+    rows = cursor.fetchall()
+    if rows:
+        ids, *columns = zip(*rows)
+        masks = issue_masks(dict(zip(RULE_COLUMNS, columns)))
+        cursor.executemany("UPDATE infrastructure SET issue_mask = ? WHERE id = ?", zip(map(int, masks), ids))
+
+# --- Rollups ---
+# Summary tables kept up to date by triggers, so every insert path (form,
+# bulk load, ingestion service) maintains them in the same transaction:
+#   rollup_totals  running totals per metric (dashboard cards)
+#   rollup_counts  readings per station per hour/day, below/above threshold
+#   rollup_latest  latest reading per station
+# Readings are append-only; rebuild_rollups() recomputes everything from the
+# raw tables (plus the archived_* contributions) if they are ever edited by hand.
+# Sentiment totals count only the labels of the configured model (SENTIMENT_VERSION);
+# labels stored by other versions, e.g. a backfill trial, leave them alone.
+# The tables are created by migrations.py, which also recreates the triggers
+# and rebuilds when the thresholds below or the model version change.
+CHLORINE_MIN = 0.2
+CHLORINE_MAX = 0.5
+TURBIDITY_MAX = 5
+SENTIMENT_VERSION_SQL = "'" + SENTIMENT_VERSION.replace("'", "''") + "'"  # as a quoted SQL literal
+
+def _bump(metric, amount):
+    return f"""
+    INSERT INTO rollup_totals (metric, value) VALUES ({metric}, {amount})
+    ON CONFLICT(metric) DO UPDATE SET value = value + excluded.value;"""
+
+def _count(kind, station, below, above):
+    return "".join(f"""
+    INSERT INTO rollup_counts (kind, station, period, start_ts, total, below, above)
+    VALUES ('{kind}', {station}, '{period}', NEW.ts - NEW.ts % {seconds}, 1, {below}, {above})
+    ON CONFLICT(kind, station, period, start_ts) DO UPDATE SET
+        total = total + 1, below = below + excluded.below, above = above + excluded.above;"""
+        for period, seconds in (("hour", 3600), ("day", 86400)))
+
+def _latest(kind, station, value):
+    return f"""
+    INSERT INTO rollup_latest (kind, station, reading_id, ts, value)
+    VALUES ('{kind}', {station}, NEW.id, NEW.ts, {value})
+    ON CONFLICT(kind, station) DO UPDATE SET
+        reading_id = excluded.reading_id, ts = excluded.ts, value = excluded.value
+    WHERE excluded.ts >= rollup_latest.ts;"""
+
+ROLLUP_TRIGGERS = {
+    "rollup_chlorine_insert": f"""AFTER INSERT ON chlorine BEGIN
+        {_bump("'chlorine_total'", 1)}
+        {_bump("'chlorine_low'", f"NEW.chlorine_level < {CHLORINE_MIN}")}
+        {_bump("'chlorine_high'", f"NEW.chlorine_level > {CHLORINE_MAX}")}
+        {_count("chlorine", "NEW.tap_stand_id", f"NEW.chlorine_level < {CHLORINE_MIN}", f"NEW.chlorine_level > {CHLORINE_MAX}")}
+        {_latest("chlorine", "NEW.tap_stand_id", "NEW.chlorine_level")}
+    END""",
+    "rollup_quality_insert": f"""AFTER INSERT ON quality BEGIN
+        {_bump("'quality_total'", 1)}
+        {_bump("'quality_high_turbidity'", f"NEW.turbidity > {TURBIDITY_MAX}")}
+        {_count("quality", "NEW.source_id", 0, f"NEW.turbidity > {TURBIDITY_MAX}")}
+        {_latest("quality", "NEW.source_id", "NEW.turbidity")}
+    END""",
+    "rollup_infrastructure_insert": f"""AFTER INSERT ON infrastructure BEGIN
+        {_bump("'infrastructure_total'", 1)}
+        {_bump("'infrastructure_alerts'", "NEW.issue_mask != 0")}
+        {_latest("infrastructure", "NEW.location", "NEW.water_available_liters")}
+    END""",
+    "rollup_feedback_insert": f"""AFTER INSERT ON feedback BEGIN
+        {_bump("'feedback_total'", 1)}
+    END""",
+    "rollup_sentiment_insert": f"""AFTER INSERT ON feedback_sentiment
+    WHEN NEW.model_version = {SENTIMENT_VERSION_SQL} BEGIN
+        {_bump("'feedback_sentiment:' || NEW.label", 1)}
+    END""",
+    "rollup_sentiment_update": f"""AFTER UPDATE OF label ON feedback_sentiment
+    WHEN NEW.model_version = {SENTIMENT_VERSION_SQL} BEGIN
+        {_bump("'feedback_sentiment:' || OLD.label", -1)}
+        {_bump("'feedback_sentiment:' || NEW.label", 1)}
+        DELETE FROM rollup_totals WHERE metric = 'feedback_sentiment:' || OLD.label AND value = 0;
+    END""",
+    "rollup_sentiment_delete": f"""AFTER DELETE ON feedback_sentiment
+    WHEN OLD.model_version = {SENTIMENT_VERSION_SQL} BEGIN
+        {_bump("'feedback_sentiment:' || OLD.label", -1)}
+        DELETE FROM rollup_totals WHERE metric = 'feedback_sentiment:' || OLD.label AND value = 0;
+    END""",
+}
+
+def _archived(kind, column):
+    return f"(SELECT COALESCE(SUM({column}), 0) FROM archived_counts WHERE kind = '{kind}' AND period = 'day')"
+
+# What each rollup table should contain, computed from the raw tables and the archived rows
+ROLLUP_SOURCES = {
+    "rollup_totals": f"""
+        SELECT 'chlorine_total', COUNT(*) + {_archived("chlorine", "total")} FROM chlorine
+        UNION ALL SELECT 'chlorine_low', COALESCE(SUM(chlorine_level < {CHLORINE_MIN}), 0) + {_archived("chlorine", "below")} FROM chlorine
+        UNION ALL SELECT 'chlorine_high', COALESCE(SUM(chlorine_level > {CHLORINE_MAX}), 0) + {_archived("chlorine", "above")} FROM chlorine
+        UNION ALL SELECT 'quality_total', COUNT(*) + {_archived("quality", "total")} FROM quality
+        UNION ALL SELECT 'quality_high_turbidity', COALESCE(SUM(turbidity > {TURBIDITY_MAX}), 0) + {_archived("quality", "above")} FROM quality
+        UNION ALL SELECT 'infrastructure_total', COUNT(*) FROM infrastructure
+        UNION ALL SELECT 'infrastructure_alerts', COALESCE(SUM(issue_mask != 0), 0) FROM infrastructure
+        UNION ALL SELECT 'feedback_total', COUNT(*) FROM feedback
+        UNION ALL SELECT 'feedback_sentiment:' || label, COUNT(*) FROM feedback_sentiment
+            WHERE model_version = {SENTIMENT_VERSION_SQL} GROUP BY label
+    """,
+    "rollup_counts": "SELECT kind, station, period, start_ts, SUM(total), SUM(below), SUM(above) FROM (" + " UNION ALL ".join(
+        f"""
+        SELECT 'chlorine' AS kind, tap_stand_id AS station, '{period}' AS period, ts - ts % {seconds} AS start_ts, COUNT(*) AS total,
+               SUM(chlorine_level < {CHLORINE_MIN}) AS below, SUM(chlorine_level > {CHLORINE_MAX}) AS above
+        FROM chlorine GROUP BY tap_stand_id, ts - ts % {seconds}
+        UNION ALL
+        SELECT 'quality', source_id, '{period}', ts - ts % {seconds}, COUNT(*), 0, SUM(turbidity > {TURBIDITY_MAX})
+        FROM quality GROUP BY source_id, ts - ts % {seconds}"""
+        for period, seconds in (("hour", 3600), ("day", 86400))
+    ) + """
+        UNION ALL SELECT kind, station, period, start_ts, total, below, above FROM archived_counts
+    ) GROUP BY kind, station, period, start_ts""",
+    "rollup_latest": """
+        SELECT kind, station, id, ts, value FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY kind, station ORDER BY ts DESC, id DESC) AS rn FROM (
+                SELECT 'chlorine' AS kind, tap_stand_id AS station, id, ts, chlorine_level AS value FROM chlorine
+                UNION ALL SELECT 'quality', source_id, id, ts, turbidity FROM quality
+                UNION ALL SELECT 'infrastructure', location, id, ts, water_available_liters FROM infrastructure
+                UNION ALL SELECT kind, station, reading_id, ts, value FROM archived_latest
+            )
+        ) WHERE rn = 1
+    """,
+}
+
+def rollup_triggers_current(cursor):
+    # True when every rollup trigger exists with its current definition; a plain read
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    stored = dict(cursor.fetchall())
+    return all(body in stored.get(name, "") for name, body in ROLLUP_TRIGGERS.items())
+
+def create_rollup_triggers(cursor, replace=False):
+    # Returns True when a trigger was missing or its stored definition is outdated
+    changed = False
+    for name, body in ROLLUP_TRIGGERS.items():
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+        row = cursor.fetchone()
+        if row is not None and body in row[0] and not replace:
+            continue
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"CREATE TRIGGER {name} {body}")
+        changed = True
+    return changed
+
+def rebuild_rollups(cursor):
+    # Recreate the triggers and issue masks (thresholds may have changed) and recompute every rollup
+    create_rollup_triggers(cursor, replace=True)
+    refresh_issue_masks(cursor, all_rows=True)
+    for table, source in ROLLUP_SOURCES.items():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} {source}")
+
+def check_rollups(cursor):
+    # {table: number of rows that differ from a fresh recomputation}
+    mismatches = {}
+    for table, source in ROLLUP_SOURCES.items():
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT * FROM (SELECT * FROM {table} EXCEPT SELECT * FROM ({source}))
+                UNION ALL
+                SELECT * FROM (SELECT * FROM ({source}) EXCEPT SELECT * FROM {table})
+            )
+        """)
+        mismatches[table] = cursor.fetchone()[0]
+    return mismatches
+
+def to_ts(value):
+    # Accepts epoch seconds, a datetime/date, or an ISO string; naive values are read as UTC
+    if value is None or value == "" or value != value:  # value != value catches NaN
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.lstrip("-").isdigit():
+            return int(value)
+        value = datetime.datetime.fromisoformat(value)
+    if not isinstance(value, datetime.date):
+        return int(value)
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+def reading_ts(date, time):
+    return to_ts(f"{date}T{time}")
 
 def get_all_chlorine():
     with db_connection() as cursor:
+        archived = archive.read_range(cursor, "chlorine", ["tap_stand_id", "date", "time", "chlorine_level"])
         cursor.execute("SELECT tap_stand_id, date, time, chlorine_level FROM chlorine")
-        return cursor.fetchall()
+        return archived + cursor.fetchall()
 
 def insert_chlorine(tap_stand_id, date, time, chlorine_level):
-    with db_connection() as cursor:
+    # Returns the number of anomalies the reading raised
+    ts = reading_ts(date, time)
+    with db_connection(immediate=True) as cursor:
         cursor.execute(
-            "INSERT INTO chlorine (tap_stand_id, date, time, chlorine_level) VALUES (?, ?, ?, ?)",
-            (tap_stand_id, date, time, chlorine_level)
+            "INSERT INTO chlorine (tap_stand_id, date, time, chlorine_level, ts) VALUES (?, ?, ?, ?, ?)",
+            (tap_stand_id, date, time, chlorine_level, ts)
         )
+        return anomaly.update_states(cursor, [(tap_stand_id, ts, chlorine_level)])
+
+def get_chlorine_range(t0=None, t1=None, tap_stand_id=None):
+    # Readings with t0 <= ts < t1, optionally for one tap stand; open bounds when None
+    return _range("chlorine", "tap_stand_id, date, time, chlorine_level, ts", "tap_stand_id", tap_stand_id, t0, t1)
+
+def get_chlorine_stations():
+    # From rollup_latest (one row per tap stand, archived ones included) rather than a scan of the readings
+    with db_connection() as cursor:
+        cursor.execute("SELECT station FROM rollup_latest WHERE kind = 'chlorine' ORDER BY station")
+        return [row[0] for row in cursor.fetchall()]
+
+def get_chlorine_bounds(tap_stand_id=None):
+    # (first ts, last ts) answered from the ts indexes and the archive manifest. MIN and MAX
+    # are separate subqueries: together in one SELECT, SQLite scans the whole ts index
+    hot, archived = ("", "") if tap_stand_id is None else ("WHERE tap_stand_id = ?", "AND station = ?")
+    with db_connection() as cursor:
+        cursor.execute(f"""
+            SELECT MIN(lo), MAX(hi) FROM (
+                SELECT (SELECT MIN(ts) FROM chlorine {hot}) AS lo, (SELECT MAX(ts) FROM chlorine {hot}) AS hi
+                UNION ALL
+                SELECT MIN(min_ts), MAX(max_ts) FROM archive_files WHERE table_name = 'chlorine' {archived}
+            )
+        """, () if tap_stand_id is None else (tap_stand_id,) * 3)
+        return cursor.fetchone()
 
 def get_all_quality():
     with db_connection() as cursor:
+        archived = archive.read_range(cursor, "quality", ["source_id", "turbidity", "odour_present"])
         cursor.execute("SELECT source_id, turbidity, odour_present FROM quality")
-        return cursor.fetchall()
+        return archived + cursor.fetchall()
 
-def insert_quality(source_id, turbidity, odour_present):
+def insert_quality(source_id, turbidity, odour_present, ts=None):
     with db_connection() as cursor:
         cursor.execute(
-            "INSERT INTO quality (source_id, turbidity, odour_present) VALUES (?, ?, ?)",
-            (source_id, turbidity, odour_present)
+            "INSERT INTO quality (source_id, turbidity, odour_present, ts) VALUES (?, ?, ?, ?)",
+            (source_id, turbidity, odour_present, int(time.time()) if ts is None else to_ts(ts))
         )
 
+def get_quality_range(t0=None, t1=None, source_id=None):
+    return _range("quality", "source_id, turbidity, odour_present, ts", "source_id", source_id, t0, t1)
+
 def get_all_feedback():
     with db_connection() as cursor:
         cursor.execute("SELECT household_id, feedback_text FROM feedback")
         return cursor.fetchall()
 
-def insert_feedback(household_id, feedback_text):
-    with db_connection() as cursor:
+def insert_feedback(household_id, feedback_text, ts=None):
+    with db_connection(immediate=True) as cursor:
         cursor.execute(
-            "INSERT INTO feedback (household_id, feedback_text) VALUES (?, ?)",
-            (household_id, feedback_text)
+            "INSERT INTO feedback (household_id, feedback_text, ts) VALUES (?, ?, ?)",
+            (household_id, feedback_text, int(time.time()) if ts is None else to_ts(ts))
         )
+        terms.index_pending(cursor)
+
+def get_unlabeled_feedback(model_version, after_id=None, limit=None):
+    # (id, text) of feedback without a label from model_version, in id order;
+    # after_id and limit page through a large backlog with rowid seeks
+    sql = """
+        SELECT f.id, f.feedback_text FROM feedback f
+        LEFT JOIN feedback_sentiment s ON s.feedback_id = f.id AND s.model_version = ?
+        WHERE s.feedback_id IS NULL AND f.id > ?
+        ORDER BY f.id
+    """
+    with db_connection() as cursor:
+        cursor.execute(sql + (" LIMIT ?" if limit is not None else ""),
+                       (model_version, after_id or 0) + ((limit,) if limit is not None else ()))
+        return cursor.fetchall()
+
+def get_unlabeled_feedback_count(model_version, after_id=None):
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*) FROM feedback f
+            LEFT JOIN feedback_sentiment s ON s.feedback_id = f.id AND s.model_version = ?
+            WHERE s.feedback_id IS NULL AND f.id > ?
+        """, (model_version, after_id or 0))
+        return cursor.fetchone()[0]
+
+def _upsert_sentiment(cursor, results):
+    # Upsert rather than INSERT OR REPLACE so the rollup update trigger sees relabels;
+    # each model version keeps its own label, so writing one never replaces another
+    cursor.executemany("""
+        INSERT INTO feedback_sentiment (feedback_id, model_version, label, score) VALUES (?, ?, ?, ?)
+        ON CONFLICT(feedback_id, model_version) DO UPDATE SET
+            label = excluded.label, score = excluded.score
+    """, results)
+
+def save_feedback_sentiment(results):
+    # results: iterable of (feedback_id, model_version, label, score)
+    with db_connection() as cursor:
+        _upsert_sentiment(cursor, results)
+
+# --- Sentiment backfill checkpoints ---
+# backfill_sentiment.py labels a backlog chunk by chunk; each chunk's labels and
+# the id they reach are committed together, so a resumed run starts after the
+# last committed chunk without repeating or skipping rows.
+
+def get_backfill_checkpoint(model_version):
+    # (last feedback id covered, rows labelled so far); (0, 0) before the first chunk
+    with db_connection() as cursor:
+        cursor.execute("SELECT last_id, rows FROM sentiment_backfill WHERE model_version = ?", (model_version,))
+        return cursor.fetchone() or (0, 0)
+
+def save_backfill_chunk(model_version, results, last_id):
+    # results as for save_feedback_sentiment; last_id is the largest feedback id the chunk covered
+    results = list(results)
+    with db_connection(immediate=True) as cursor:
+        _upsert_sentiment(cursor, results)
+        cursor.execute("""
+            INSERT INTO sentiment_backfill (model_version, last_id, rows, updated_ts) VALUES (?, ?, ?, ?)
+            ON CONFLICT(model_version) DO UPDATE SET
+                last_id = MAX(last_id, excluded.last_id), rows = rows + excluded.rows, updated_ts = excluded.updated_ts
+        """, (model_version, last_id, len(results), int(time.time())))
+
+def clear_backfill_checkpoint(model_version):
+    with db_connection() as cursor:
+        cursor.execute("DELETE FROM sentiment_backfill WHERE model_version = ?", (model_version,))
+
+def get_feedback_with_sentiment(model_version):
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT f.household_id, f.feedback_text, s.label, s.score FROM feedback f
+            LEFT JOIN feedback_sentiment s ON s.feedback_id = f.id AND s.model_version = ?
+            ORDER BY f.id
+        """, (model_version,))
+        return cursor.fetchall()
+
+def get_term_frequencies(limit=200, label=None, model_version=None, t0=None, t1=None):
+    # {term: count} for the most frequent feedback terms. Unfiltered counts come straight
+    # from term_totals; a sentiment label (for model_version) or a t0 <= ts < t1 window
+    # sums the postings of the matching feedback instead.
+    with db_connection() as cursor:
+        if label is None and t0 is None and t1 is None:
+            cursor.execute("SELECT term, count FROM term_totals ORDER BY count DESC LIMIT ?", (limit,))
+            return dict(cursor.fetchall())
+        joins, where, params = [], [], []
+        if label is not None:
+            joins.append("JOIN feedback_sentiment s ON s.feedback_id = f.id AND s.model_version = ? AND s.label = ?")
+            params += [model_version, label]
+        if t0 is not None:
+            where.append("f.ts >= ?")
+            params.append(to_ts(t0))
+        if t1 is not None:
+            where.append("f.ts < ?")
+            params.append(to_ts(t1))
+        cursor.execute(f"""
+            SELECT t.term, SUM(t.count) AS total FROM feedback f
+            JOIN feedback_terms t ON t.feedback_id = f.id
+            {" ".join(joins)}
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY t.term ORDER BY total DESC LIMIT ?
+        """, params + [limit])
+        return dict(cursor.fetchall())
 
 def get_all_infrastructure():
     with db_connection() as cursor:
         cursor.execute("SELECT location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters FROM infrastructure")
         return cursor.fetchall()
 
-def insert_infrastructure(location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters):
+def insert_infrastructure(location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts=None):
+    # Returns the report's issue bitmask (see rules.RULES); 0 means no issues
+    mask = issue_mask(dict(generator_ok=generator_ok, pump_ok=pump_ok, pipe_leak=pipe_leak, road_condition=road_condition, water_available_liters=water_available_liters))
     with db_connection() as cursor:
         cursor.execute(
-            "INSERT INTO infrastructure (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters)
+            "INSERT INTO infrastructure (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts, issue_mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, int(time.time()) if ts is None else to_ts(ts), mask)
         )
+    return mask
+
+def get_infrastructure_range(t0=None, t1=None, location=None):
+    return _range("infrastructure", "location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts", "location", location, t0, t1)
+
+def _range(table, columns, key_column, key, t0, t1):
+    # Served by the (key, ts) and (ts) indexes instead of a full-table scan.
+    # columns must end with ts; archived rows in range are merged in on it.
+    t0, t1 = to_ts(t0), to_ts(t1)
+    where, params = [], []
+    if key is not None:
+        where.append(f"{key_column} = ?")
+        params.append(key)
+    if t0 is not None:
+        where.append("ts >= ?")
+        params.append(t0)
+    if t1 is not None:
+        where.append("ts < ?")
+        params.append(t1)
+    sql = f"SELECT {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    with db_connection() as cursor:
+        cursor.execute(sql + " ORDER BY ts, id", params)
+        rows = cursor.fetchall()
+        archived = archive.read_range(cursor, table, [c.strip() for c in columns.split(",")], key, t0, t1)
+    return list(heapq.merge(archived, rows, key=itemgetter(-1))) if archived else rows
+
+# --- Streaming reads ---
+# Chunked scans in (ts, id) order for exports. Each chunk is a separate keyset
+# query that resumes after the last row returned, so nothing stays open between
+# chunks and memory is bounded by chunk_size whatever the table size.
+
+def _iter_range(columns, source, key_column, key, t0, t1, chunk_size, params=()):
+    # source names the base table t (plus any joins); yields lists of rows
+    where, args = [], list(params)
+    if key is not None:
+        where.append(f"t.{key_column} = ?")
+        args.append(key)
+    if t0 is not None:
+        where.append("t.ts >= ?")
+        args.append(to_ts(t0))
+    if t1 is not None:
+        where.append("t.ts < ?")
+        args.append(to_ts(t1))
+    last = None
+    while True:
+        clauses = where + (["(t.ts, t.id) > (?, ?)"] if last else [])
+        sql = f"SELECT {columns}, t.id FROM {source}" + (" WHERE " + " AND ".join(clauses) if clauses else "") + " ORDER BY t.ts, t.id LIMIT ?"
+        with db_connection() as cursor:
+            cursor.execute(sql, args + (list(last) if last else []) + [chunk_size])
+            rows = cursor.fetchall()
+        if not rows:
+            return
+        last = rows[-1][-2:]
+        yield [row[:-1] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+def iter_chlorine_range(t0=None, t1=None, tap_stand_id=None, chunk_size=10000):
+    # Archived chunks first, then the rows still in SQLite
+    archived = archive.iter_range("chlorine", ["tap_stand_id", "date", "time", "chlorine_level", "ts"],
+                                  tap_stand_id, to_ts(t0), to_ts(t1), chunk_size)
+    return chain(archived, _iter_range("t.tap_stand_id, t.date, t.time, t.chlorine_level, t.ts", "chlorine t",
+                       "tap_stand_id", tap_stand_id, t0, t1, chunk_size))
+
+def iter_quality_range(t0=None, t1=None, source_id=None, chunk_size=10000):
+    archived = archive.iter_range("quality", ["source_id", "turbidity", "odour_present", "ts"], source_id, to_ts(t0), to_ts(t1), chunk_size)
+    return chain(archived, _iter_range("t.source_id, t.turbidity, t.odour_present, t.ts", "quality t",
+                       "source_id", source_id, t0, t1, chunk_size))
+
+def iter_feedback_range(model_version, t0=None, t1=None, household_id=None, chunk_size=10000):
+    # Feedback with its label for model_version (None when not classified yet)
+    return _iter_range("t.household_id, t.feedback_text, s.label, s.score, t.ts",
+                       "feedback t LEFT JOIN feedback_sentiment s ON s.feedback_id = t.id AND s.model_version = ?",
+                       "household_id", household_id, t0, t1, chunk_size, params=(model_version,))
+
+def iter_infrastructure_range(t0=None, t1=None, location=None, chunk_size=10000):
+    return _iter_range("t.location, t.generator_ok, t.pump_ok, t.pipe_leak, t.road_condition, t.comments, t.water_available_liters, t.ts",
+                       "infrastructure t",
+                       "location", location, t0, t1, chunk_size)
+
+# --- Paginated and windowed reads ---
+# Keyset pagination on id: pass the smallest id of a page as before_id to get
+# the next older page (newest first), or the largest id as after_id to walk
+# forwards (oldest first). Each page costs an index seek plus `limit` rows.
+
+def _page(table, columns, key_column, key, after_id, before_id, limit):
+    where, params = [], []
+    if key is not None:
+        where.append(f"{key_column} = ?")
+        params.append(key)
+    if after_id is not None:
+        where.append("id > ?")
+        params.append(after_id)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+    sql = f"SELECT id, {columns} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY id {'ASC' if after_id is not None else 'DESC'} LIMIT ?"
+    with db_connection() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+def _window_bounds(hours, end):
+    end = time.time() if end is None else to_ts(end)
+    return end - hours * 3600, end + 1
+
+def get_chlorine_page(after_id=None, before_id=None, limit=500, tap_stand_id=None):
+    return _page("chlorine", "tap_stand_id, date, time, chlorine_level, ts", "tap_stand_id", tap_stand_id, after_id, before_id, limit)
+
+def get_chlorine_window(hours=24, tap_stand_id=None, end=None):
+    # Readings in the `hours` up to and including `end` (default: now)
+    t0, t1 = _window_bounds(hours, end)
+    return get_chlorine_range(t0, t1, tap_stand_id)
+
+def get_quality_page(after_id=None, before_id=None, limit=500, source_id=None):
+    return _page("quality", "source_id, turbidity, odour_present, ts", "source_id", source_id, after_id, before_id, limit)
+
+def get_quality_window(hours=24, source_id=None, end=None):
+    t0, t1 = _window_bounds(hours, end)
+    return get_quality_range(t0, t1, source_id)
+
+def get_infrastructure_page(after_id=None, before_id=None, limit=500, location=None):
+    return _page("infrastructure", "location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts", "location", location, after_id, before_id, limit)
+
+def get_infrastructure_window(hours=24, location=None, end=None):
+    t0, t1 = _window_bounds(hours, end)
+    return get_infrastructure_range(t0, t1, location)
+
+def get_latest_infrastructure():
+    # Most recent report per location, found through the rollup_latest table
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT i.location, i.generator_ok, i.pump_ok, i.pipe_leak, i.road_condition, i.comments, i.water_available_liters, i.ts
+            FROM rollup_latest r JOIN infrastructure i ON i.id = r.reading_id
+            WHERE r.kind = 'infrastructure' ORDER BY r.station
+        """)
+        return cursor.fetchall()
+
+def get_feedback_page(model_version, after_id=None, before_id=None, limit=500, label=None):
+    where, params = [], [model_version]
+    if label is not None:
+        where.append("s.label = ?")
+        params.append(label)
+    if after_id is not None:
+        where.append("f.id > ?")
+        params.append(after_id)
+    if before_id is not None:
+        where.append("f.id < ?")
+        params.append(before_id)
+    sql = """
+        SELECT f.id, f.household_id, f.feedback_text, s.label, s.score, f.ts FROM feedback f
+        LEFT JOIN feedback_sentiment s ON s.feedback_id = f.id AND s.model_version = ?
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY f.id {'ASC' if after_id is not None else 'DESC'} LIMIT ?"
+    with db_connection() as cursor:
+        cursor.execute(sql, params + [limit])
+        return cursor.fetchall()
+
+# --- Incremental reads (live refresh) ---
+# Live views remember the largest id they have seen (a high-water mark) and ask
+# only for rows above it. Ids follow commit order, since there is one writer at
+# a time, so nothing committed later can land below the mark. The lookup is a
+# rowid range seek; filters carry a unary + so SQLite does not switch to the
+# (station, ts) index and walk the station's whole history instead.
+
+def _since(table, columns, key_column, key, after_id, t0, t1):
+    where, params = ["id > ?"], [after_id]
+    if key is not None:
+        where.append(f"+{key_column} = ?")
+        params.append(key)
+    if t0 is not None:
+        where.append("+ts >= ?")
+        params.append(to_ts(t0))
+    if t1 is not None:
+        where.append("+ts < ?")
+        params.append(to_ts(t1))
+    with db_connection() as cursor:
+        cursor.execute(f"SELECT id, {columns} FROM {table} WHERE {' AND '.join(where)} ORDER BY id", params)
+        return cursor.fetchall()
+
+def get_chlorine_since(after_id=None, t0=None, t1=None, tap_stand_id=None):
+    # (id, tap_stand_id, date, time, chlorine_level, ts) rows with t0 <= ts < t1 inserted after
+    # after_id, in id order; with after_id None, the whole range in ts order as get_chlorine_range
+    columns = "tap_stand_id, date, time, chlorine_level, ts"
+    if after_id is None:
+        return _range("chlorine", "id, " + columns, "tap_stand_id", tap_stand_id, t0, t1)
+    return _since("chlorine", columns, "tap_stand_id", tap_stand_id, after_id, t0, t1)
+
+def get_infrastructure_since(after_id=None):
+    # (id, location, ..., ts) reports inserted after after_id, in id order; with after_id None,
+    # the latest report per location as get_latest_infrastructure
+    columns = "location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts"
+    if after_id is not None:
+        return _since("infrastructure", columns, "location", None, after_id, None, None)
+    with db_connection() as cursor:
+        cursor.execute(f"""
+            SELECT i.id, {', '.join('i.' + c for c in columns.split(', '))}
+            FROM rollup_latest r JOIN infrastructure i ON i.id = r.reading_id
+            WHERE r.kind = 'infrastructure' ORDER BY r.station
+        """)
+        return cursor.fetchall()
+
+# --- Rollup reads (dashboard cards and summaries) ---
+
+def get_rollup_totals():
+    # {metric: value}, e.g. chlorine_low, quality_total, feedback_sentiment:NEGATIVE
+    with db_connection() as cursor:
+        cursor.execute("SELECT metric, value FROM rollup_totals")
+        return dict(cursor.fetchall())
+
+def get_rollup_counts(kind, period="hour", station=None, t0=None, t1=None):
+    where, params = ["kind = ?", "period = ?"], [kind, period]
+    if station is not None:
+        where.append("station = ?")
+        params.append(station)
+    if t0 is not None:
+        where.append("start_ts >= ?")
+        params.append(to_ts(t0))
+    if t1 is not None:
+        where.append("start_ts < ?")
+        params.append(to_ts(t1))
+    with db_connection() as cursor:
+        cursor.execute(
+            f"SELECT station, start_ts, total, below, above FROM rollup_counts WHERE {' AND '.join(where)} ORDER BY start_ts, station",
+            params
+        )
+        return cursor.fetchall()
+
+def get_latest_readings(kind):
+    # [(station, reading_id, ts, value)] for kind in chlorine, quality, infrastructure
+    with db_connection() as cursor:
+        cursor.execute("SELECT station, reading_id, ts, value FROM rollup_latest WHERE kind = ? ORDER BY station", (kind,))
+        return cursor.fetchall()
+
+# --- Alert outbox ---
+
+def _enqueue(cursor, alerts):
+    now = time.time()
+    rows = [(channel, subject, body, now, now) for channel, subject, body in alerts]
+    cursor.executemany(
+        "INSERT INTO alert_outbox (channel, subject, body, next_attempt_ts, created_ts) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    return len(rows)
+
+def enqueue_alerts(alerts):
+    # alerts: iterable of (channel, subject, body); returns the number queued
+    with db_connection() as cursor:
+        return _enqueue(cursor, alerts)
+
+def claim_alerts(limit=50, stale_after=300):
+    # Atomically mark due alerts as 'sending' and return them as (id, channel, subject, body, attempts).
+    # Alerts stuck in 'sending' longer than stale_after seconds (a crashed worker) are claimed again.
+    now = time.time()
+    with db_connection(immediate=True) as cursor:
+        cursor.execute("""
+            SELECT id, channel, subject, body, attempts FROM alert_outbox
+            WHERE (status = 'pending' AND next_attempt_ts <= ?) OR (status = 'sending' AND claimed_ts < ?)
+            ORDER BY id LIMIT ?
+        """, (now, now - stale_after, limit))
+        claimed = cursor.fetchall()
+        cursor.executemany(
+            "UPDATE alert_outbox SET status = 'sending', claimed_ts = ? WHERE id = ?",
+            [(now, row[0]) for row in claimed]
+        )
+    return claimed
+
+def mark_alert_sent(alert_id):
+    with db_connection() as cursor:
+        cursor.execute(
+            "UPDATE alert_outbox SET status = 'sent', attempts = attempts + 1, sent_ts = ?, last_error = NULL WHERE id = ?",
+            (time.time(), alert_id)
+        )
+
+def mark_alert_failed(alert_id, error, retry_at=None):
+    # retry_at=None gives up on the alert; otherwise it is retried at that time
+    with db_connection() as cursor:
+        cursor.execute(
+            "UPDATE alert_outbox SET status = ?, attempts = attempts + 1, next_attempt_ts = COALESCE(?, next_attempt_ts), last_error = ? WHERE id = ?",
+            ("failed" if retry_at is None else "pending", retry_at, str(error), alert_id)
+        )
+
+def get_alert_state():
+    # (location, issue_mask, last_sent_ts) for every alert sent and not yet cleared
+    with db_connection() as cursor:
+        cursor.execute("SELECT location, issue_mask, last_sent_ts FROM alert_state")
+        return cursor.fetchall()
+
+def record_alerts(keys, recovered=(), cooldown=0, compose=None, anomaly_ids=()):
+    # keys: (location, issue_mask, fingerprint) due for an alert. Each key is claimed with a
+    # conditional upsert inside one immediate transaction, so concurrent sessions cannot
+    # both claim it within the cooldown. Returns the claimed keys as
+    # (location, issue_mask, fingerprint, previous_mask), previous_mask being the other
+    # issue set alerted for the location within the cooldown, if any.
+    # State for the recovered locations is cleared so a relapse alerts again.
+    # compose(claimed) returns the (channel, subject, body) messages for the claimed keys;
+    # they are queued, and anomaly_ids marked notified, in the same transaction, so an
+    # alert is never recorded as sent without its messages in the outbox.
+    now = time.time()
+    claimed = []
+    with db_connection(immediate=True) as cursor:
+        cursor.executemany("DELETE FROM alert_state WHERE location = ?", [(location,) for location in recovered])
+        for location, mask, fingerprint in keys:
+            cursor.execute("""
+                SELECT issue_mask FROM alert_state
+                WHERE location = ? AND issue_mask != ? AND last_sent_ts > ?
+                ORDER BY last_sent_ts DESC LIMIT 1
+            """, (location, mask, now - cooldown))
+            previous = cursor.fetchone()
+            cursor.execute("""
+                INSERT INTO alert_state (location, issue_mask, fingerprint, first_sent_ts, last_sent_ts)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (location, issue_mask) DO UPDATE SET
+                    last_sent_ts = excluded.last_sent_ts, sent_count = sent_count + 1
+                WHERE last_sent_ts <= ?
+            """, (location, mask, fingerprint, now, now, now - cooldown))
+            if cursor.rowcount:
+                claimed.append((location, mask, fingerprint, previous[0] if previous else None))
+        if claimed and compose is not None:
+            _enqueue(cursor, compose(claimed))
+        cursor.executemany("UPDATE chlorine_anomalies SET notified = 1 WHERE id = ?", [(i,) for i in anomaly_ids])
+    return claimed
+
+def get_unnotified_chlorine_anomalies(after_id=0, limit=500):
+    # Unsent anomaly events as (id, tap_stand_id, ts, kind, value, detail) in id order;
+    # record_alerts(anomaly_ids=...) marks them notified once their alert is queued
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT id, tap_stand_id, ts, kind, value, detail FROM chlorine_anomalies
+            WHERE notified = 0 AND id > ? ORDER BY id LIMIT ?
+        """, (after_id, limit))
+        return cursor.fetchall()
+
+def flag_missing_chlorine(now=None):
+    # Record "missing" events for taps that stopped reporting; returns how many
+    with db_connection(immediate=True) as cursor:
+        return anomaly.flag_missing(cursor, int(time.time() if now is None else now))
+
+def get_chlorine_anomalies(t0=None, t1=None, tap_stand_id=None):
+    # (tap_stand_id, ts, kind, value, detail) with t0 <= ts < t1, newest first
+    return _range("chlorine_anomalies", "tap_stand_id, ts, kind, value, detail", "tap_stand_id", tap_stand_id, t0, t1)[::-1]
+
+def get_outbox_counts():
+    # {status: count} over the outbox
+    with db_connection() as cursor:
+        cursor.execute("SELECT status, COUNT(*) FROM alert_outbox GROUP BY status")
+        return dict(cursor.fetchall())
+
+# --- Bulk ingestion ---
+# Each insert_*_bulk function accepts a DataFrame or an iterable of dicts or
+# tuples (in column order; the trailing ts is optional), validates every row and writes it with executemany,
+# one transaction per batch. Returns one stats dict per batch. An invalid row
+# raises ValueError unless skip_invalid=True; batches before it stay committed.
+
+CHLORINE_COLUMNS = ("tap_stand_id", "date", "time", "chlorine_level", "ts")
+QUALITY_COLUMNS = ("source_id", "turbidity", "odour_present", "ts")
+FEEDBACK_COLUMNS = ("household_id", "feedback_text", "ts")
+INFRASTRUCTURE_COLUMNS = ("location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters", "ts")
+
+def _required_text(value, name):
+    if value is None or str(value).strip() == "":
+        raise ValueError(f"{name} is required")
+    return str(value).strip()
+
+def _yes_no(value, name):
+    value = _required_text(value, name).capitalize()
+    if value not in ("Yes", "No"):
+        raise ValueError(f"{name} must be Yes or No, got {value!r}")
+    return value
+
+def _non_negative(value, name, cast=float):
+    try:
+        number = cast(float(value)) if cast is int else cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+    if number < 0:
+        raise ValueError(f"{name} must not be negative")
+    return number
+
+def _iso(value, name, parse):
+    value = _required_text(value, name)
+    try:
+        return parse(value).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} is not ISO formatted, got {value!r}") from None
+
+def _parse_ts(value):
+    try:
+        return to_ts(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"ts must be epoch seconds or an ISO datetime, got {value!r}") from None
+
+def _ts_or_now(value):
+    ts = _parse_ts(value)
+    return int(time.time()) if ts is None else ts
+
+def validate_chlorine(row):
+    tap_stand_id, date, time, chlorine_level, ts = row
+    date = _iso(date, "date", datetime.date.fromisoformat)
+    time = _iso(time, "time", datetime.time.fromisoformat)
+    ts = _parse_ts(ts)
+    if ts is None:
+        ts = reading_ts(date, time)
+    return (_required_text(tap_stand_id, "tap_stand_id"), date, time, _non_negative(chlorine_level, "chlorine_level"), ts)
+
+def validate_quality(row):
+    source_id, turbidity, odour_present, ts = row
+    return (_required_text(source_id, "source_id"), _non_negative(turbidity, "turbidity"), _yes_no(odour_present, "odour_present"), _ts_or_now(ts))
+
+def validate_feedback(row):
+    household_id, feedback_text, ts = row
+    return (_required_text(household_id, "household_id"), _required_text(feedback_text, "feedback_text"), _ts_or_now(ts))
+
+def validate_infrastructure(row):
+    location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts = row
+    return (
+        _required_text(location, "location"),
+        _yes_no(generator_ok, "generator_ok"),
+        _yes_no(pump_ok, "pump_ok"),
+        _yes_no(pipe_leak, "pipe_leak"),
+        _required_text(road_condition, "road_condition"),
+        "" if comments is None else str(comments),
+        _non_negative(water_available_liters, "water_available_liters", cast=int),
+        _ts_or_now(ts),
+    )
+
+def _as_tuples(records, columns):
+    if hasattr(records, "itertuples"):
+        records = records.reindex(columns=list(columns)).itertuples(index=False, name=None)
+    for record in records:
+        if isinstance(record, dict):
+            yield tuple(record.get(column) for column in columns)
+        elif len(record) == len(columns) - 1:
+            yield tuple(record) + (None,)
+        else:
+            yield tuple(record)
+
+def _infrastructure_masks(rows):
+    # Vectorised issue masks for a batch of validated infrastructure rows
+    positions = [INFRASTRUCTURE_COLUMNS.index(column) for column in RULE_COLUMNS]
+    columns = {column: [row[i] for row in rows] for column, i in zip(RULE_COLUMNS, positions)}
+    return [(int(mask),) for mask in issue_masks(columns)]
+
+def _bulk_insert(table, columns, validate, records, batch_size, skip_invalid, derived=(), on_insert=None):
+    # derived: (column names, fn(valid_rows) -> per-row tuples) for columns computed per batch
+    # on_insert: fn(cursor, valid_rows) run in each batch's transaction after the insert
+    derived_columns, derive = derived or ((), None)
+    all_columns = columns + tuple(derived_columns)
+    sql = f"INSERT INTO {table} ({', '.join(all_columns)}) VALUES ({', '.join('?' * len(all_columns))})"
+    rows = enumerate(_as_tuples(records, columns))
+    stats = []
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        start = time.perf_counter()
+        valid, rejected = [], []
+        for index, row in chunk:
+            try:
+                if len(row) != len(columns):
+                    raise ValueError(f"expected {len(columns)} fields, got {len(row)}")
+                valid.append(validate(row))
+            except ValueError as e:
+                if not skip_invalid:
+                    raise ValueError(f"{table} row {index}: {e}") from None
+                rejected.append((index, str(e)))
+        if derive is not None and valid:
+            valid = [row + extra for row, extra in zip(valid, derive(valid))]
+        with db_connection(immediate=on_insert is not None) as cursor:
+            cursor.executemany(sql, valid)
+            if on_insert is not None and valid:
+                on_insert(cursor, valid)
+        elapsed = time.perf_counter() - start
+        stats.append({
+            "table": table,
+            "rows": len(valid),
+            "rejected": rejected,
+            "seconds": elapsed,
+            "rows_per_sec": len(valid) / elapsed if elapsed else float("inf"),
+        })
+    return stats
+
+def _chlorine_anomalies(cursor, rows):
+    anomaly.update_states(cursor, [(tap, ts, level) for tap, _, _, level, ts in rows])
+
+def insert_chlorine_bulk(records, batch_size=5000, skip_invalid=False):
+    return _bulk_insert("chlorine", CHLORINE_COLUMNS, validate_chlorine, records, batch_size, skip_invalid,
+                        on_insert=_chlorine_anomalies)
+
+def insert_quality_bulk(records, batch_size=5000, skip_invalid=False):
+    return _bulk_insert("quality", QUALITY_COLUMNS, validate_quality, records, batch_size, skip_invalid)
+
+def insert_feedback_bulk(records, batch_size=5000, skip_invalid=False):
+    return _bulk_insert("feedback", FEEDBACK_COLUMNS, validate_feedback, records, batch_size, skip_invalid,
+                        on_insert=lambda cursor, rows: terms.index_pending(cursor))
+
+def insert_infrastructure_bulk(records, batch_size=5000, skip_invalid=False):
+    return _bulk_insert("infrastructure", INFRASTRUCTURE_COLUMNS, validate_infrastructure, records, batch_size, skip_invalid,
+                        derived=(("issue_mask",), _infrastructure_masks))
+
+# --- Archiving ---
+# Moves readings with ts < before into Parquet a month at a time (see archive.py).
+# Each month is read from one snapshot and written to files first; the manifest,
+# the archived rollup contributions and the DELETE then commit together, so an
+# interrupted run leaves only unlisted files, which remove_orphans() cleans up.
+# Readings inserted later with an old ts stay in SQLite until the next run.
+
+# table: (below-threshold expression, above-threshold expression, rollup_latest value)
+ARCHIVE_ROLLUPS = {
+    "chlorine": (f"chlorine_level < {CHLORINE_MIN}", f"chlorine_level > {CHLORINE_MAX}", "chlorine_level"),
+    "quality": ("0", f"turbidity > {TURBIDITY_MAX}", "turbidity"),
+}
+
+def _archive_month(table, start, end):
+    key_column, columns = archive.TABLES[table]
+    below, above, value = ARCHIVE_ROLLUPS[table]
+    files, moved, max_id = [], 0, 0
+    try:
+        with db_connection() as cursor:
+            cursor.execute("BEGIN")  # one snapshot for every station of the month
+            cursor.execute("""
+                SELECT DISTINCT station FROM rollup_counts
+                WHERE kind = ? AND period = 'day' AND start_ts >= ? AND start_ts < ?
+            """, (table, start, end))
+            for (station,) in cursor.fetchall():
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} = ? AND ts >= ? AND ts < ? ORDER BY ts, id",
+                               (station, start, end))
+                rows = cursor.fetchall()
+                if rows:
+                    files.append(archive.write_partition(table, start, station, rows))
+                    moved += len(rows)
+                    max_id = max(max_id, max(row[0] for row in rows))
+    except BaseException:
+        archive.remove_files([f[2] for f in files])
+        raise
+    if not files:
+        return 0, 0
+
+    try:
+        with db_connection(immediate=True) as cursor:
+            cursor.executemany("""
+                INSERT INTO archive_files (table_name, station, month, path, rows, min_ts, max_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(table, *f) for f in files])
+            bounds = (start, end, max_id)
+            for period, seconds in (("hour", 3600), ("day", 86400)):
+                cursor.execute(f"""
+                    INSERT INTO archived_counts (kind, station, period, start_ts, total, below, above)
+                    SELECT '{table}', {key_column}, '{period}', ts - ts % {seconds}, COUNT(*), SUM({below}), SUM({above})
+                    FROM {table} WHERE ts >= ? AND ts < ? AND id <= ?
+                    GROUP BY {key_column}, ts - ts % {seconds}
+                    ON CONFLICT (kind, station, period, start_ts) DO UPDATE SET
+                        total = total + excluded.total, below = below + excluded.below, above = above + excluded.above
+                """, bounds)
+            cursor.execute(f"""
+                INSERT INTO archived_latest (kind, station, reading_id, ts, value)
+                SELECT '{table}', station, id, ts, value FROM (
+                    SELECT {key_column} AS station, id, ts, {value} AS value,
+                           ROW_NUMBER() OVER (PARTITION BY {key_column} ORDER BY ts DESC, id DESC) AS rn
+                    FROM {table} WHERE ts >= ? AND ts < ? AND id <= ?
+                ) WHERE rn = 1
+                ON CONFLICT (kind, station) DO UPDATE SET
+                    reading_id = excluded.reading_id, ts = excluded.ts, value = excluded.value
+                WHERE excluded.ts > archived_latest.ts
+                   OR (excluded.ts = archived_latest.ts AND excluded.reading_id > archived_latest.reading_id)
+            """, bounds)
+            cursor.execute(f"DELETE FROM {table} WHERE ts >= ? AND ts < ? AND id <= ?", bounds)
+            if cursor.rowcount != moved:
+                raise RuntimeError(f"{table}: {cursor.rowcount} rows to delete but {moved} archived; nothing was moved")
+    except BaseException:
+        archive.remove_files([f[2] for f in files])
+        raise
+    return moved, len(files)
+
+def archive_readings(table, before):
+    # Move `table` readings with ts < before to the archive; returns (rows moved, files written)
+    before = to_ts(before)
+    with db_connection() as cursor:
+        cursor.execute(f"SELECT MIN(ts) FROM {table} WHERE ts < ?", (before,))
+        first = cursor.fetchone()[0]
+    moved = files = 0
+    month = archive.month_start(first) if first is not None else before
+    while month < before:
+        end = min(archive.next_month(month), before)
+        month_rows, month_files = _archive_month(table, month, end)
+        moved += month_rows
+        files += month_files
+        month = end
+    return moved, files
+
+def vacuum():
+    # Return the space of deleted rows to the filesystem and truncate the WAL
+    with db_connection() as cursor:
+        cursor.execute("VACUUM")
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+# --- Instrumentation ---
+# Public reads and writes are timed under the "db" stage; a flag check when profiling is off
+instrument.wrap_functions(globals(), "db", [
+    name for name, fn in list(globals().items())
+    if callable(fn) and getattr(fn, "__module__", None) == __name__
+    and name.startswith(("get_", "insert_", "save_", "enqueue_", "claim_", "mark_", "record_", "flag_"))
+])
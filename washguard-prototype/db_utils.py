@@ -1,11 +1,133 @@
+import os
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
 
+# Database location; override with the WASHGUARD_DB environment variable or configure()
+DB_PATH = os.getenv("WASHGUARD_DB", "washguard.db")
+# How long a connection waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT_MS = int(os.getenv("WASHGUARD_DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Applied to every new connection. WAL lets readers run alongside a writer,
+# and synchronous=NORMAL is durable in WAL mode while skipping most fsyncs.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-32000",     # ~32 MB page cache per connection
+    "PRAGMA mmap_size=268435456",   # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Connections shared by all threads, up to POOL_SIZE. Streamlit runs every rerun in a
+# new thread, so a per-thread connection would be reopened (and its PRAGMAs re-run)
+# on nearly every rerun; pooled connections survive across reruns and sessions.
+# A connection is used by one thread at a time, between checkout and checkin.
+POOL_SIZE = int(os.getenv("WASHGUARD_DB_POOL_SIZE", "8"))
+_pool = queue.LifoQueue()  # idle (connection, settings); most recently used first
+_pool_lock = threading.Lock()
+_opened = 0
+_local = threading.local()  # the connection this thread has checked out, for nested db_connection()
+
+def configure(path=None, busy_timeout_ms=None):
+    global DB_PATH, BUSY_TIMEOUT_MS
+    if path is not None:
+        DB_PATH = path
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = busy_timeout_ms
+    # Connections in use are closed when they are checked back in
+    close_connections()
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn, (DB_PATH, BUSY_TIMEOUT_MS)
+
+def _checkout():
+    # (connection, settings it was opened with); waits up to the busy timeout when all are in use
+    global _opened
+    try:
+        conn, settings = _pool.get_nowait()
+    except queue.Empty:
+        with _pool_lock:
+            can_open = _opened < POOL_SIZE
+            if can_open:
+                _opened += 1
+        if can_open:
+            try:
+                return _connect()
+            except BaseException:
+                with _pool_lock:
+                    _opened -= 1
+                raise
+        try:
+            conn, settings = _pool.get(timeout=BUSY_TIMEOUT_MS / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"no free database connection after {BUSY_TIMEOUT_MS} ms") from None
+    if settings == (DB_PATH, BUSY_TIMEOUT_MS):
+        return conn, settings
+    conn.close()  # opened before configure() changed the settings
+    try:
+        return _connect()
+    except BaseException:
+        with _pool_lock:
+            _opened -= 1
+        raise
+
+def _checkin(conn, settings):
+    global _opened
+    if settings == (DB_PATH, BUSY_TIMEOUT_MS):
+        _pool.put((conn, settings))
+        return
+    conn.close()
+    with _pool_lock:
+        _opened -= 1
+
+def close_connections():
+    # Close the idle pooled connections
+    global _opened
+    while True:
+        try:
+            conn, _ = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+        with _pool_lock:
+            _opened -= 1
+
 @contextmanager
-def db_connection():
-    conn = sqlite3.connect("washguard.db")
+def db_connection(immediate=False):
+    # Yields a cursor on a pooled connection and commits on success. A nested call on
+    # the same thread reuses the connection already checked out and joins its
+    # transaction: only the outermost block commits or rolls back.
+    # immediate=True takes the write lock up front (BEGIN IMMEDIATE), so
+    # read-then-write transactions wait on busy_timeout instead of failing mid-way.
+    # Nested, it is a no-op inside an immediate block; inside a deferred block that
+    # has already written it raises, since the lock can no longer be taken up front.
+    held = getattr(_local, "held", None)
+    if held is None:
+        held = _local.held = [*_checkout(), 0, False]  # connection, settings, depth, immediate
+    conn = held[0]
+    if immediate and conn.in_transaction and not held[3]:
+        raise sqlite3.OperationalError("db_connection(immediate=True) nested inside a deferred transaction")
+    held[2] += 1
+    cursor = conn.cursor()
     try:
-        yield conn.cursor()
-        conn.commit()
+        if immediate and not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+            held[3] = True
+        yield cursor
+        if held[2] == 1:
+            conn.commit()
+    except BaseException:
+        if held[2] == 1:
+            conn.rollback()
+        raise
     finally:
-        conn.close()
+        cursor.close()
+        held[2] -= 1
+        if not held[2]:
+            _local.held = None
+            _checkin(held[0], held[1])
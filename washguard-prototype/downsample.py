@@ -0,0 +1,50 @@
+# Reduce long time series to what a chart can actually show
+#
+# Min/max (M4) bucketing: the x range is split into equal time buckets and each
+# bucket keeps its first, last, lowest and highest point, so spikes and dips
+# survive. Threshold crossings are kept too, so a line that dips below a limit
+# still crosses it at the right time.
+import numpy as np
+
+POINTS_PER_PIXEL = 2  # buckets per horizontal pixel are 1/4 of this, since each keeps up to 4 points
+
+
+def buckets_for_width(width_px):
+    return max(1, int(width_px * POINTS_PER_PIXEL / 4))
+
+
+def m4_indices(x, y, n_buckets, thresholds=()):
+    # Sorted indices of the points to keep; x must be ascending (e.g. epoch seconds)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= 4 * n_buckets:
+        return np.arange(n)
+
+    span = x[-1] - x[0]
+    bucket = np.zeros(n, dtype=np.int64) if span <= 0 else \
+        np.minimum(((x - x[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    # Within each bucket, sorting by y puts its minimum first and maximum last
+    by_value = np.lexsort((y, bucket))
+    keep = [starts, ends, by_value[starts], by_value[ends]]
+
+    for threshold in thresholds:
+        below = y < threshold
+        crossings = np.flatnonzero(below[1:] != below[:-1]) + 1
+        if len(crossings):
+            # First crossing of each bucket, with the point before it
+            first = crossings[np.r_[True, bucket[crossings[1:]] != bucket[crossings[:-1]]]]
+            keep += [first - 1, first]
+
+    return np.unique(np.concatenate(keep))
+
+
+def downsample_frame(df, x, y, width_px, thresholds=()):
+    # Rows of df (sorted by x) reduced for a chart width_px wide
+    values = df[x].to_numpy()
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype("datetime64[s]").astype(np.int64)
+    return df.iloc[m4_indices(values, df[y].to_numpy(), buckets_for_width(width_px), thresholds)]
@@ -0,0 +1,153 @@
+# Streaming CSV and Parquet exports of the WashGuard tables
+#
+#   python export.py chlorine -o chlorine.csv
+#   python export.py quality --format parquet --start 2025-01-01 --end 2025-02-01 --station Source-0001 -o q.parquet
+#
+# Rows are read from SQLite a chunk at a time (database.iter_*_range), given the
+# same derived columns as the app's tables and written out before the next chunk
+# is read, so peak memory depends on --chunk-size rather than the export size.
+# Parquet output needs pyarrow; each chunk becomes one row group.
+import argparse
+import datetime
+import sys
+
+import pandas as pd
+
+import database as db
+import migrations
+import rules
+from sentiment import SENTIMENT_VERSION
+
+CHUNK_SIZE = 50000
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def chlorine_status(level):
+    return "🔴 Low" if level < 0.2 else "🔴 High" if level > 0.5 else "✅ OK"
+
+
+def _chlorine(df):
+    df["status"] = df["chlorine_level"].map(chlorine_status)
+    return df
+
+
+def _quality(df):
+    df["treatment"] = df["turbidity"].map(lambda x: "PUR" if x > 5 else "Aqua Tabs")
+    return df
+
+
+def _infrastructure(df):
+    return rules.flag_infrastructure(df).drop(columns=["issue_mask"])
+
+
+# table: (reader(t0, t1, key, chunk_size), columns as read, derive(df) -> df, station label)
+TABLES = {
+    "chlorine": (
+        lambda t0, t1, key, n: db.iter_chlorine_range(t0, t1, key, chunk_size=n),
+        ["tap_stand_id", "date", "time", "chlorine_level", "ts"], _chlorine, "Tap Stand ID",
+    ),
+    "quality": (
+        lambda t0, t1, key, n: db.iter_quality_range(t0, t1, key, chunk_size=n),
+        ["source_id", "turbidity", "odour_present", "ts"], _quality, "Source ID",
+    ),
+    "feedback": (
+        lambda t0, t1, key, n: db.iter_feedback_range(SENTIMENT_VERSION, t0, t1, key, chunk_size=n),
+        ["household_id", "feedback_text", "sentiment", "score", "ts"], None, "Household ID",
+    ),
+    "infrastructure": (
+        lambda t0, t1, key, n: db.iter_infrastructure_range(t0, t1, key, chunk_size=n),
+        ["location", "generator_ok", "pump_ok", "pipe_leak", "road_condition", "comments", "water_available_liters", "ts"],
+        _infrastructure, "Location",
+    ),
+}
+
+
+def _frame(table, rows):
+    _, columns, derive, _ = TABLES[table]
+    df = pd.DataFrame(rows, columns=columns)
+    if derive is not None:
+        df = derive(df)
+    df["recorded_at"] = pd.to_datetime(df.pop("ts").astype("int64"), unit="s")  # naive UTC; tz-aware values write far slower to CSV
+    return df
+
+
+def frames(table, t0=None, t1=None, station=None, chunk_size=CHUNK_SIZE):
+    # Yields DataFrames of at most chunk_size rows in time order, with derived columns
+    # and the unix ts replaced by a "recorded_at" timestamp in UTC
+    reader = TABLES[table][0]
+    for rows in reader(t0, t1, station, chunk_size):
+        yield _frame(table, rows)
+
+
+def _write_parquet(out, table, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, schema, rows = None, None, 0
+    try:
+        for df in chunks:
+            if writer is None:
+                # Fixed by the first chunk; labels may all be missing there, so keep them typed
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                for name, type_ in (("sentiment", pa.string()), ("score", pa.float64())):
+                    if name in schema.names:
+                        schema = schema.set(schema.get_field_index(name), pa.field(name, type_))
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(_frame(table, []), preserve_index=False), out)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write(out, table, fmt="csv", t0=None, t1=None, station=None, chunk_size=CHUNK_SIZE):
+    # Stream an export to a path or binary file object; returns the number of rows written
+    chunks = frames(table, t0, t1, station, chunk_size)
+    if fmt == "parquet":
+        return _write_parquet(out, table, chunks)
+    f = open(out, "wb") if isinstance(out, str) else out
+    rows = 0
+    try:
+        for df in chunks:
+            f.write(df.to_csv(index=False, header=rows == 0).encode("utf-8"))
+            rows += len(df)
+        if rows == 0:
+            f.write(_frame(table, []).to_csv(index=False).encode("utf-8"))
+    finally:
+        if f is not out:
+            f.close()
+    return rows
+
+
+def file_name(table, fmt, t0=None, t1=None, station=None):
+    parts = [table, station, t0 and str(t0)[:10], t1 and str(t1)[:10]]
+    return "_".join(str(p).replace(" ", "-") for p in parts if p) + f".{fmt}"
+
+
+def _date(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a WashGuard table to CSV or Parquet without loading it into memory")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("-o", "--output", help="output file (default: derived from the table and filters)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--start", type=_date, help="first day or timestamp to include (ISO, UTC)")
+    parser.add_argument("--end", type=_date, help="exclusive end (ISO, UTC)")
+    parser.add_argument("--station", help="tap stand, source, household or location id")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    output = args.output or file_name(args.table, args.format, args.start, args.end, args.station)
+    rows = write(output, args.table, args.format, args.start, args.end, args.station, args.chunk_size)
+    print(f"📄 Wrote {rows} rows to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# Fill the WashGuard database with synthetic readings for load tests and benchmarks
+#
+#   python generate_data.py --rows 100000                  # 100k rows in every table
+#   python generate_data.py --chlorine 10000000 --stations 2000 --days 365
+#
+# Chlorine follows a daily demand cycle per tap stand, with injected faults on a
+# fraction of stations: under-dosing episodes, stuck sensors, spikes and gaps in
+# reporting. Quality readings have rain-driven turbidity events, infrastructure
+# reports have multi-day outages, and feedback mixes positive and negative text.
+# Rows are produced in time order, a chunk at a time, so memory stays flat at any scale.
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import database as db
+import migrations
+
+DAY = 86400
+FAULTS = ("underdose", "stuck", "spike", "gap")
+
+POSITIVE_FEEDBACK = (
+    "We are happy with the clean water.",
+    "Thank you for repairing the pump so quickly.",
+    "The water quality has improved this week.",
+    "Water pressure is good at the {place} tap now.",
+    "The queue at the {place} tap is short in the mornings.",
+)
+NEGATIVE_FEEDBACK = (
+    "Water pressure is too low at the {place} tap.",
+    "Please fix the broken tap near the {place}.",
+    "The tap stand near the {place} has been dry since Monday.",
+    "Water smells of chlorine and children refuse to drink it.",
+    "Queue at the {place} borehole is very long, please add another tap.",
+    "The water is dirty and brown after the rain.",
+)
+PLACES = ("school", "market", "clinic", "church", "mosque", "football field", "river", "camp office")
+
+
+def _timestamps(start_ts, days, steps):
+    return start_ts + np.linspace(0, days * DAY, steps, endpoint=False).astype(np.int64)
+
+
+def _date_time(ts):
+    text = np.datetime_as_string(ts.astype("datetime64[s]"))
+    return [t[:10] for t in text], [t[11:] for t in text]
+
+
+def chlorine_rows(n, stations, days, start_ts, fault_rate=0.05, seed=0, chunk=50000):
+    # Yields (tap_stand_id, date, time, chlorine_level, ts) tuples, n in total
+    rng = np.random.default_rng(seed)
+    stations = max(1, min(stations, n))
+    steps = -(-n // stations)
+    taps = np.array([f"TS-{i:05d}" for i in range(stations)])
+    base = rng.uniform(0.3, 0.45, stations)
+    phase = rng.uniform(-2, 2, stations)
+
+    # One fault window per faulty station, as [start, end) step indices
+    fault = np.where(rng.random(stations) < fault_rate, rng.integers(0, len(FAULTS), stations), -1)
+    fault_start = rng.integers(0, max(1, steps), stations)
+    fault_end = fault_start + rng.integers(1, max(2, steps // 10), stations)
+    stuck_value = np.round(rng.uniform(0.1, 0.6, stations), 2)
+
+    ts_all = _timestamps(start_ts, days, steps)
+    per_chunk = max(1, chunk // stations)
+    emitted = 0
+    for s0 in range(0, steps, per_chunk):
+        idx = np.arange(s0, min(steps, s0 + per_chunk))
+        ts = ts_all[idx]
+        hours = (ts % DAY) / 3600
+        # Lowest residual chlorine in the morning peak, when demand draws the tanks down
+        level = (base[:, None] + 0.06 * np.sin(2 * np.pi * (hours[None, :] - 14 + phase[:, None]) / 24)
+                 + rng.normal(0, 0.02, (stations, len(idx))))
+        in_fault = (idx[None, :] >= fault_start[:, None]) & (idx[None, :] < fault_end[:, None])
+        level = np.where(in_fault & (fault == 0)[:, None], level * 0.3, level)
+        level = np.where(in_fault & (fault == 1)[:, None], stuck_value[:, None], level)
+        level = np.where((idx[None, :] == fault_start[:, None]) & (fault == 2)[:, None], level + 0.5, level)
+        keep = ~(in_fault & (fault == 3)[:, None])
+        level = np.round(np.clip(level, 0, None), 3)
+
+        # Time-major order, as readings would arrive
+        order_station, order_step = np.nonzero(keep.T)[::-1]
+        dates, times = _date_time(ts)
+        for step, station in zip(order_step, order_station):
+            if emitted >= n:
+                return
+            yield str(taps[station]), dates[step], times[step], float(level[station, step]), int(ts[step])
+            emitted += 1
+
+
+def _sorted_times(rng, n, days, start_ts, chunk):
+    # (chunk start index, sorted timestamps) over consecutive slices of the period
+    pieces = -(-n // chunk)
+    span = days * DAY / pieces
+    for k in range(pieces):
+        size = min(chunk, n - k * chunk)
+        lo = start_ts + int(k * span)
+        yield k * chunk, np.sort(rng.integers(lo, lo + max(1, int(span)), size))
+
+
+def quality_rows(n, sources, days, start_ts, seed=0, chunk=100000):
+    # Yields (source_id, turbidity, odour_present, ts); rain events push turbidity above 5 NTU
+    rng = np.random.default_rng(seed + 1)
+    sources = max(1, min(sources, n))
+    ids = [f"Source-{i:04d}" for i in range(sources)]
+    rainy_days = rng.choice(max(1, days), size=max(1, days // 7), replace=False)
+    for _, ts in _sorted_times(rng, n, days, start_ts, chunk):
+        size = len(ts)
+        source = rng.integers(0, sources, size)
+        turbidity = rng.lognormal(0.8, 0.45, size)
+        turbidity = np.round(np.where(np.isin((ts - start_ts) // DAY, rainy_days), turbidity * 4, turbidity), 2)
+        odour = np.where(rng.random(size) < np.where(turbidity > 8, 0.6, 0.05), "Yes", "No")
+        for i in range(size):
+            yield ids[source[i]], float(turbidity[i]), str(odour[i]), int(ts[i])
+
+
+def feedback_rows(n, households, days, start_ts, negative_rate=0.4, seed=0, chunk=100000):
+    # Yields (household_id, feedback_text, ts)
+    rng = np.random.default_rng(seed + 2)
+    for _, ts in _sorted_times(rng, n, days, start_ts, chunk):
+        size = len(ts)
+        negative = rng.random(size) < negative_rate
+        household = rng.integers(0, max(1, households), size)
+        template = rng.integers(0, 1 << 30, size)
+        place = rng.integers(0, len(PLACES), size)
+        for i in range(size):
+            templates = NEGATIVE_FEEDBACK if negative[i] else POSITIVE_FEEDBACK
+            text = templates[template[i] % len(templates)].format(place=PLACES[place[i]])
+            yield f"HH-{household[i]:06d}", text, int(ts[i])
+
+
+def infrastructure_rows(n, locations, days, start_ts, fault_rate=0.05, seed=0):
+    # Yields (location, generator_ok, pump_ok, pipe_leak, road_condition, comments, water_available_liters, ts).
+    # Outages last several reports at a location rather than flickering per report.
+    rng = np.random.default_rng(seed + 3)
+    locations = max(1, min(locations, n))
+    names = [f"Zone {i:04d}" for i in range(locations)]
+    outage = {"generator": np.zeros(locations, int), "pump": np.zeros(locations, int), "leak": np.zeros(locations, int)}
+    capacity = rng.integers(200, 1000, locations)
+    water = capacity.astype(float)
+    reports = -(-n // locations)
+    ts_all = _timestamps(start_ts, days, reports)
+    emitted = 0
+    for step in range(reports):
+        for kind, remaining in outage.items():
+            starts = (remaining == 0) & (rng.random(locations) < fault_rate / 5)
+            remaining[starts] = rng.integers(2, 10, starts.sum())
+        # Reserves drift back towards capacity and drain while the pump is down
+        water = np.clip(0.8 * water + 0.2 * capacity + rng.normal(0, 30, locations) - 150 * (outage["pump"] > 0), 0, 1000)
+        roads = rng.choice(["Good", "Muddy", "Flooded"], locations, p=[0.9, 0.07, 0.03])
+        for i in range(locations):
+            if emitted >= n:
+                return
+            generator_ok = "No" if outage["generator"][i] else "Yes"
+            pump_ok = "No" if outage["pump"][i] else "Yes"
+            leak = "Yes" if outage["leak"][i] else "No"
+            comments = "All systems go" if generator_ok == pump_ok == "Yes" and leak == "No" else "Team notified"
+            yield names[i], generator_ok, pump_ok, leak, str(roads[i]), comments, int(water[i]), int(ts_all[step])
+            emitted += 1
+        for remaining in outage.values():
+            np.subtract(remaining, 1, out=remaining, where=remaining > 0)
+
+
+def generate(counts, stations=500, days=90, start_ts=None, fault_rate=0.05, seed=0, batch_size=5000, report=print):
+    # counts: {table: rows}; loads each table through the validated bulk insert path
+    start_ts = int(time.time()) - days * DAY if start_ts is None else start_ts
+    sources = {
+        "chlorine": lambda n: chlorine_rows(n, stations, days, start_ts, fault_rate, seed),
+        "quality": lambda n: quality_rows(n, max(1, stations // 5), days, start_ts, seed),
+        "feedback": lambda n: feedback_rows(n, stations * 20, days, start_ts, seed=seed),
+        "infrastructure": lambda n: infrastructure_rows(n, max(1, stations // 10), days, start_ts, fault_rate, seed),
+    }
+    loaders = {
+        "chlorine": db.insert_chlorine_bulk,
+        "quality": db.insert_quality_bulk,
+        "feedback": db.insert_feedback_bulk,
+        "infrastructure": db.insert_infrastructure_bulk,
+    }
+    summary = {}
+    for table, n in counts.items():
+        if not n:
+            continue
+        start = time.perf_counter()
+        stats = loaders[table](sources[table](n), batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        rows = sum(batch["rows"] for batch in stats)
+        summary[table] = {"rows": rows, "seconds": elapsed}
+        report(f"✅ {table}: {rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s)")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic WASH data into washguard.db")
+    parser.add_argument("--rows", type=int, default=10000, help="rows for every table not given explicitly")
+    for table in ("chlorine", "quality", "feedback", "infrastructure"):
+        parser.add_argument(f"--{table}", type=int, default=None, help=f"rows of {table} data")
+    parser.add_argument("--stations", type=int, default=500, help="tap stands (sources and zones scale from this)")
+    parser.add_argument("--days", type=int, default=90, help="history length, ending now")
+    parser.add_argument("--fault-rate", type=float, default=0.05, help="share of stations with an injected fault")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    counts = {table: args.rows if getattr(args, table) is None else getattr(args, table)
+              for table in ("chlorine", "quality", "feedback", "infrastructure")}
+    generate(counts, args.stations, args.days, fault_rate=args.fault_rate, seed=args.seed, batch_size=args.batch_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+# Standalone HTTP ingestion service for tap-stand and water-source sensors
+#
+#   python ingest.py --port 8502
+#   curl -X POST localhost:8502/ingest/chlorine -d '[{"tap_stand_id": "TS-1", "date": "2025-01-01", "time": "08:00:00", "chlorine_level": 0.3}]'
+#
+# POST /ingest/<table> takes a JSON array of readings, {"readings": [...]}, or
+# newline-delimited JSON (Content-Type: application/x-ndjson), with the same
+# fields as load_readings.py. Readings are validated on arrival (the response
+# lists rejected rows by index), buffered in memory and written by one flusher
+# through the database.py bulk inserts, once a table has --flush-rows readings
+# waiting or the oldest has waited --flush-seconds. Accepted readings are only
+# in memory until that flush, and a clean shutdown (Ctrl+C, SIGTERM) flushes them.
+#
+# When --max-buffer readings are waiting, requests wait up to --backpressure-wait
+# seconds for room and are then refused with 503 and Retry-After, so senders slow
+# down instead of the service running out of memory. GET /metrics reports
+# throughput, buffer depth and lag; GET /health is a liveness check.
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+
+import database as db
+import migrations
+
+TABLES = {
+    "chlorine": (db.CHLORINE_COLUMNS, db.validate_chlorine, db.insert_chlorine_bulk),
+    "quality": (db.QUALITY_COLUMNS, db.validate_quality, db.insert_quality_bulk),
+    "infrastructure": (db.INFRASTRUCTURE_COLUMNS, db.validate_infrastructure, db.insert_infrastructure_bulk),
+}
+
+FLUSH_ROWS = int(os.getenv("INGEST_FLUSH_ROWS", "5000"))
+FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "1.0"))
+MAX_BUFFER = int(os.getenv("INGEST_MAX_BUFFER", "100000"))
+BACKPRESSURE_WAIT = float(os.getenv("INGEST_BACKPRESSURE_WAIT", "5.0"))
+MAX_BODY_BYTES = int(os.getenv("INGEST_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+LAG_WINDOW = 1000  # flushes kept for lag percentiles
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class Ingestor:
+    def __init__(self, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, max_buffer=MAX_BUFFER,
+                 backpressure_wait=BACKPRESSURE_WAIT):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.backpressure_wait = backpressure_wait
+        self.buffers = {table: [] for table in TABLES}
+        self.first_received = {}  # table -> monotonic time its oldest buffered reading arrived
+        self.buffered = 0
+        self.started = time.time()
+        self.counters = {"received": 0, "accepted": 0, "rejected": 0, "written": 0, "refused": 0, "flushes": 0, "flush_errors": 0}
+        self.commit_lag = deque(maxlen=LAG_WINDOW)  # seconds from arrival of a flush's oldest reading to commit
+        self.event_lag = {}  # table -> seconds from the newest reading's ts to its commit, last flush
+        self._wake = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._closing = False
+
+    def validate(self, table, records):
+        columns, validate, _ = TABLES[table]
+        valid, rejected = [], []
+        for index, record in enumerate(records):
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError("expected an object")
+                valid.append(validate(tuple(record.get(column) for column in columns)))
+            except ValueError as e:
+                rejected.append({"index": index, "error": str(e)})
+        return valid, rejected
+
+    async def submit(self, table, records):
+        # Returns (accepted, rejected); raises OverflowError when the buffer stays full
+        valid, rejected = self.validate(table, records)
+        self.counters["received"] += len(records)
+        self.counters["rejected"] += len(rejected)
+        if valid:
+            if self.buffered + len(valid) > self.max_buffer:
+                self._wake.set()
+                try:
+                    async with self._room:
+                        await asyncio.wait_for(
+                            self._room.wait_for(lambda: self.buffered + len(valid) <= self.max_buffer or self.buffered == 0),
+                            self.backpressure_wait)
+                except asyncio.TimeoutError:
+                    self.counters["refused"] += len(valid)
+                    raise OverflowError(f"{self.buffered} readings waiting to be written") from None
+            self.first_received.setdefault(table, time.monotonic())
+            self.buffers[table].extend(valid)
+            self.buffered += len(valid)
+            self.counters["accepted"] += len(valid)
+            if len(self.buffers[table]) >= self.flush_rows:
+                self._wake.set()
+        return len(valid), rejected
+
+    def _due(self):
+        now = time.monotonic()
+        return [table for table, rows in self.buffers.items() if rows and (
+            self._closing or len(rows) >= self.flush_rows or now - self.first_received[table] >= self.flush_seconds)]
+
+    async def flush(self, tables):
+        for table in tables:
+            rows, self.buffers[table] = self.buffers[table], []
+            received = self.first_received.pop(table)
+            _, _, insert_bulk = TABLES[table]
+            try:
+                # The write runs in a worker thread so the event loop keeps accepting readings
+                await asyncio.to_thread(insert_bulk, rows, batch_size=len(rows))
+            except Exception as e:
+                # Put the readings back (ahead of newer ones) and retry on the next cycle
+                self.counters["flush_errors"] += 1
+                self.buffers[table][:0] = rows
+                self.first_received[table] = received
+                print(f"❌ {table} flush of {len(rows)} readings failed: {e}", file=sys.stderr)
+                continue
+            committed = time.monotonic()
+            self.counters["written"] += len(rows)
+            self.counters["flushes"] += 1
+            self.commit_lag.append(committed - received)
+            self.event_lag[table] = time.time() - max(row[-1] for row in rows)
+            self.buffered -= len(rows)
+            async with self._room:
+                self._room.notify_all()
+
+    async def run(self):
+        # Flusher: wakes on a full buffer or every flush_seconds / 4 to check the oldest reading's age.
+        # After close() it flushes what is left and returns (giving up if a final flush fails).
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds / 4)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            errors = self.counters["flush_errors"]
+            due = self._due()
+            if due:
+                await self.flush(due)
+            if self._closing and (not self.buffered or self.counters["flush_errors"] > errors):
+                return
+
+    def close(self):
+        # Stop waiting for full buffers; call once the server no longer accepts requests
+        self._closing = True
+        self._wake.set()
+
+    def metrics(self):
+        lags = sorted(self.commit_lag)
+        uptime = time.time() - self.started
+        return {
+            **self.counters,
+            "buffered": self.buffered,
+            "buffered_by_table": {table: len(rows) for table, rows in self.buffers.items()},
+            "oldest_buffered_s": max((time.monotonic() - t for t in self.first_received.values()), default=0.0),
+            "commit_lag_p50_s": lags[len(lags) // 2] if lags else None,
+            "commit_lag_max_s": lags[-1] if lags else None,
+            "event_lag_s": self.event_lag,
+            "written_per_s": self.counters["written"] / uptime if uptime else 0.0,
+            "uptime_s": uptime,
+        }
+
+
+def parse_body(body, content_type):
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get("readings")
+    if not isinstance(data, list):
+        raise ValueError('expected a JSON array or {"readings": [...]}')
+    return data
+
+
+async def handle_request(ingestor, method, path, headers, body):
+    # (status, payload, extra headers)
+    if path == "/health":
+        return 200, {"status": "ok"}, {}
+    if path == "/metrics":
+        return 200, ingestor.metrics(), {}
+    parts = path.strip("/").split("/")
+    if len(parts) != 2 or parts[0] != "ingest" or parts[1] not in TABLES:
+        return 404, {"error": f"unknown path {path}; POST to /ingest/<{'|'.join(TABLES)}>"}, {}
+    if method != "POST":
+        return 405, {"error": "use POST"}, {}
+    try:
+        records = parse_body(body, headers.get("content-type", ""))
+    except ValueError as e:  # includes json.JSONDecodeError
+        return 400, {"error": f"invalid body: {e}"}, {}
+    try:
+        accepted, rejected = await ingestor.submit(parts[1], records)
+    except OverflowError as e:
+        return 503, {"error": f"busy: {e}"}, {"Retry-After": "1"}
+    return (202 if accepted or not records else 400), {"accepted": accepted, "rejected": rejected}, {}
+
+
+async def serve_connection(ingestor, reader, writer):
+    # Minimal HTTP/1.1 with keep-alive: enough for sensor gateways and load tests
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            method, path, *_ = request_line.decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                status, payload, extra = 413, {"error": f"body over {MAX_BODY_BYTES} bytes"}, {}
+                headers["connection"] = "close"
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, payload, extra = await handle_request(ingestor, method, path.split("?")[0], headers, body)
+            data = json.dumps(payload).encode()
+            keep_alive = headers.get("connection", "").lower() != "close"
+            head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}", "Content-Type: application/json",
+                    f"Content-Length: {len(data)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            head += [f"{name}: {value}" for name, value in extra.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, ingestor, report_every=10.0):
+    server = await asyncio.start_server(lambda r, w: serve_connection(ingestor, r, w), host, port)
+    flusher = asyncio.create_task(ingestor.run())
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    print(f"📡 Ingesting on http://{host}:{port}/ingest/<{'|'.join(TABLES)}>")
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_every)
+            m = ingestor.metrics()
+            print(json.dumps({"event": "ingest", **{k: m[k] for k in ("written", "buffered", "refused", "rejected", "commit_lag_max_s")}}))
+
+    reporter = asyncio.create_task(report())
+    await stop.wait()
+    server.close()
+    await server.wait_closed()
+    reporter.cancel()
+    ingestor.close()
+    await flusher
+    lost = f", {ingestor.buffered} could not be written" if ingestor.buffered else ""
+    print(f"✅ Stopped after writing {ingestor.counters['written']} readings{lost}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the WashGuard sensor ingestion service")
+    parser.add_argument("--host", default=os.getenv("INGEST_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("INGEST_PORT", "8502")))
+    parser.add_argument("--flush-rows", type=int, default=FLUSH_ROWS, help="flush a table once this many readings wait")
+    parser.add_argument("--flush-seconds", type=float, default=FLUSH_SECONDS, help="longest a reading waits in memory")
+    parser.add_argument("--max-buffer", type=int, default=MAX_BUFFER, help="readings held in memory before refusing requests")
+    parser.add_argument("--backpressure-wait", type=float, default=BACKPRESSURE_WAIT, help="seconds a request waits for room")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    ingestor = Ingestor(args.flush_rows, args.flush_seconds, args.max_buffer, args.backpressure_wait)
+    asyncio.run(serve(args.host, args.port, ingestor))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
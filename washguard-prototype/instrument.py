@@ -0,0 +1,185 @@
+# Lightweight timing for the app's hot paths
+#
+# Wrap functions with @timed(stage) or blocks with `with span(stage, name):`.
+# Stages are coarse buckets ("db", "pandas", "model", "chart", "notify").
+# Profiling is off unless WASHGUARD_PROFILE=1; when off, a wrapped call costs
+# one flag check and span() returns a shared no-op context.
+#
+# When on, every timed call is added to process-wide totals, and calls made
+# during a Streamlit rerun (between begin_run and end_run, on the session's
+# thread) are summarised per rerun and logged as one JSON line on the
+# "washguard.perf" logger (to WASHGUARD_PROFILE_LOG if set, else stderr).
+# Times are exclusive: a database call inside a chart span counts as "db".
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+ENABLED = os.getenv("WASHGUARD_PROFILE", "").lower() in ("1", "true", "yes")
+LOG_PATH = os.getenv("WASHGUARD_PROFILE_LOG")
+
+logger = logging.getLogger("washguard.perf")
+_local = threading.local()
+_totals = {}  # (stage, name) -> [calls, seconds, max seconds, rows]
+_lock = threading.Lock()
+_NOOP = nullcontext()
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+    if on and not logger.handlers:
+        handler = logging.FileHandler(LOG_PATH, encoding="utf-8") if LOG_PATH else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def _push():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(0.0)  # time spent in nested timed calls
+    return time.perf_counter()
+
+
+def _pop(stage, name, start, rows=None):
+    elapsed = time.perf_counter() - start
+    stack = _local.stack
+    exclusive = elapsed - stack.pop()
+    if stack:
+        stack[-1] += elapsed
+    with _lock:
+        total = _totals.setdefault((stage, name), [0, 0.0, 0.0, 0])
+        total[0] += 1
+        total[1] += exclusive
+        total[2] = max(total[2], exclusive)
+        total[3] += rows or 0
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["events"].append((stage, name, exclusive, rows))
+
+
+class _Span:
+    __slots__ = ("stage", "name", "start", "rows")
+
+    def __init__(self, stage, name):
+        self.stage, self.name, self.rows = stage, name, None
+
+    def __enter__(self):
+        self.start = _push()
+        return self
+
+    def __exit__(self, *exc):
+        _pop(self.stage, self.name, self.start, self.rows)
+        return False
+
+
+def span(stage, name):
+    # Time a block; set .rows on the returned span to record a row count
+    return _Span(stage, name) if ENABLED else _NOOP
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    shape = getattr(result, "shape", None)  # DataFrame / ndarray
+    return shape[0] if shape else None
+
+
+def timed(stage, name=None):
+    # Decorator; the length of list, tuple, dict and DataFrame results is recorded as rows
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = _push()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                _pop(stage, label, start, _row_count(result))
+        return wrapper
+    return decorator
+
+
+def wrap_functions(namespace, stage, names):
+    # Replace namespace[name] with a timed wrapper for each name, e.g. a module's globals()
+    for name in names:
+        namespace[name] = timed(stage, name)(namespace[name])
+
+
+def _cache_totals(cache_stats):
+    hits = sum(s["hits"] for s in cache_stats.values())
+    misses = sum(s["misses"] for s in cache_stats.values())
+    return hits, misses
+
+
+def begin_run(label, cache_stats=None):
+    # Start collecting this thread's timed calls for one rerun
+    if not ENABLED:
+        return
+    _local.run = {
+        "label": label,
+        "start": time.perf_counter(),
+        "events": [],
+        "cache": _cache_totals(cache_stats) if cache_stats is not None else None,
+    }
+
+
+def end_run(cache_stats=None):
+    # Summarise and log the current rerun; returns the summary dict (None when off)
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if not ENABLED or run is None:
+        return None
+    stages, calls = {}, {}
+    for stage, name, seconds, rows in run["events"]:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+        entry = calls.setdefault(f"{stage}.{name}", [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] += rows or 0
+    db_events = [e for e in run["events"] if e[0] == "db"]
+    summary = {
+        "event": "rerun",
+        "label": run["label"],
+        "total_ms": round((time.perf_counter() - run["start"]) * 1000, 2),
+        "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in sorted(stages.items())},
+        "queries": len(db_events),
+        "rows": sum(e[3] or 0 for e in db_events),
+        "calls": {key: {"calls": n, "ms": round(s * 1000, 2), "rows": r}
+                  for key, (n, s, r) in sorted(calls.items(), key=lambda item: -item[1][1])},
+    }
+    if run["cache"] is not None and cache_stats is not None:
+        hits, misses = (now - before for now, before in zip(_cache_totals(cache_stats), run["cache"]))
+        summary["cache"] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+    logger.info(json.dumps(summary, ensure_ascii=False))
+    return summary
+
+
+def totals():
+    # {"stage.name": {calls, total_ms, max_ms, rows}} since the process started (or reset)
+    with _lock:
+        items = list(_totals.items())
+    return {
+        f"{stage}.{name}": {"calls": n, "total_ms": round(s * 1000, 2), "max_ms": round(m * 1000, 2), "rows": r}
+        for (stage, name), (n, s, m, r) in sorted(items)
+    }
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+
+
+if ENABLED:
+    enable()
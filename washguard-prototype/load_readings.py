@@ -0,0 +1,64 @@
+# Load CSV or JSONL sensor dumps into the WashGuard database in batches
+#
+#   python load_readings.py chlorine tap_stands.csv
+#   python load_readings.py quality probes.jsonl --batch-size 10000 --skip-invalid
+import argparse
+import csv
+import json
+import sys
+
+import database as db
+import migrations
+
+LOADERS = {
+    "chlorine": db.insert_chlorine_bulk,
+    "quality": db.insert_quality_bulk,
+    "feedback": db.insert_feedback_bulk,
+    "infrastructure": db.insert_infrastructure_bulk,
+}
+
+
+def read_records(path, fmt):
+    # Stream records so multi-GB dumps never sit in memory at once
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load sensor readings into washguard.db")
+    parser.add_argument("table", choices=sorted(LOADERS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--skip-invalid", action="store_true", help="skip and report invalid rows instead of aborting")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    try:
+        stats = LOADERS[args.table](read_records(args.path, fmt), batch_size=args.batch_size, skip_invalid=args.skip_invalid)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    total_rows = total_seconds = 0
+    for number, batch in enumerate(stats, 1):
+        total_rows += batch["rows"]
+        total_seconds += batch["seconds"]
+        print(f"batch {number}: {batch['rows']} rows in {batch['seconds']:.3f} s ({batch['rows_per_sec']:.0f} rows/s), {len(batch['rejected'])} rejected")
+        for index, error in batch["rejected"]:
+            print(f"  row {index}: {error}")
+    if total_seconds:
+        print(f"✅ {total_rows} {args.table} rows loaded ({total_rows / total_seconds:.0f} rows/s)")
+    else:
+        print(f"✅ {total_rows} {args.table} rows loaded")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
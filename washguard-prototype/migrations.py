@@ -0,0 +1,511 @@
+# Versioned schema migrations for the WashGuard database
+#
+#   python migrations.py             # apply pending migrations
+#   python migrations.py --status    # list applied and pending migrations
+#
+# Importing database.py does no I/O; the schema is created and upgraded here,
+# once per deploy or on first start (app.py, the CLIs and the ingestion service
+# call migrate(); when nothing is pending that is two plain reads, the schema
+# version and the rollup trigger definitions, without taking the write lock).
+# Each migration runs in its own BEGIN IMMEDIATE transaction together with its
+# schema_version row, so it is applied exactly once even when several processes
+# start at the same time, and a failed migration leaves no partial schema.
+#
+# Databases created before this module have every table but no schema_version;
+# the migrations use IF NOT EXISTS and column checks, so on those they only add
+# what is missing. Add new migrations at the end of MIGRATIONS; never edit one
+# that has shipped. Demo rows are no longer inserted here (see seed_demo.py).
+import argparse
+import datetime
+import sys
+import time
+
+import anomaly
+import database as db
+import terms
+from db_utils import db_connection
+
+
+def table_empty(cursor, table):
+    # Stops at the first row instead of counting the table
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+    return not cursor.fetchone()[0]
+
+
+def add_column(cursor, table, column, decl):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# --- Migrations ---
+
+def readings_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chlorine (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tap_stand_id TEXT,
+        date TEXT,
+        time TEXT,
+        chlorine_level REAL,
+        ts INTEGER
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS quality (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_id TEXT,
+        turbidity REAL,
+        odour_present TEXT,
+        ts INTEGER
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        household_id TEXT,
+        feedback_text TEXT,
+        ts INTEGER
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS infrastructure (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        location TEXT,
+        generator_ok TEXT,
+        pump_ok TEXT,
+        pipe_leak TEXT,
+        road_condition TEXT,
+        comments TEXT,
+        water_available_liters INTEGER,
+        ts INTEGER,
+        issue_mask INTEGER
+    )
+    """)
+
+    # Sentiment labels are stored per feedback row, tagged with the model that produced them,
+    # so reruns only classify new rows (one label per model since sentiment_label_versions)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feedback_sentiment (
+        feedback_id INTEGER PRIMARY KEY,
+        model_version TEXT,
+        label TEXT,
+        score REAL
+    )
+    """)
+
+    # Drop stored labels when the feedback text is edited or the row is removed
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS feedback_text_changed
+    AFTER UPDATE OF feedback_text ON feedback
+    WHEN OLD.feedback_text IS NOT NEW.feedback_text
+    BEGIN
+        DELETE FROM feedback_sentiment WHERE feedback_id = NEW.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS feedback_deleted
+    AFTER DELETE ON feedback
+    BEGIN
+        DELETE FROM feedback_sentiment WHERE feedback_id = OLD.id;
+    END
+    """)
+
+
+def reading_timestamps(cursor):
+    # Every reading carries ts, seconds since the epoch (date/time are read as UTC).
+    # Chlorine rows are backfilled from date + time; the other tables had no time
+    # recorded, so their older rows get the migration time.
+    for table in ("chlorine", "quality", "feedback", "infrastructure"):
+        add_column(cursor, table, "ts", "INTEGER")
+
+    cursor.execute("UPDATE chlorine SET ts = CAST(strftime('%s', date || ' ' || time) AS INTEGER) WHERE ts IS NULL")
+    for table in ("quality", "feedback", "infrastructure"):
+        cursor.execute(f"UPDATE {table} SET ts = CAST(strftime('%s', 'now') AS INTEGER) WHERE ts IS NULL")
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chlorine_tap_ts ON chlorine (tap_stand_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chlorine_ts ON chlorine (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quality_source_ts ON quality (source_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quality_ts ON quality (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_infrastructure_location_ts ON infrastructure (location, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_infrastructure_ts ON infrastructure (ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_feedback_ts ON feedback (ts)")
+    # Plain station indexes keep keyset pages (station = ? AND id < ? ORDER BY id) sort-free
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chlorine_tap ON chlorine (tap_stand_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_quality_source ON quality (source_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_infrastructure_location ON infrastructure (location)")
+
+
+def alert_outbox(cursor):
+    # The UI only enqueues alerts here; alerts.AlertWorker claims and delivers them
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT,
+        subject TEXT,
+        body TEXT,
+        status TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        next_attempt_ts REAL,
+        claimed_ts REAL,
+        last_error TEXT,
+        created_ts REAL,
+        sent_ts REAL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alert_outbox_due ON alert_outbox (status, next_attempt_ts)")
+
+    # Last alert sent per (location, issue set); alerts.notify_issues suppresses
+    # repeats inside the cooldown window
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS alert_state (
+        location TEXT,
+        issue_mask INTEGER,
+        fingerprint TEXT,
+        first_sent_ts REAL,
+        last_sent_ts REAL,
+        sent_count INTEGER DEFAULT 1,
+        PRIMARY KEY (location, issue_mask)
+    )
+    """)
+
+
+def chlorine_anomalies(cursor):
+    # Rolling per-tap state updated in the same transaction as each chlorine insert
+    # (see anomaly.py); detected events wait in chlorine_anomalies until
+    # alerts.dispatch_anomalies() sends them.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chlorine_state (
+        tap_stand_id TEXT PRIMARY KEY,
+        n INTEGER,
+        mean REAL,
+        var REAL,
+        last_value REAL,
+        last_ts INTEGER,
+        repeats INTEGER,
+        interval REAL,
+        missing INTEGER DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chlorine_anomalies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tap_stand_id TEXT,
+        ts INTEGER,
+        kind TEXT,
+        value REAL,
+        detail TEXT,
+        notified INTEGER DEFAULT 0
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chlorine_anomalies_tap_ts ON chlorine_anomalies (tap_stand_id, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chlorine_anomalies_pending ON chlorine_anomalies (id) WHERE notified = 0")
+
+    # Existing history only warms the state up; it never raises alerts
+    if table_empty(cursor, "chlorine_state") and not table_empty(cursor, "chlorine"):
+        anomaly.rebuild_states(cursor)
+
+
+def feedback_term_index(cursor):
+    # Postings (feedback_id, term, count) and per-term totals, kept current as
+    # feedback is written so the word cloud never re-tokenizes the corpus.
+    # Triggers queue new or edited rows in feedback_terms_pending; the insert
+    # functions index the queue (terms.index_pending) in the same transaction.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS feedback_terms (
+        feedback_id INTEGER,
+        term TEXT,
+        count INTEGER,
+        PRIMARY KEY (feedback_id, term)
+    )
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS term_totals (term TEXT PRIMARY KEY, count INTEGER)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_term_totals_count ON term_totals (count)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS feedback_terms_pending (feedback_id INTEGER PRIMARY KEY)")
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS feedback_terms_inserted AFTER INSERT ON feedback
+    BEGIN
+        INSERT OR IGNORE INTO feedback_terms_pending (feedback_id) VALUES (NEW.id);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS feedback_terms_text_changed AFTER UPDATE OF feedback_text ON feedback
+    WHEN OLD.feedback_text IS NOT NEW.feedback_text
+    BEGIN
+        INSERT OR IGNORE INTO feedback_terms_pending (feedback_id) VALUES (NEW.id);
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS feedback_terms_deleted AFTER DELETE ON feedback
+    BEGIN
+        {"; ".join(sql.replace(":id", "OLD.id") for sql in terms.REMOVE_POSTINGS)};
+        DELETE FROM feedback_terms_pending WHERE feedback_id = OLD.id;
+    END
+    """)
+
+    # Index the feedback already stored
+    if table_empty(cursor, "feedback_terms") and not table_empty(cursor, "feedback"):
+        cursor.execute("INSERT OR IGNORE INTO feedback_terms_pending (feedback_id) SELECT id FROM feedback")
+    terms.index_pending(cursor)
+
+
+def infrastructure_issue_masks(cursor):
+    # Each report stores its rules.RULES bitmask from insert time, so alert counts
+    # computed in SQL agree with the flags shown in the app
+    add_column(cursor, "infrastructure", "issue_mask", "INTEGER")
+    db.refresh_issue_masks(cursor)
+
+
+def archive_manifest(cursor):
+    # Old chlorine and quality readings moved to Parquet by archive_readings.py (see
+    # archive.py): the manifest of archive files, plus what the archived rows added to
+    # the rollups, so rebuild_rollups() still covers history that is no longer in SQLite
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archive_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        station TEXT,
+        month TEXT,
+        path TEXT NOT NULL UNIQUE,
+        rows INTEGER,
+        min_ts INTEGER,
+        max_ts INTEGER
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_files_range ON archive_files (table_name, station, max_ts)")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_counts (
+        kind TEXT,
+        station TEXT,
+        period TEXT,
+        start_ts INTEGER,
+        total INTEGER NOT NULL,
+        below INTEGER NOT NULL,
+        above INTEGER NOT NULL,
+        PRIMARY KEY (kind, station, period, start_ts)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_latest (
+        kind TEXT,
+        station TEXT,
+        reading_id INTEGER,
+        ts INTEGER,
+        value REAL,
+        PRIMARY KEY (kind, station)
+    )
+    """)
+
+
+def rollups(cursor):
+    # Summary tables kept current by the triggers in database.ROLLUP_TRIGGERS
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_totals (
+        metric TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_counts (
+        kind TEXT,
+        station TEXT,
+        period TEXT,
+        start_ts INTEGER,
+        total INTEGER NOT NULL,
+        below INTEGER NOT NULL,
+        above INTEGER NOT NULL,
+        PRIMARY KEY (kind, station, period, start_ts)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_latest (
+        kind TEXT,
+        station TEXT,
+        reading_id INTEGER,
+        ts INTEGER,
+        value REAL,
+        PRIMARY KEY (kind, station)
+    )
+    """)
+    # Compute them from what is already stored
+    if db.create_rollup_triggers(cursor) or table_empty(cursor, "rollup_totals"):
+        db.rebuild_rollups(cursor)
+
+
+# One counter per table, bumped by triggers on every write, so cache.py can tell
+# whether a memoized result is still current from a single primary-key lookup
+VERSIONED_TABLES = ("chlorine", "quality", "feedback", "infrastructure", "feedback_sentiment", "chlorine_anomalies")
+
+
+def data_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_version (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.executemany("INSERT OR IGNORE INTO data_version (name) VALUES (?)", [(table,) for table in VERSIONED_TABLES])
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS version_{table}_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+
+
+def sentiment_backfill(cursor):
+    # Progress of backfill_sentiment.py per model, committed with each chunk of labels
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sentiment_backfill (
+        model_version TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        updated_ts INTEGER
+    )
+    """)
+
+
+def sentiment_label_versions(cursor):
+    # Key feedback_sentiment on (feedback_id, model_version): one label per model, so
+    # labels written under another version (a backfill or int8 trial) no longer replace
+    # the ones the app reads. SQLite cannot change a primary key in place, so the table
+    # is copied; the triggers that name it are dropped first and recreated afterwards.
+    for name in ("feedback_text_changed", "feedback_deleted"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("""
+    CREATE TABLE feedback_sentiment_new (
+        feedback_id INTEGER,
+        model_version TEXT,
+        label TEXT,
+        score REAL,
+        PRIMARY KEY (feedback_id, model_version)
+    )
+    """)
+    cursor.execute("""
+        INSERT INTO feedback_sentiment_new (feedback_id, model_version, label, score)
+        SELECT feedback_id, model_version, label, score FROM feedback_sentiment WHERE model_version IS NOT NULL
+    """)
+    cursor.execute("DROP TABLE feedback_sentiment")
+    cursor.execute("ALTER TABLE feedback_sentiment_new RENAME TO feedback_sentiment")
+
+    # An edited or removed feedback row drops its labels from every model
+    cursor.execute("""
+    CREATE TRIGGER feedback_text_changed
+    AFTER UPDATE OF feedback_text ON feedback
+    WHEN OLD.feedback_text IS NOT NEW.feedback_text
+    BEGIN
+        DELETE FROM feedback_sentiment WHERE feedback_id = NEW.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER feedback_deleted
+    AFTER DELETE ON feedback
+    BEGIN
+        DELETE FROM feedback_sentiment WHERE feedback_id = OLD.id;
+    END
+    """)
+
+    # Dropping the table dropped its version and rollup triggers; the sentiment totals
+    # now count only the configured model's labels, so they are recomputed
+    data_versions(cursor)
+    db.rebuild_rollups(cursor)
+
+
+# (version, description, apply(cursor)), in order
+MIGRATIONS = [
+    (1, "readings tables", readings_tables),
+    (2, "reading timestamps and indexes", reading_timestamps),
+    (3, "alert outbox", alert_outbox),
+    (4, "chlorine anomaly detection", chlorine_anomalies),
+    (5, "feedback term index", feedback_term_index),
+    (6, "infrastructure issue masks", infrastructure_issue_masks),
+    (7, "archive manifest", archive_manifest),
+    (8, "rollups", rollups),
+    (9, "data versions", data_versions),
+    (10, "sentiment backfill checkpoints", sentiment_backfill),
+    (11, "sentiment labels per model version", sentiment_label_versions),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+# --- Running migrations ---
+
+def current_version(cursor):
+    # Highest applied migration; 0 for a new database or one created before migrations
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version')")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def applied(cursor):
+    # {version: applied ts}
+    if not current_version(cursor):
+        return {}
+    cursor.execute("SELECT version, applied_ts FROM schema_version")
+    return dict(cursor.fetchall())
+
+
+def migrate(target=LATEST):
+    # Apply pending migrations up to target; returns the (version, description) pairs applied
+    with db_connection() as cursor:
+        version = current_version(cursor)
+        triggers_current = version < 8 or db.rollup_triggers_current(cursor)
+    if version >= target and triggers_current:
+        return []
+    done = []
+    for number, description, apply in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        with db_connection(immediate=True) as cursor:
+            # Another process may have applied it while this one waited for the lock
+            if number <= current_version(cursor):
+                continue
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_ts INTEGER
+            )
+            """)
+            apply(cursor)
+            cursor.execute("INSERT INTO schema_version (version, description, applied_ts) VALUES (?, ?, ?)",
+                           (number, description, int(time.time())))
+        done.append((number, description))
+    if target >= 8 and version >= 8 and not triggers_current:
+        # The rollup triggers embed the thresholds and sentiment model version in
+        # database.py: recreate them and recompute the rollups when those changed
+        # since the last start
+        with db_connection(immediate=True) as cursor:
+            if db.create_rollup_triggers(cursor):
+                db.rebuild_rollups(cursor)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or upgrade the WashGuard database schema")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations without applying any")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        with db_connection() as cursor:
+            done = applied(cursor)
+        for number, description, _ in MIGRATIONS:
+            when = done.get(number)
+            stamp = datetime.datetime.fromtimestamp(when, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC") if when else "pending"
+            print(f"{'✅' if when else '⏳'} {number:>3}  {description:<32} {stamp}")
+        return 0
+
+    start = time.perf_counter()
+    done = migrate()
+    for number, description in done:
+        print(f"✅ {number:>3}  {description}")
+    print(f"🗄️ Schema at version {LATEST}" + (f", {len(done)} migrations applied in {time.perf_counter() - start:.1f} s." if done else ", nothing to apply."))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
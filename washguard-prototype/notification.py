@@ -1,27 +1,190 @@
+import json
+import os
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import os
-from twilio.rest import Client
-from dotenv import load_dotenv  
+from functools import lru_cache
+from dotenv import load_dotenv
 
-load_dotenv()  
+load_dotenv()
 
 # --- EMAIL CONFIGURATION ---
 EMAIL_ADDRESS = os.getenv("ALERT_EMAIL")
 EMAIL_PASSWORD = os.getenv("ALERT_PASSWORD")
 EMAIL_RECEIVER = os.getenv("ALERT_RECEIVER")
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))  # 465 = implicit TLS, anything else requires STARTTLS
+# Only for a local relay or test server: carry on unencrypted when STARTTLS is not offered
+SMTP_ALLOW_PLAINTEXT = os.getenv("SMTP_ALLOW_PLAINTEXT", "0") == "1"
+SMTP_CONNECTIONS = int(os.getenv("SMTP_CONNECTIONS", "2"))  # open sessions kept, and concurrent sends allowed
+SMTP_CHECK_AFTER = 30  # seconds idle before a pooled session is probed with NOOP
+SMTP_TIMEOUT = 30
 
 # --- SMS CONFIGURATION (TWILIO) ---
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE")
 ALERT_PHONE_NUMBER = os.getenv("ALERT_PHONE")
+SMS_CONCURRENCY = int(os.getenv("SMS_CONCURRENCY", "4"))
+
+# --- DELIVERY SINK ---
+# ALERT_SINK=fake records messages to ALERT_SINK_PATH (JSON lines) instead of
+# contacting SMTP/Twilio, so the alert pipeline can be exercised offline.
+ALERT_SINK = os.getenv("ALERT_SINK", "live")
+ALERT_SINK_PATH = os.getenv("ALERT_SINK_PATH", "alert_sink.jsonl")
+
+# --- SMTP connection pool ---
+class SMTPPool:
+    # Keeps logged-in SMTP sessions open between messages. At most `size` sends run at
+    # once; a session idle for longer than check_after is probed with NOOP and replaced
+    # if the server has dropped it. On ports other than 465 the session is upgraded with
+    # STARTTLS before login; a server that does not offer it is refused unless
+    # allow_plaintext is set, so a stripped EHLO reply cannot expose the password.
+    def __init__(self, host, port, username=None, password=None, size=SMTP_CONNECTIONS,
+                 check_after=SMTP_CHECK_AFTER, timeout=SMTP_TIMEOUT, allow_plaintext=SMTP_ALLOW_PLAINTEXT):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.allow_plaintext = allow_plaintext
+        self.check_after = check_after
+        self.timeout = timeout
+        self.connects = 0
+        self._idle = []  # (session, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.ehlo()
+            if server.has_extn("starttls") or not self.allow_plaintext:
+                try:
+                    server.starttls()  # raises SMTPNotSupportedError when not offered
+                except BaseException:
+                    server.close()
+                    raise
+                server.ehlo()
+        if self.password:
+            server.login(self.username, self.password)
+        with self._lock:
+            self.connects += 1
+        return server
+
+    def _checkout(self):
+        # (session, reused) -- a healthy pooled session if there is one, else a new one
+        with self._lock:
+            server, last_used = self._idle.pop() if self._idle else (None, None)
+        if server is None:
+            return self._connect(), False
+        if time.monotonic() - last_used > self.check_after:
+            try:
+                healthy = server.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                healthy = False
+            if not healthy:
+                _close(server)
+                return self._connect(), False
+        return server, True
+
+    def _checkin(self, server):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send(self, messages):
+        # Send EmailMessage/MIMEText objects over one session
+        with self._slots:
+            server, reused = self._checkout()
+            sent = 0
+            while True:
+                try:
+                    for msg in messages[sent:]:
+                        server.send_message(msg)
+                        sent += 1
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    _close(server)
+                    if not reused:
+                        raise
+                    # A pooled session went stale between the health check and the send
+                    server, reused = self._connect(), False
+                    continue
+                except smtplib.SMTPException:
+                    # The server refused a message but the session is still usable
+                    self._checkin(server)
+                    raise
+                self._checkin(server)
+                return sent
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+
+def _close(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+@lru_cache(maxsize=None)
+def get_smtp_pool():
+    return SMTPPool(SMTP_SERVER, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD)
+
+# --- SMS client ---
+_sms_slots = threading.BoundedSemaphore(SMS_CONCURRENCY)
+
+@lru_cache(maxsize=None)
+def get_twilio_client():
+    # One client (and HTTP session) per process
+    from twilio.rest import Client
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+# The send functions raise on failure so the alert worker can retry them
+def build_email(subject, body):
+    msg = MIMEText(body)
+    msg["Subject"] = subject
+    msg["From"] = EMAIL_ADDRESS
+    msg["To"] = EMAIL_RECEIVER
+    return msg
 
 def send_alert_email(subject, body):
-    print(f"Email sent: {subject}\n{body}")
+    get_smtp_pool().send([build_email(subject, body)])
+
+def send_alert_emails(messages):
+    # messages: iterable of (subject, body), sent back to back over one session
+    return get_smtp_pool().send([build_email(subject, body) for subject, body in messages])
 
 def send_sms_alert(message):
-    print(f"SMS sent: {message}")
+    with _sms_slots:
+        get_twilio_client().messages.create(body=message, from_=TWILIO_PHONE_NUMBER, to=ALERT_PHONE_NUMBER)
+
+class FakeSink:
+    # Offline stand-in for SMTP and Twilio: keeps messages in memory and appends them to a JSONL file
+    def __init__(self, path=ALERT_SINK_PATH):
+        self.path = path
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def _record(self, channel, subject, body):
+        message = {"channel": channel, "subject": subject, "body": body, "ts": time.time()}
+        with self._lock:
+            self.messages.append(message)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(message) + "\n")
+
+    def send_alert_email(self, subject, body):
+        self._record("email", subject, body)
+
+    def send_sms_alert(self, message):
+        self._record("sms", None, message)
+
+def get_senders(sink=None):
+    # {channel: fn(subject, body)} used by the alert worker
+    if sink is None and ALERT_SINK == "fake":
+        sink = FakeSink()
+    if sink is not None:
+        return {"email": sink.send_alert_email, "sms": lambda subject, body: sink.send_sms_alert(body)}
+    return {"email": send_alert_email, "sms": lambda subject, body: send_sms_alert(body)}
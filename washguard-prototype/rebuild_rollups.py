@@ -0,0 +1,32 @@
+# Recompute the dashboard rollup tables from the raw readings and check them
+#
+#   python rebuild_rollups.py            # rebuild, then verify
+#   python rebuild_rollups.py --check    # only report differences
+import argparse
+import sys
+
+import database as db
+import migrations
+from db_utils import db_connection
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild and verify rollup tables in washguard.db")
+    parser.add_argument("--check", action="store_true", help="compare rollups with the raw tables without rebuilding")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+
+    if not args.check:
+        with db_connection(immediate=True) as cursor:
+            db.rebuild_rollups(cursor)
+        print("🔁 Rollups rebuilt from raw tables.")
+
+    with db_connection() as cursor:
+        mismatches = db.check_rollups(cursor)
+    for table, count in mismatches.items():
+        print(f"{'✅' if count == 0 else '❌'} {table}: {count} differing rows")
+    return 0 if not any(mismatches.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
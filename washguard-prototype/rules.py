@@ -0,0 +1,54 @@
+# Infrastructure status rules, evaluated with NumPy masks over whole frames
+import numpy as np
+
+LOW_WATER_LITERS = 50
+BLOCKED_ROADS = ("Muddy", "Flooded")
+
+# (name, label, predicate); each rule's bit is 1 << its position. Predicates take
+# a mapping of column name -> array (a DataFrame works) and return a bool array.
+RULES = (
+    ("generator_down", "🛑 Generator", lambda c: np.asarray(c["generator_ok"]) == "No"),
+    ("pump_down", "🛑 Pump", lambda c: np.asarray(c["pump_ok"]) == "No"),
+    ("leak", "💧 Leak", lambda c: np.asarray(c["pipe_leak"]) == "Yes"),
+    ("fuel_blocked", "🚫 Fuel Delivery Blocked",
+     lambda c: np.isin(np.asarray(c["road_condition"]), BLOCKED_ROADS) & (np.asarray(c["generator_ok"]) == "Yes")),
+    ("low_reserves", "❗ Low Water Reserves",
+     lambda c: np.asarray(c["water_available_liters"], dtype=float) < LOW_WATER_LITERS),
+)
+
+BITS = {name: 1 << i for i, (name, _, _) in enumerate(RULES)}
+OK_LABEL = "✅ OK"
+
+
+def issue_masks(columns):
+    # Bitmask of failed rules per row, as a uint8 array
+    masks = None
+    for i, (_, _, predicate) in enumerate(RULES):
+        bits = predicate(columns).astype(np.uint8) << i
+        masks = bits if masks is None else masks | bits
+    return masks
+
+
+def mask_label(mask):
+    labels = [label for i, (_, label, _) in enumerate(RULES) if mask & (1 << i)]
+    return ", ".join(labels) if labels else OK_LABEL
+
+
+def issue_labels(masks):
+    # Only 2**len(RULES) distinct masks exist, so label each unique value once
+    masks = np.asarray(masks)
+    unique, inverse = np.unique(masks, return_inverse=True)
+    return np.array([mask_label(m) for m in unique], dtype=object)[inverse.reshape(-1)]
+
+
+def issue_mask(record):
+    # Mask for a single report given as a dict of column values
+    return int(issue_masks({k: np.asarray([v]) for k, v in record.items()})[0])
+
+
+def flag_infrastructure(df):
+    # Copy of df with issue_mask and status columns added
+    df = df.copy()
+    df["issue_mask"] = issue_masks(df)
+    df["status"] = issue_labels(df["issue_mask"])
+    return df
@@ -0,0 +1,63 @@
+# Insert the prototype's demo readings into a new database
+#
+#   python seed_demo.py
+#
+# Each table gets a handful of example rows, and only while it is still empty,
+# so running this against a database in use changes nothing. For realistic
+# volumes use generate_data.py instead.
+import argparse
+import sys
+
+import database as db
+import migrations
+from db_utils import db_connection
+
+# table: (bulk insert, rows in database.<TABLE>_COLUMNS order without ts)
+DEMO_ROWS = {
+    "chlorine": (db.insert_chlorine_bulk, [
+        ("TS-001", "2025-05-21", "08:30:00", 0.15),
+        ("TS-002", "2025-05-21", "09:00:00", 0.35),
+        ("TS-003", "2025-05-21", "09:30:00", 0.60),
+        ("TS-004", "2025-05-21", "10:00:00", 0.30),
+    ]),
+    "quality": (db.insert_quality_bulk, [
+        ("Source-A", 3.5, "No"),
+        ("Source-B", 6.0, "Yes"),
+        ("Source-C", 2.2, "No"),
+    ]),
+    "feedback": (db.insert_feedback_bulk, [
+        ("HH-001", "Water pressure is too low."),
+        ("HH-002", "We are happy with the clean water."),
+        ("HH-003", "Please fix the broken tap."),
+        ("HH-004", "The water quality has improved this week, thank you."),
+    ]),
+    "infrastructure": (db.insert_infrastructure_bulk, [
+        ("Zone A", "Yes", "Yes", "No", "Good", "All systems go", 800),
+        ("Zone B", "No", "Yes", "Yes", "Flooded", "Generator failure and pipe leak", 400),
+        ("Zone C", "Yes", "Yes", "Yes", "Moderate", "Small pipe leak detected, team dispatched", 40),
+    ]),
+}
+
+
+def seed():
+    # {table: rows inserted}; tables that already hold data are skipped
+    migrations.migrate()
+    inserted = {}
+    for table, (insert_bulk, rows) in DEMO_ROWS.items():
+        with db_connection() as cursor:
+            empty = migrations.table_empty(cursor, table)
+        inserted[table] = sum(batch["rows"] for batch in insert_bulk(rows)) if empty else 0
+    return inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Insert the demo readings into empty tables of washguard.db")
+    parser.parse_args(argv)
+
+    for table, rows in seed().items():
+        print(f"🌱 {table}: {rows} demo rows" if rows else f"⏭️ {table}: already has data, left as is")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# Batched sentiment classification around a transformers pipeline
+import os
+from functools import lru_cache
+
+import instrument
+
+# Stored labels are keyed by the model name plus the options that change labels (model_version)
+DEFAULT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+DEFAULT_BATCH_SIZE = 32
+
+
+def model_version(model=DEFAULT_MODEL, quantize=False, max_length=None):
+    # Version key for stored labels: options that can change a label are part of it,
+    # so switching them relabels feedback instead of mixing outputs
+    version = model
+    if quantize:
+        version += "+int8"
+    if max_length:
+        version += f"+len{max_length}"
+    return version
+
+
+# Model options from the environment, shared by the app, export.py and backfill_sentiment.py
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", str(DEFAULT_BATCH_SIZE)))
+SENTIMENT_QUANTIZE = os.getenv("SENTIMENT_QUANTIZE", "0") == "1"
+SENTIMENT_MAX_LENGTH = int(os.getenv("SENTIMENT_MAX_LENGTH", "0")) or None
+SENTIMENT_THREADS = int(os.getenv("SENTIMENT_THREADS", "0")) or None
+# Stored labels are keyed by this, so changing the model options relabels feedback
+SENTIMENT_VERSION = model_version(DEFAULT_MODEL, SENTIMENT_QUANTIZE, SENTIMENT_MAX_LENGTH)
+
+
+@lru_cache(maxsize=None)
+@instrument.timed("model")
+def load_analyzer(model=DEFAULT_MODEL, quantize=False, max_length=None, threads=None):
+    """Load a CPU sentiment pipeline.
+
+    quantize swaps the model's Linear layers for dynamically quantized int8
+    ones, max_length truncates texts to that many tokens, and threads caps
+    torch's intra-op threads for the whole process.
+    """
+    # transformers/torch are only imported once a caller actually needs the model
+    import torch
+    from transformers import pipeline
+    if threads:
+        torch.set_num_threads(threads)
+    analyzer = pipeline("sentiment-analysis", model=model, device=-1)
+    if quantize:
+        analyzer.model = torch.ao.quantization.quantize_dynamic(analyzer.model, {torch.nn.Linear}, dtype=torch.qint8)
+    if max_length:
+        analyzer.tokenizer.model_max_length = min(max_length, analyzer.tokenizer.model_max_length)
+    return analyzer
+
+
+def token_lengths(analyzer, texts):
+    # Fall back to character length when the pipeline exposes no tokenizer
+    tokenizer = getattr(analyzer, "tokenizer", None)
+    if tokenizer is None:
+        return [len(text) for text in texts]
+    encoded = tokenizer(texts, truncation=True)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+@instrument.timed("model")
+def classify_texts(analyzer, texts, batch_size=DEFAULT_BATCH_SIZE):
+    """Classify texts and return (label, score) pairs in input order.
+
+    Texts are sorted by token length before batching so each batch pads to a
+    similar length instead of to the longest text in the whole input.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+
+    lengths = token_lengths(analyzer, texts)
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    results = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        outputs = analyzer([texts[i] for i in batch], batch_size=len(batch), truncation=True)
+        for i, output in zip(batch, outputs):
+            results[i] = (output["label"], output["score"])
+    return results
@@ -0,0 +1,81 @@
+# Feedback tokenization for the term-frequency index behind the word cloud
+#
+# Close to WordCloud's own tokenizer (words of letters, digits and apostrophes,
+# trailing 's dropped, numbers and stopwords skipped) so clouds drawn from the
+# stored counts look like the ones WordCloud.generate() used to draw.
+import re
+from collections import Counter
+
+WORD = re.compile(r"\w[\w']*")
+MIN_LENGTH = 2
+
+# English stopwords plus words that say nothing in water-service feedback
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before
+being below between both but by can can't cannot could couldn't did didn't do does doesn't doing don't
+down during each else ever few for from further get had hadn't has hasn't have haven't having he he'd
+he'll he's her here here's hers herself him himself his how how's however i i'd i'll i'm i've if in
+into is isn't it it's its itself just let's like me more most mustn't my myself no nor not of off
+on once only or other otherwise ought our ours ourselves out over own please same shall shan't she
+she'd she'll she's should shouldn't since so some such than that that's the their theirs them
+themselves then there there's these they they'd they'll they're they've this those through to too
+under until up very was wasn't we we'd we'll we're we've were weren't what what's when when's where
+where's which while who who's whom why why's will with won't would wouldn't you you'd you'll you're
+you've your yours yourself yourselves thank thanks
+""".split())
+
+
+def tokenize(text):
+    # Counter of index terms in one feedback text
+    counts = Counter()
+    for word in WORD.findall((text or "").lower()):
+        if word.endswith("'s"):
+            word = word[:-2]
+        word = word.strip("'_")
+        if len(word) >= MIN_LENGTH and not word.isdigit() and word not in STOPWORDS:
+            counts[word] += 1
+    return counts
+
+
+def index_pending(cursor):
+    # Index the feedback rows queued in feedback_terms_pending (by insert and text-update
+    # triggers): replace each row's postings and adjust term_totals. Returns rows indexed.
+    cursor.execute("""
+        SELECT p.feedback_id, f.feedback_text FROM feedback_terms_pending p
+        JOIN feedback f ON f.id = p.feedback_id
+    """)
+    rows = cursor.fetchall()
+    if not rows:
+        cursor.execute("DELETE FROM feedback_terms_pending")
+        return 0
+    ids = [(feedback_id,) for feedback_id, _ in rows]
+    remove_postings(cursor, ids)
+
+    postings = [(feedback_id, term, count) for feedback_id, text in rows for term, count in tokenize(text).items()]
+    cursor.executemany("INSERT INTO feedback_terms (feedback_id, term, count) VALUES (?, ?, ?)", postings)
+    totals = Counter()
+    for _, term, count in postings:
+        totals[term] += count
+    cursor.executemany("""
+        INSERT INTO term_totals (term, count) VALUES (?, ?)
+        ON CONFLICT (term) DO UPDATE SET count = count + excluded.count
+    """, totals.items())
+    cursor.execute("DELETE FROM feedback_terms_pending")
+    return len(rows)
+
+
+# Same statements as the feedback_terms_deleted trigger in migrations.py
+REMOVE_POSTINGS = (
+    """UPDATE term_totals SET count = count - (
+           SELECT t.count FROM feedback_terms t WHERE t.feedback_id = :id AND t.term = term_totals.term
+       )
+       WHERE term IN (SELECT term FROM feedback_terms WHERE feedback_id = :id)""",
+    "DELETE FROM term_totals WHERE count <= 0 AND term IN (SELECT term FROM feedback_terms WHERE feedback_id = :id)",
+    "DELETE FROM feedback_terms WHERE feedback_id = :id",
+)
+
+
+def remove_postings(cursor, ids):
+    # ids: [(feedback_id,)]; subtract their postings from term_totals and drop them
+    for sql in REMOVE_POSTINGS:
+        cursor.executemany(sql, [{"id": i} for (i,) in ids])
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db_utils
+import migrations
+
+
+@pytest.fixture
+def database(tmp_path):
+    # A migrated, empty database for the test; the previous path is restored afterwards
+    previous = db_utils.DB_PATH
+    db_utils.configure(path=str(tmp_path / "washguard.db"))
+    migrations.migrate()
+    yield
+    db_utils.configure(path=previous)
@@ -0,0 +1,43 @@
+import pytest
+
+import alerts
+from db_utils import db_connection
+
+
+def add_anomalies(*events):
+    with db_connection() as cursor:
+        cursor.executemany("INSERT INTO chlorine_anomalies (tap_stand_id, ts, kind, value, detail) VALUES (?, ?, ?, ?, ?)", events)
+
+
+def counts():
+    with db_connection() as cursor:
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM chlorine_anomalies WHERE notified = 0),
+                   (SELECT COUNT(*) FROM alert_state), (SELECT COUNT(*) FROM alert_outbox)
+        """)
+        return cursor.fetchone()
+
+
+def test_anomaly_digest_is_queued_with_the_notified_flags(database):
+    add_anomalies(("TS-1", 100, "outlier", 0.9, "0.90 mg/L"), ("TS-2", 100, "stuck", 0.3, "flat for 6 h"))
+
+    assert alerts.dispatch_anomalies(channels=("email",)) == 2
+    assert counts() == (0, 2, 1)
+
+    # Repeats within the cooldown are marked notified without another digest
+    add_anomalies(("TS-1", 200, "outlier", 0.95, "0.95 mg/L"))
+    assert alerts.dispatch_anomalies(channels=("email",)) == 0
+    assert counts() == (0, 2, 1)
+
+
+def test_failed_dispatch_leaves_anomalies_pending(database, monkeypatch):
+    add_anomalies(("TS-1", 100, "outlier", 0.9, "0.90 mg/L"))
+    monkeypatch.setattr(alerts.anomaly, "LABELS", {})  # composing the digest fails
+
+    with pytest.raises(KeyError):
+        alerts.dispatch_anomalies(channels=("email",))
+    assert counts() == (1, 0, 0)
+
+    monkeypatch.undo()
+    assert alerts.dispatch_anomalies(channels=("email",)) == 1
+    assert counts() == (0, 1, 1)
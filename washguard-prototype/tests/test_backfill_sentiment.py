@@ -0,0 +1,87 @@
+import backfill_sentiment
+import database as db
+from db_utils import db_connection
+from sentiment import SENTIMENT_VERSION
+
+VERSION = backfill_sentiment.DEFAULT_MODEL
+
+
+class FakeAnalyzer:
+    tokenizer = None
+
+    def __call__(self, texts, batch_size=None, truncation=True):
+        return [{"label": "NEGATIVE" if "broken" in text else "POSITIVE", "score": 0.9} for text in texts]
+
+
+class InlinePool:
+    # Runs tasks in this process, in place of the worker pool
+
+    class Result:
+        def __init__(self, value):
+            self.value = value
+
+        def get(self):
+            return self.value
+
+    def apply_async(self, fn, args):
+        return self.Result(fn(*args))
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def run_backfill(monkeypatch, **kwargs):
+    monkeypatch.setattr(backfill_sentiment, "_analyzer", FakeAnalyzer())
+    monkeypatch.setattr(backfill_sentiment, "start_pool", lambda *args: (InlinePool(), 0.0))
+    return backfill_sentiment.backfill(chunk_size=2, **kwargs)
+
+
+def labels():
+    with db_connection() as cursor:
+        cursor.execute("SELECT feedback_id, label FROM feedback_sentiment WHERE model_version = ? ORDER BY feedback_id", (VERSION,))
+        return dict(cursor.fetchall())
+
+
+def test_interrupted_run_resumes_after_checkpoint(database, monkeypatch):
+    db.insert_feedback_bulk([(f"HH-{i}", "The tap is broken." if i % 2 else "Clean water, thank you.") for i in range(5)])
+
+    assert run_backfill(monkeypatch, limit=2)["rows"] == 2
+    assert db.get_backfill_checkpoint(VERSION) == (2, 2)
+
+    assert run_backfill(monkeypatch)["rows"] == 3
+    assert labels() == {1: "POSITIVE", 2: "NEGATIVE", 3: "POSITIVE", 4: "NEGATIVE", 5: "POSITIVE"}
+
+
+def test_completed_run_clears_checkpoint_and_relabels_edited_rows(database, monkeypatch):
+    db.insert_feedback_bulk([(f"HH-{i}", "Clean water, thank you.") for i in range(5)])
+    assert run_backfill(monkeypatch)["rows"] == 5
+    assert db.get_backfill_checkpoint(VERSION) == (0, 0)
+
+    # Editing the text drops the stored label (feedback_text_changed trigger)
+    with db_connection() as cursor:
+        cursor.execute("UPDATE feedback SET feedback_text = 'The tap is broken again.' WHERE id = 1")
+    assert 1 not in labels()
+
+    assert run_backfill(monkeypatch)["rows"] == 1
+    assert labels()[1] == "NEGATIVE"
+    assert db.get_backfill_checkpoint(VERSION) == (0, 0)
+
+
+def test_labels_from_another_version_leave_the_configured_ones(database):
+    db.insert_feedback_bulk([("HH-1", "The tap is broken."), ("HH-2", "Clean water, thank you.")])
+    db.save_feedback_sentiment([(1, SENTIMENT_VERSION, "NEGATIVE", 0.9), (2, SENTIMENT_VERSION, "POSITIVE", 0.9)])
+
+    other = SENTIMENT_VERSION + "+int8"
+    db.save_feedback_sentiment([(1, other, "POSITIVE", 0.6), (2, other, "NEGATIVE", 0.6)])
+
+    assert db.get_unlabeled_feedback_count(SENTIMENT_VERSION) == 0
+    assert [row[2] for row in db.get_feedback_with_sentiment(SENTIMENT_VERSION)] == ["NEGATIVE", "POSITIVE"]
+    assert [row[2] for row in db.get_feedback_with_sentiment(other)] == ["POSITIVE", "NEGATIVE"]
+    # The sentiment totals count the configured model's labels only
+    totals = db.get_rollup_totals()
+    assert (totals.get("feedback_sentiment:NEGATIVE"), totals.get("feedback_sentiment:POSITIVE")) == (1, 1)
+    with db_connection() as cursor:
+        assert not any(db.check_rollups(cursor).values())
@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from db_utils import db_connection
+
+
+def feedback_count():
+    with db_connection() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM feedback")
+        return cursor.fetchone()[0]
+
+
+def test_nested_block_joins_the_outer_transaction(database):
+    with pytest.raises(RuntimeError):
+        with db_connection(immediate=True) as outer:
+            outer.execute("INSERT INTO feedback (household_id, feedback_text) VALUES ('HH-1', 'outer')")
+            with db_connection(immediate=True) as inner:
+                assert inner.connection is outer.connection
+                inner.execute("INSERT INTO feedback (household_id, feedback_text) VALUES ('HH-2', 'inner')")
+            # The inner block did not commit, so this rolls back both rows
+            raise RuntimeError
+    assert feedback_count() == 0
+
+    with db_connection() as outer:
+        with db_connection() as inner:
+            inner.execute("INSERT INTO feedback (household_id, feedback_text) VALUES ('HH-3', 'inner')")
+        assert outer.connection.in_transaction
+    assert feedback_count() == 1
+
+
+def test_immediate_inside_a_deferred_write_raises(database):
+    with db_connection() as outer:
+        with db_connection(immediate=True):  # nothing written yet, so it takes the lock
+            pass
+        outer.execute("INSERT INTO feedback (household_id, feedback_text) VALUES ('HH-1', 'outer')")
+    with pytest.raises(sqlite3.OperationalError):
+        with db_connection() as outer:
+            outer.execute("INSERT INTO feedback (household_id, feedback_text) VALUES ('HH-2', 'outer')")
+            with db_connection(immediate=True):
+                pass
+    assert feedback_count() == 1
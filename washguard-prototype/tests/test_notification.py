@@ -0,0 +1,60 @@
+import smtplib
+
+import pytest
+
+import notification
+
+
+class FakeSMTP:
+    # Records the calls a session receives; advertises STARTTLS only when told to
+    offers_starttls = False
+
+    def __init__(self, host, port, timeout=None):
+        self.calls = []
+
+    def ehlo(self):
+        self.calls.append("ehlo")
+
+    def has_extn(self, name):
+        return name == "starttls" and self.offers_starttls
+
+    def starttls(self):
+        if not self.offers_starttls:
+            raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+        self.calls.append("starttls")
+
+    def login(self, username, password):
+        self.calls.append("login")
+
+    def close(self):
+        self.calls.append("close")
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    opened = []
+
+    def connect(*args, **kwargs):
+        opened.append(FakeSMTP(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(notification.smtplib, "SMTP", connect)
+    return opened
+
+
+def test_login_only_after_starttls(sessions, monkeypatch):
+    monkeypatch.setattr(FakeSMTP, "offers_starttls", True)
+    notification.SMTPPool("smtp.example.org", 587, "alerts@example.org", "secret")._connect()
+    assert sessions[0].calls == ["ehlo", "starttls", "ehlo", "login"]
+
+
+def test_missing_starttls_is_refused_before_login(sessions):
+    with pytest.raises(smtplib.SMTPNotSupportedError):
+        notification.SMTPPool("smtp.example.org", 587, "alerts@example.org", "secret")._connect()
+    assert "login" not in sessions[0].calls
+    assert sessions[0].calls[-1] == "close"
+
+
+def test_plaintext_needs_explicit_opt_in(sessions):
+    notification.SMTPPool("127.0.0.1", 8025, allow_plaintext=True)._connect()
+    assert sessions[0].calls == ["ehlo"]